@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+""" Benchmarks decoding Salt API state.apply responses with each lib.codec codec
+
+Builds synthetic responses with between 1 and 10,000 state entries, spread across up to 10 minions, and measures the
+time and peak memory used to decode each. The YAML codec is measured with both the LibYAML C loader and the pure Python
+loader.
+
+Usage: python -m bench.salt_codec [--sizes 1,10,100] [--repeat 3]
+
+Run from the ib_backup directory.
+"""
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Dict, List
+
+import yaml
+
+import lib.codec
+
+# Number of state entries in each benchmarked response
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+
+# Maximum number of minions in each response
+MAX_MINIONS = 10
+
+
+def build_response(state_count: int, stdout_size: int = 256) -> Dict[str, object]:
+    """ Builds a synthetic Salt API state.apply response
+    Args:
+        - state_count: Number of state entries across all minions
+        - stdout_size: Number of bytes of stdout in each state entry
+
+    Returns: Response body
+    """
+    minion_count = min(state_count, MAX_MINIONS)
+    minions = {}
+
+    for i in range(state_count):
+        minion = "minion-{}.dev.code418.net".format(i % minion_count)
+        state_name = "cmd_|-step-{}_|-/usr/local/bin/step-{}_|-run".format(i, i)
+
+        minions.setdefault(minion, {})[state_name] = {
+            '__run_num__': i,
+            '__id__': "step-{}".format(i),
+            'comment': 'Command "/usr/local/bin/step-{}" run'.format(i),
+            'duration': 12.3,
+            'name': "/usr/local/bin/step-{}".format(i),
+            'result': True,
+            'start_time': '12:00:00.000000',
+            'changes': {
+                'pid': 1000 + i,
+                'retcode': 0,
+                'stderr': '',
+                'stdout': 'x' * stdout_size
+            }
+        }
+
+    return {'return': [minions]}
+
+
+def measure(codec: lib.codec.Codec, data: bytes, repeat: int) -> Dict[str, float]:
+    """ Measures decoding a response
+    Args:
+        - codec: Codec to decode with
+        - data: Encoded response
+        - repeat: Number of times to decode, the fastest time is reported
+
+    Returns: Dict with `seconds` and `peak_bytes` fields
+    """
+    seconds = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        codec.decode(data)
+        duration = time.perf_counter() - start
+
+        if seconds is None or duration < seconds:
+            seconds = duration
+
+    tracemalloc.start()
+    codec.decode(data)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds': seconds,
+        'peak_bytes': peak_bytes
+    }
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict[str, object]]:
+    """ Runs the benchmark
+    Args:
+        - sizes: Numbers of state entries to benchmark
+        - repeat: Number of times to decode each response
+
+    Returns: Results, one per size and codec
+    """
+    codecs = [
+        ('json', lib.codec.JSONCodec()),
+        ('yaml', lib.codec.YAMLCodec()),
+        ('yaml-python', lib.codec.YAMLCodec(loader=yaml.SafeLoader))
+    ]
+
+    yaml_dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    results = []
+
+    for size in sizes:
+        response = build_response(size)
+        encoded = {
+            'application/json': json.dumps(response).encode(),
+            'application/x-yaml': yaml.dump(response, Dumper=yaml_dumper).encode()
+        }
+
+        for name, codec in codecs:
+            data = encoded[codec.content_type]
+
+            result = measure(codec, data, repeat)
+            result['codec'] = name
+            result['states'] = size
+            result['body_bytes'] = len(data)
+
+            results.append(result)
+
+    return results
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Benchmark Salt API response codecs")
+    parser.add_argument('--sizes', default=','.join([str(size) for size in DEFAULT_SIZES]),
+                        help="Comma separated numbers of state entries")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of times to decode each response")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print("yaml C loader available: {}".format(lib.codec.get_yaml_loader() is not yaml.SafeLoader))
+    print("{:>8} {:>12} {:>12} {:>12} {:>14}".format('states', 'codec', 'body_bytes', 'seconds', 'peak_bytes'))
+
+    for result in run(sizes, args.repeat):
+        print("{states:>8} {codec:>12} {body_bytes:>12} {seconds:>12.6f} {peak_bytes:>14}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
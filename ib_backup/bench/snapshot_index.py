@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+""" Benchmarks finding the newest snapshot of a volume with lib.snapshot_index.SnapshotIndex
+
+Lists synthetic daily snapshots from a stub EC2 client which applies describe_snapshots filters and returns pages of
+up to 1000 snapshots, like the EC2 API. Compares listing every snapshot with the snapshot index, before and after a
+high water mark is stored.
+
+Time spent by the stub applying filters is not counted. Instead each page adds a simulated EC2 API latency to the
+estimated time.
+
+Usage: python -m bench.snapshot_index [--snapshots 10000] [--page-latency 0.2]
+
+Run from the ib_backup directory.
+"""
+import time
+import fnmatch
+import argparse
+import datetime
+from typing import Dict, List
+
+import lib.snapshot_index
+import lib.store
+
+# ID of the volume snapshots are of
+VOLUME_ID = 'vol-00000000000000001'
+
+# Maximum number of snapshots in a describe_snapshots page
+PAGE_SIZE = 1000
+
+
+class StubEC2:
+    """ EC2 client which only implements the describe_snapshots paginator
+    Fields:
+        - snapshots (List[Dict[str, object]]): Snapshots
+        - page_count (int): Number of pages returned
+        - listed_count (int): Number of snapshots returned
+        - server_seconds (float): Time spent applying filters
+    """
+
+    def __init__(self, snapshots: List[Dict[str, object]]):
+        self.snapshots = snapshots
+        self.page_count = 0
+        self.listed_count = 0
+        self.server_seconds = 0
+
+    def get_paginator(self, operation: str) -> 'StubEC2':
+        return self
+
+    def __matches__(self, snapshot: Dict[str, object], filters: List[Dict[str, object]]) -> bool:
+        for f in filters:
+            if f['Name'] == 'volume-id':
+                value = snapshot['VolumeId']
+            elif f['Name'] == 'status':
+                value = snapshot['State']
+            elif f['Name'] == 'start-time':
+                value = snapshot['StartTime'].isoformat()
+            else:
+                raise ValueError("Unsupported filter: {}".format(f['Name']))
+
+            if not any(fnmatch.fnmatchcase(value, pattern) for pattern in f['Values']):
+                return False
+
+        return True
+
+    def paginate(self, Filters: List[Dict[str, object]]):
+        start = time.perf_counter()
+        matched = [snapshot for snapshot in self.snapshots if self.__matches__(snapshot, Filters)]
+        self.server_seconds += time.perf_counter() - start
+
+        for i in range(0, max(1, len(matched)), PAGE_SIZE):
+            page = matched[i:i + PAGE_SIZE]
+
+            self.page_count += 1
+            self.listed_count += len(page)
+
+            yield {'Snapshots': page}
+
+
+def build_snapshots(count: int, now: datetime.datetime) -> List[Dict[str, object]]:
+    """ Builds one snapshot per day, the newest taken today
+    Args:
+        - count: Number of snapshots
+        - now: Current UTC time
+
+    Returns: Snapshots
+    """
+    snapshots = []
+
+    for i in range(count):
+        start_time = (now - datetime.timedelta(days=i)).replace(hour=0, minute=5, tzinfo=datetime.timezone.utc)
+
+        snapshots.append({
+            'SnapshotId': "snap-{:017d}".format(i),
+            'VolumeId': VOLUME_ID,
+            'VolumeSize': 1024,
+            'State': 'completed',
+            'StartTime': start_time,
+            'Tags': []
+        })
+
+    return snapshots
+
+
+def full_scan(ec2: StubEC2) -> Dict[str, object]:
+    """ Finds the newest snapshot by listing every snapshot of the volume
+    Returns: Newest snapshot
+    """
+    newest_snapshot = None
+
+    for snapshot_resp in ec2.get_paginator('describe_snapshots').paginate(Filters=[{
+        'Name': 'volume-id',
+        'Values': [VOLUME_ID]
+    }]):
+        for snapshot in snapshot_resp['Snapshots']:
+            if newest_snapshot is None or snapshot['StartTime'] > newest_snapshot['StartTime']:
+                newest_snapshot = snapshot
+
+    return newest_snapshot
+
+
+def measure(name: str, ec2: StubEC2, find, page_latency: float) -> Dict[str, object]:
+    """ Measures finding the newest snapshot
+    Args:
+        - name: Name of method
+        - ec2: Stub EC2 client used by find
+        - find (Callable[[], Dict[str, object]]): Finds the newest snapshot
+        - page_latency: Simulated number of seconds each describe_snapshots page takes
+
+    Returns: Result
+    """
+    ec2.page_count = 0
+    ec2.listed_count = 0
+    ec2.server_seconds = 0
+
+    start = time.perf_counter()
+    snapshot = find()
+    client_seconds = time.perf_counter() - start - ec2.server_seconds
+
+    return {
+        'method': name,
+        'snapshot_id': snapshot['SnapshotId'],
+        'pages': ec2.page_count,
+        'listed': ec2.listed_count,
+        'client_seconds': client_seconds,
+        'estimated_seconds': client_seconds + (ec2.page_count * page_latency)
+    }
+
+
+def run(snapshot_count: int, page_latency: float) -> List[Dict[str, object]]:
+    """ Runs the benchmark
+    Args:
+        - snapshot_count: Number of snapshots of the volume
+        - page_latency: Simulated number of seconds each describe_snapshots page takes
+
+    Returns: Results, one per method
+    """
+    now = datetime.datetime.utcnow()
+    ec2 = StubEC2(build_snapshots(snapshot_count, now))
+    store = lib.store.MemoryStore()
+
+    index = lib.snapshot_index.SnapshotIndex(ec2, store=store)
+
+    tomorrow = now + datetime.timedelta(days=1)
+
+    return [
+        measure('full scan', ec2, lambda: full_scan(ec2), page_latency),
+        measure('index, no mark', ec2, lambda: index.newest_snapshot(VOLUME_ID, now=now), page_latency),
+        measure('index, with mark', ec2, lambda: index.newest_snapshot(VOLUME_ID, now=tomorrow), page_latency)
+    ]
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Benchmark finding the newest snapshot of a volume")
+    parser.add_argument('--snapshots', type=int, default=10000, help="Number of snapshots of the volume")
+    parser.add_argument('--page-latency', type=float, default=0.2,
+                        help="Simulated number of seconds each describe_snapshots page takes")
+    args = parser.parse_args()
+
+    print("{:>18} {:>22} {:>6} {:>8} {:>15} {:>18}".format('method', 'snapshot_id', 'pages', 'listed',
+                                                         'client_seconds', 'estimated_seconds'))
+
+    for result in run(args.snapshots, args.page_latency):
+        print(("{method:>18} {snapshot_id:>22} {pages:>6} {listed:>8} {client_seconds:>15.6f} " +
+               "{estimated_seconds:>18.6f}").format(**result))
+
+
+if __name__ == '__main__':
+    main()
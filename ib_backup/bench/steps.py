@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+""" Benchmarks the import time and handler latency of each step
+
+Runs each step's `main` function once, in a new Python process, so the import time includes every module the step
+imports. AWS API clients are replaced with stubs which record calls, and Salt steps use a local fake Salt API. Each
+step is given an event and stub responses which let it complete without repeating.
+
+Records for each step:
+    - import_seconds: Time to import the step module
+    - handler_seconds: Time taken by the step's main function
+    - api_calls: Number of calls to each AWS API method, and requests to each Salt API path
+    - peak_rss_kb: Peak resident memory of the process
+
+Usage: python -m bench.steps [--steps step_a,step_b] [--output results.json]
+
+Run from the ib_backup directory. Results are written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import resource
+import importlib
+import subprocess
+from typing import Dict, List
+
+# Instance IDs returned by the stub EC2 client
+DEV_INSTANCE_ID = 'i-00000000000000dev'
+PROD_INSTANCE_ID = 'i-0000000000000prod'
+
+# Volume ID returned by the stub EC2 client
+VOLUME_ID = 'vol-00000000000000001'
+
+# Event each step is invoked with
+STEP_EVENTS = {
+    'step_create_volume': {},
+    'step_wait_volume_created': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID,
+        'volume_size': 100
+    },
+    'step_setup_test': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID
+    },
+    'step_attach_volume': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID
+    },
+    'step_wait_volume_attached': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID,
+        'mount_point': '/dev/sdg'
+    },
+    'step_test_backup': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID,
+        'mount_point': '/dev/sdg'
+    },
+    'step_wait_test_completed': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID,
+        'mount_point': '/dev/sdg'
+    },
+    'step_wait_volume_detached': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID
+    },
+    'step_teardown_test': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID
+    },
+    'step_cleanup': {
+        'dev_ib_backup_instance_id': DEV_INSTANCE_ID,
+        'volume_id': VOLUME_ID
+    }
+}
+
+# State of the test volume's attachment to the dev instance, for steps which check it
+STEP_ATTACHMENT_STATES = {
+    'step_wait_volume_detached': 'detached'
+}
+
+# Event field holding the ID of the Salt job each step waits for, the job is started before the step is run
+STEP_SALT_JOB_FIELDS = {
+    'step_setup_test': 'setup_salt_job_id',
+    'step_wait_test_completed': 'test_cmd_salt_job_id',
+    'step_teardown_test': 'teardown_salt_job_id'
+}
+
+
+class StubClient:
+    """ AWS API client which returns canned responses and counts calls
+    Fields:
+        - service_name (str): Name of AWS service
+        - responses (Dict[str, object]): Method name to response
+        - calls (Dict[str, int]): Number of calls to each method, keys are prefixed with the service name
+    """
+
+    def __init__(self, service_name: str, responses: Dict[str, object], calls: Dict[str, int]):
+        self.service_name = service_name
+        self.responses = responses
+        self.calls = calls
+
+    def __record__(self, method: str) -> object:
+        name = "{}.{}".format(self.service_name, method)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        if method not in self.responses:
+            raise ValueError("No stub response for {}".format(name))
+
+        return self.responses[method]
+
+    def __getattr__(self, method: str):
+        if method.startswith('__'):
+            raise AttributeError(method)
+
+        return lambda **kwargs: self.__record__(method)
+
+    def get_paginator(self, method: str) -> 'StubPaginator':
+        return StubPaginator(self, method)
+
+
+class StubPaginator:
+    """ Paginator which returns a stub client's response as one page
+    """
+
+    def __init__(self, client: StubClient, method: str):
+        self.client = client
+        self.method = method
+
+    def paginate(self, **kwargs) -> List[object]:
+        return [self.client.__record__(self.method)]
+
+
+def ec2_responses(attachment_state: str) -> Dict[str, object]:
+    """ Builds the stub EC2 client's responses
+    Args:
+        - attachment_state: State of the test volume's attachment to the dev instance
+
+    Returns: Method name to response
+    """
+    def instance(instance_id: str, name: str) -> Dict[str, object]:
+        return {
+            'InstanceId': instance_id,
+            'State': {'Name': 'running'},
+            'Tags': [{'Key': 'Name', 'Value': name}],
+            'Placement': {'AvailabilityZone': 'us-east-1a'},
+            'BlockDeviceMappings': [{'DeviceName': '/dev/sdg', 'Ebs': {'VolumeId': 'vol-0000000000000prod'}}]
+        }
+
+    return {
+        'describe_instances': {'Reservations': [
+            {'Instances': [instance(DEV_INSTANCE_ID, 'ib02.dev.code418.net')]},
+            {'Instances': [instance(PROD_INSTANCE_ID, 'ib-backup.us-east-1.code418.net')]}
+        ]},
+        'describe_snapshots': {'Snapshots': [{
+            'SnapshotId': 'snap-00000000000000001',
+            'VolumeId': 'vol-0000000000000prod',
+            'VolumeSize': 100,
+            'State': 'completed',
+            'StartTime': datetime.datetime.now(datetime.timezone.utc),
+            'Tags': []
+        }]},
+        'create_volume': {'VolumeId': VOLUME_ID},
+        'describe_volumes': {'Volumes': [{
+            'VolumeId': VOLUME_ID,
+            'SnapshotId': 'snap-00000000000000001',
+            'Size': 100,
+            'State': 'available',
+            'Attachments': [{'InstanceId': DEV_INSTANCE_ID, 'Device': '/dev/sdg', 'State': attachment_state}]
+        }]},
+        'attach_volume': {},
+        'detach_volume': {},
+        'create_tags': {},
+        'delete_volume': {}
+    }
+
+
+def run_step(step_name: str) -> Dict[str, object]:
+    """ Imports and runs a step in the current process, should only be called once per process
+    Args:
+        - step_name: Name of step
+
+    Returns: Result
+    """
+    # Import
+    start = time.perf_counter()
+    step_module = importlib.import_module(step_name)
+    import_seconds = time.perf_counter() - start
+
+    import lib.aws_clients
+    import lib.dispatch
+    import lib.salt
+    from devtools.fake_salt_api import FakeSaltAPIServer, FakeSaltMaster
+
+    # Stub AWS API clients
+    calls = {}
+
+    ec2_attachment_state = STEP_ATTACHMENT_STATES.get(step_name, 'attached')
+    lib.aws_clients.registry.register(StubClient('ec2', ec2_responses(ec2_attachment_state), calls), 'ec2')
+    lib.aws_clients.registry.register(StubClient('lambda', {'invoke': {'StatusCode': 202}}, calls), 'lambda')
+
+    # Fake Salt API
+    salt_server = FakeSaltAPIServer(FakeSaltMaster(job_duration=0)).start()
+
+    os.environ['SALT_API_URL'] = salt_server.url
+    os.environ['SALT_API_USER'] = 'bench'
+    os.environ['SALT_API_PASSWORD'] = 'bench'
+    os.environ['NEXT_LAMBDA_NAME'] = 'bench-next-step'
+
+    event = dict(STEP_EVENTS[step_name])
+
+    if step_name in STEP_SALT_JOB_FIELDS:
+        salt_api = lib.salt.SaltClient(salt_server.url)
+        salt_api.authenticate('bench', 'bench')
+
+        event[STEP_SALT_JOB_FIELDS[step_name]] = salt_api.exec(minion=DEV_INSTANCE_ID, cmd='state.apply',
+                                                               args=['bench'], salt_client='local_async')[0]['jid']
+
+        salt_server.master.request_counts = {}
+
+    # Run
+    start = time.perf_counter()
+    step_module.main(event, lib.dispatch.InProcessContext(step_name))
+    handler_seconds = time.perf_counter() - start
+
+    for path, count in salt_server.master.request_counts.items():
+        calls["salt.{}".format(path)] = count
+
+    return {
+        'step': step_name,
+        'import_seconds': import_seconds,
+        'handler_seconds': handler_seconds,
+        'api_calls': calls,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def run(step_names: List[str]) -> List[Dict[str, object]]:
+    """ Runs each step in a new Python process
+    Args:
+        - step_names: Names of steps to benchmark
+
+    Raises:
+        - ValueError: If a step fails
+
+    Returns: Results, one per step
+    """
+    # Imported here so the parent process imports step dependencies, not the children being measured. Importing
+    # lib.job and lib.salt registers every environment variable which would make steps use real AWS resources
+    import lib.job
+    import lib.salt
+    import lib.store
+
+    results = []
+
+    env = dict(os.environ)
+    for env_var in lib.store.RESOURCE_ENV_VARS:
+        env.pop(env_var, None)
+
+    for step_name in step_names:
+        # Step logs are written to stdout, so results are written to stderr
+        proc = subprocess.run([sys.executable, '-m', 'bench.steps', '--child', step_name], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        if proc.returncode != 0:
+            raise ValueError("Step {} failed: {}".format(step_name, proc.stderr.decode()))
+
+        results.append(json.loads(proc.stderr.decode().strip().split('\n')[-1]))
+
+    return results
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Benchmark each step's import time and handler latency")
+    parser.add_argument('--steps', default=','.join(STEP_EVENTS.keys()), help="Comma separated names of steps")
+    parser.add_argument('--output', help="File to write results to, defaults to stdout")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.stderr.write(json.dumps(run_step(args.child)) + '\n')
+        return
+
+    results = json.dumps(run(args.steps.split(',')), indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(results + '\n')
+    else:
+        print(results)
+
+
+if __name__ == '__main__':
+    main()
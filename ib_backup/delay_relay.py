@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import os
+
+import lib.dispatch
+import lib.delay_queue
+import lib.log
+
+logger = lib.log.get_logger("delay_relay")
+
+
+def main(event, ctx):
+    """ Lambda function handler, invokes the step lambdas scheduled on the wait SQS queue
+    Args:
+        - event: AWS SQS event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    if 'WAIT_QUEUE_URL' not in os.environ:
+        raise KeyError("Missing environment variables: ['WAIT_QUEUE_URL']")
+
+    delay_queue = lib.delay_queue.SQSDelayQueue(os.environ['WAIT_QUEUE_URL'])
+
+    invoked_count = delay_queue.relay_messages(event['Records'], lib.dispatch.LambdaDispatcher())
+
+    logger.debug("Relayed delayed invocations, record_count={}, invoked_count={}", len(event['Records']), invoked_count)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Checks every module the handler lambda can run is included in the packaged lambda artifact
+
+The handler lambda's files are listed by the `handler` entry of the `[package.lambdas]` table in deploy/config.toml.
+A step module which is missing from the list fails to import once deployed, so its branch of the pipeline never
+completes.
+
+Usage: python -m devtools.check_package [--config ../deploy/config.toml]
+
+Run from the ib_backup directory. Exits with a non-zero status if a module is missing.
+"""
+import os
+import re
+import sys
+import argparse
+from typing import List
+
+import handler
+import lib.steps
+
+# Directory packaged paths are relative to
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Package list of the handler lambda, the config is TOML but only this array of strings is read
+HANDLER_FILES_PATTERN = re.compile(r'^handler\s*=\s*\[(.*?)\]', re.MULTILINE | re.DOTALL)
+
+
+def packaged_files(config_path: str) -> List[str]:
+    """ Reads the files packaged in the handler lambda's artifact
+    Args:
+        - config_path: Path to deploy config file
+
+    Raises:
+        - ValueError: If the config does not list the handler lambda's files
+
+    Returns: Paths relative to the repository root
+    """
+    with open(config_path) as config_file:
+        match = HANDLER_FILES_PATTERN.search(config_file.read())
+
+    if match is None:
+        raise ValueError("No handler lambda package list in {}".format(config_path))
+
+    return re.findall(r'"([^"]+)"', match.group(1))
+
+
+def missing_modules(files: List[str]) -> List[str]:
+    """ Determines which modules the handler can run are not packaged
+    Args:
+        - files: Packaged paths
+
+    Returns: Paths of missing modules
+    """
+    modules = list(lib.steps.PIPELINE)
+
+    for module in handler.HANDLER_MODULES:
+        if module not in modules:
+            modules.append(module)
+
+    required = ["ib_backup/lib", "ib_backup/handler.py"] + ["ib_backup/{}.py".format(module) for module in modules]
+
+    return [path for path in required if path not in files]
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Check every step module is packaged in the handler lambda")
+    parser.add_argument('--config', default=os.path.join(REPO_DIR, 'deploy', 'config.toml'),
+                        help="Deploy config file")
+    args = parser.parse_args()
+
+    missing = missing_modules(packaged_files(args.config))
+
+    if len(missing) > 0:
+        sys.exit("Missing from the handler lambda package in {}: {}".format(args.config, missing))
+
+    print("Every handler module is packaged")
+
+
+if __name__ == '__main__':
+    main()
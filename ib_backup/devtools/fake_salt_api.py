@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+""" Fake Salt API server, used to run steps locally without a Salt master
+
+Implements the parts of the Salt API used by lib.salt:
+    - POST /login
+    - POST / with the `local` and `local_async` clients, and the `runner` client's `jobs.lookup_jid` function
+    - GET /jobs/<job id>
+    - GET /events
+
+Every state.apply job runs on a single minion and succeeds. Asynchronous jobs complete `job_duration` seconds after
+they are started, at which point a job return event is sent to /events clients. Time is read from lib.clock, so the
+fake master follows a virtual clock when one is used.
+
+Usage: fake_salt_api.py [PORT]
+"""
+import sys
+import json
+import queue
+import threading
+import socketserver
+import http.server
+import urllib.parse
+from typing import Dict, List
+
+import yaml
+
+import lib.clock
+
+
+class FakeSaltMaster:
+    """ State of the fake Salt master
+    Fields:
+        - minion (str): Name of the only minion
+        - job_duration (float): Number of seconds asynchronous jobs take to complete, or a function which returns
+            the number of seconds each job takes
+        - exec_duration (float): Number of seconds synchronous jobs take to complete, or a function which returns the
+            number of seconds each job takes
+        - state_durations (Dict[str, object]): Name of state to the number of seconds asynchronous jobs which apply it
+            take to complete, or a function which returns the number of seconds, overrides `job_duration`
+        - job_success (bool): Result of each state run
+        - stdout_size (int): Number of bytes of stdout each state run returns
+        - token_ttl (float): Number of seconds auth tokens are valid for
+        - jobs (Dict[str, Dict[str, object]]): Job ID to job, jobs have the `completes_at` and `result` fields
+        - tokens (Dict[str, float]): Auth token to expire time
+        - subscribers (List[queue.Queue]): Queues of /events clients
+        - request_counts (Dict[str, int]): Number of requests received per path
+    """
+
+    def __init__(self, minion: str = 'ib02.dev.code418.net', job_duration: float = 5, job_success: bool = True,
+                 stdout_size: int = 64, token_ttl: float = 12 * 60 * 60, exec_duration: float = 0,
+                 state_durations: Dict[str, object] = None):
+        self.minion = minion
+        self.job_duration = job_duration
+        self.exec_duration = exec_duration
+        self.state_durations = state_durations if state_durations is not None else {}
+        self.job_success = job_success
+        self.stdout_size = stdout_size
+        self.token_ttl = token_ttl
+
+        self.jobs = {}
+        self.tokens = {}
+        self.subscribers = []
+        self.request_counts = {}
+
+        self.lock = threading.Lock()
+        self.next_job_id = 1
+
+    def login(self) -> Dict[str, object]:
+        """ Returns: Login response return entry
+        """
+        with self.lock:
+            token = "token-{}".format(len(self.tokens) + 1)
+            expire = lib.clock.now() + self.token_ttl
+
+            self.tokens[token] = expire
+
+        return {
+            'token': token,
+            'start': lib.clock.now(),
+            'expire': expire,
+            'user': 'ibbackup',
+            'eauth': 'pam'
+        }
+
+    def is_authorized(self, token: str) -> bool:
+        """ Returns: True if the auth token exists and has not expired
+        """
+        with self.lock:
+            return token in self.tokens and self.tokens[token] > lib.clock.now()
+
+    def revoke_tokens(self):
+        """ Invalidates every auth token before it expires, like restarting the Salt master does
+        """
+        with self.lock:
+            self.tokens = {}
+
+    def state_result(self, state_args: List[str]) -> Dict[str, object]:
+        """ Builds the result of a state.apply run
+        Args:
+            - state_args: state.apply arguments
+
+        Returns: Minion state results
+        """
+        state_name = "cmd_|-{}_|-{}_|-run".format(','.join(state_args), ','.join(state_args))
+
+        return {
+            state_name: {
+                '__run_num__': 0,
+                'comment': 'Command "{}" run'.format(','.join(state_args)),
+                'result': self.job_success,
+                'changes': {
+                    'pid': 1234,
+                    'retcode': 0 if self.job_success else 1,
+                    'stderr': '',
+                    'stdout': 'x' * self.stdout_size
+                }
+            }
+        }
+
+    def run(self, lowstate: Dict[str, object]) -> object:
+        """ Runs a lowstate chunk
+        Args:
+            - lowstate: Salt API lowstate
+
+        Returns: Return entry
+        """
+        args = lowstate.get('arg', [])
+
+        if lowstate.get('client', None) == 'runner':
+            if lowstate.get('fun', None) != 'jobs.lookup_jid':
+                return "Runner function {} is not supported".format(lowstate.get('fun', None))
+
+            result = self.job_result(lowstate.get('jid', None))
+
+            if len(result) == 0:
+                return {}
+
+            return {'outputter': 'highstate', 'data': result}
+
+        if lowstate.get('client', None) == 'local_async':
+            with self.lock:
+                job_id = "2018{:016d}".format(self.next_job_id)
+                self.next_job_id += 1
+
+                job_duration = self.job_duration
+                if len(args) > 0 and args[0] in self.state_durations:
+                    job_duration = self.state_durations[args[0]]
+
+                if callable(job_duration):
+                    job_duration = job_duration()
+
+                self.jobs[job_id] = {
+                    'completes_at': lib.clock.now() + job_duration,
+                    'result': self.state_result(args),
+                    'published': False
+                }
+
+            return {'jid': job_id, 'minions': [self.minion]}
+
+        exec_duration = self.exec_duration
+        if callable(exec_duration):
+            exec_duration = exec_duration()
+
+        lib.clock.sleep(exec_duration)
+
+        return {self.minion: self.state_result(args)}
+
+    def job_result(self, job_id: str) -> Dict[str, object]:
+        """ Returns: Minion results of a job, empty if the job has not completed
+        """
+        with self.lock:
+            job = self.jobs.get(job_id, None)
+
+        if job is None or job['completes_at'] > lib.clock.now():
+            return {}
+
+        return {self.minion: job['result']}
+
+    def publish_completed_jobs(self):
+        """ Sends job return events for jobs which have completed since the last call
+        """
+        with self.lock:
+            for job_id, job in self.jobs.items():
+                if job['published'] or job['completes_at'] > lib.clock.now():
+                    continue
+
+                job['published'] = True
+
+                event = {
+                    'tag': "salt/job/{}/ret/{}".format(job_id, self.minion),
+                    'data': {
+                        'id': self.minion,
+                        'jid': job_id,
+                        'fun': 'state.apply',
+                        'success': self.job_success,
+                        'retcode': 0 if self.job_success else 2,
+                        'return': job['result']
+                    }
+                }
+
+                for subscriber in self.subscribers:
+                    subscriber.put(event)
+
+
+class FakeSaltAPIHandler(http.server.BaseHTTPRequestHandler):
+    """ Handles Salt API requests using the server's `master` field
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args):
+        pass
+
+    def count_request(self, path: str):
+        with self.server.master.lock:
+            counts = self.server.master.request_counts
+            counts[path] = counts.get(path, 0) + 1
+
+    def send_body(self, body: Dict[str, object], status: int = 200):
+        """ Sends a response body encoded in the format requested by the Accept header
+        """
+        if 'yaml' in self.headers.get('Accept', ''):
+            content_type = 'application/x-yaml'
+            data = yaml.safe_dump(body).encode()
+        else:
+            content_type = 'application/json'
+            data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def check_auth(self) -> bool:
+        if self.server.master.is_authorized(self.headers.get('x-auth-token', '')):
+            return True
+
+        self.send_body({'return': 'Please log in'}, status=401)
+
+        return False
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        self.count_request(path)
+
+        if path == '/login':
+            self.read_body()
+            self.send_body({'return': [self.server.master.login()]})
+            return
+
+        if not self.check_auth():
+            return
+
+        lowstate = json.loads(self.read_body().decode())
+
+        if not isinstance(lowstate, list):
+            lowstate = [lowstate]
+
+        self.send_body({'return': [self.server.master.run(chunk) for chunk in lowstate]})
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        self.count_request(path)
+
+        if not self.check_auth():
+            return
+
+        if path.startswith('/jobs/'):
+            job_id = path[len('/jobs/'):]
+
+            self.send_body({'return': [self.server.master.job_result(job_id)]})
+            return
+
+        if path == '/events':
+            self.stream_events()
+            return
+
+        self.send_body({'return': 'Not found'}, status=404)
+
+    def write_chunk(self, data: str):
+        """ Sends a chunk of a chunked transfer encoded response, like the Salt API does for /events
+        """
+        data = data.encode()
+
+        self.wfile.write("{:x}\r\n".format(len(data)).encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def stream_events(self):
+        """ Sends server sent events until the client disconnects
+        """
+        master = self.server.master
+        subscriber = queue.Queue()
+
+        with master.lock:
+            master.subscribers.append(subscriber)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            self.write_chunk('retry: 400\n\n')
+
+            while True:
+                master.publish_completed_jobs()
+
+                try:
+                    event = subscriber.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                self.write_chunk("tag: {}\ndata: {}\n\n".format(event['tag'], json.dumps(event)))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with master.lock:
+                master.subscribers.remove(subscriber)
+
+
+class FakeSaltAPIServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Fake Salt API HTTP server
+    Fields:
+        - master (FakeSaltMaster): Fake Salt master state
+        - url (str): URL of server
+    """
+    daemon_threads = True
+
+    def __init__(self, master: FakeSaltMaster = None, port: int = 0):
+        super().__init__(('127.0.0.1', port), FakeSaltAPIHandler)
+
+        self.master = master
+
+        if self.master is None:
+            self.master = FakeSaltMaster()
+
+        self.url = "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self) -> 'FakeSaltAPIServer':
+        """ Serves requests in a background thread
+        Returns: Server
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return self
+
+
+def main():
+    """ Entrypoint
+    """
+    port = 8000
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+
+    server = FakeSaltAPIServer(port=port)
+
+    print("Fake Salt API listening on {}".format(server.url))
+
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
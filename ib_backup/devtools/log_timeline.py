@@ -0,0 +1,714 @@
+#!/usr/bin/env python3
+""" Builds a timeline of each pipeline run from exported step logs
+
+Reads logs written by lib.log and lib.job.Job, from:
+    - CloudWatch JSON, as returned by `aws logs filter-log-events` or `aws logs get-log-events`
+    - JSON lines, one CloudWatch log event object with the `timestamp` and `message` fields per line
+    - The lines written by lib.log, either JSON records or text lines. Older text lines, whose logger name included
+        the time the step's Job was created, are also read. In that case each line's time is read from the logger name
+
+Files ending in .gz are decompressed. Records must be roughly in time order, as CloudWatch exports them.
+
+Invocations are stitched into runs using the `run_id`, `volume_id` and `test_cmd_salt_job_id` fields of the events
+steps log. For each run the timeline reports:
+    - Time spent on each step, from the step's first invocation until the next step's first invocation
+    - Number of times each step was invoked
+    - Repeat delay overshoot, the time between a repeat being due and the step being invoked again
+    - The step which took the longest
+
+A summary of each step across runs, and a per day trend, are also reported. Input is streamed. Only runs which have
+logged a record within the last `--idle-timeout` seconds of log time are kept in memory.
+
+Usage: python -m devtools.log_timeline [--runs] [--json] FILE [FILE ...]
+
+Run from the ib_backup directory. Pass - as a file to read from stdin.
+"""
+import re
+import ast
+import sys
+import gzip
+import json
+import argparse
+import datetime
+from typing import Dict, List, Iterator, IO
+
+from devtools.stats import percentile
+
+# Number of characters read from a file at once
+READ_SIZE = 64 * 1024
+
+# Number of seconds of log time after a run's last record that the run is considered complete
+DEFAULT_IDLE_TIMEOUT = 2 * 60 * 60
+
+# Event fields which identify a run, in order of preference
+RUN_KEY_FIELDS = ['run_id', 'volume_id', 'test_cmd_salt_job_id']
+
+# Format of lines written by lib.log
+LOG_LINE_PATTERN = re.compile(r'^\[(?P<level>[A-Z]+) *\] (?P<logger>.+?): (?P<message>.*)$')
+
+# Format of logger names used by lib.job.Job
+JOB_LOGGER_PATTERN = re.compile(r'^(?P<step>.+)-(?P<created_at>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(\.\d+)?)$')
+
+# Messages logged by lib.job.Job
+INVOKING_PATTERN = re.compile(r'^Invoking handle, event=(?P<event>\{.*\})$')
+INVOKED_PATTERN = re.compile(r'^Invoked lambda, name=(?P<name>[^,]+), event=(?P<event>\{.*\}), result=')
+REPEAT_PATTERNS = [
+    re.compile(r'^Scheduled self to be invoked again in (?P<delay>[0-9.e+-]+) seconds$'),
+    re.compile(r'^Waiting (?P<delay>[0-9.e+-]+) seconds, then invoking self again$')
+]
+TERMINATE_MESSAGE = 'Handle finished, next action=TERMINATE'
+
+
+def open_file(path: str) -> IO:
+    """ Opens a log file for reading as text
+    Args:
+        - path: Path of file, - for stdin, files ending in .gz are decompressed
+
+    Returns: File
+    """
+    if path == '-':
+        return sys.stdin
+
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_json_events(f: IO, buffer: str) -> Iterator[Dict[str, object]]:
+    """ Streams the objects in the `events` arrays of CloudWatch JSON documents, without reading whole documents
+    Args:
+        - f: File to read from
+        - buffer: Text already read from the file
+
+    Raises:
+        - ValueError: If the file is not valid JSON
+
+    Returns: CloudWatch log events
+    """
+    decoder = json.JSONDecoder()
+    eof = False
+    in_events = False
+    pos = 0
+
+    while True:
+        # Discard parsed text, so only one event is buffered at a time
+        buffer = buffer[pos:]
+        pos = 0
+
+        if not in_events:
+            events_start = buffer.find('"events"')
+
+            if events_start == -1 or buffer.find('[', events_start) == -1:
+                if eof:
+                    return
+
+                # Keep enough text to find the field if it was split between reads
+                if events_start == -1:
+                    buffer = buffer[-len('"events"'):]
+                else:
+                    buffer = buffer[events_start:]
+                chunk = f.read(READ_SIZE)
+                eof = len(chunk) == 0
+                buffer += chunk
+                continue
+
+            pos = buffer.find('[', events_start) + 1
+            in_events = True
+            continue
+
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos < len(buffer) and buffer[pos] == ']':
+            pos += 1
+            in_events = False
+            continue
+
+        try:
+            event, pos = decoder.raw_decode(buffer, pos)
+            yield event
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError("Failed to parse CloudWatch JSON: {}".format(e))
+
+            chunk = f.read(READ_SIZE)
+            eof = len(chunk) == 0
+            buffer += chunk
+
+
+def iter_records(path: str) -> Iterator[Dict[str, object]]:
+    """ Reads the lib.log records in a log file
+    Args:
+        - path: Path of file, see open_file
+
+    Raises:
+        - ValueError: If the file is not valid CloudWatch JSON
+
+    Returns: Records with the `timestamp`, `level`, `invocation`, `step` and `message` fields, `timestamp` is a unix
+        time and `invocation` identifies the invocation which wrote the record
+    """
+    f = open_file(path)
+
+    try:
+        buffer = f.read(READ_SIZE)
+        first_line = buffer.lstrip().split('\n', 1)[0].strip()
+
+        # Detect format, lines written by lib.log can also be JSON objects
+        events = None
+
+        if buffer.lstrip().startswith('{'):
+            try:
+                first_object = json.loads(first_line)
+            except ValueError:
+                first_object = {}
+
+            if 'message' in first_object and 'level' not in first_object:
+                events = (json.loads(line) for line in iter_lines(f, buffer) if line.strip())
+            elif 'level' not in first_object:
+                events = iter_json_events(f, buffer)
+
+        if events is None:
+            for line in iter_lines(f, buffer):
+                record = parse_line(line, None)
+
+                if record is not None:
+                    yield record
+
+            return
+
+        for event in events:
+            for line in event.get('message', '').split('\n'):
+                record = parse_line(line, event.get('timestamp', None))
+
+                if record is not None:
+                    yield record
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def iter_lines(f: IO, buffer: str) -> Iterator[str]:
+    """ Returns: Lines of a file, starting with text already read from the file
+    """
+    lines = buffer.split('\n')
+
+    # The last line may continue in the rest of the file
+    rest = lines.pop()
+
+    for line in lines:
+        yield line
+
+    for line in f:
+        yield rest + line.rstrip('\n')
+        rest = ''
+
+    if rest:
+        yield rest
+
+
+def parse_line(line: str, timestamp_ms: int) -> Dict[str, object]:
+    """ Parses a line written by lib.log
+    Args:
+        - line: Log line
+        - timestamp_ms: CloudWatch timestamp of line in milliseconds, None to read the time from the line
+
+    Returns: Record, see iter_records, None if the line was not written by a Job
+    """
+    line = line.strip()
+
+    if line.startswith('{'):
+        return parse_json_line(line)
+
+    match = LOG_LINE_PATTERN.match(line)
+    if match is None:
+        return None
+
+    logger_match = JOB_LOGGER_PATTERN.match(match.group('logger'))
+    if logger_match is None:
+        return None
+
+    if timestamp_ms is not None:
+        timestamp = timestamp_ms / 1000
+    else:
+        created_at = logger_match.group('created_at')
+        created_at_format = '%Y-%m-%d %H:%M:%S.%f' if '.' in created_at else '%Y-%m-%d %H:%M:%S'
+
+        # Lambda functions run in UTC
+        timestamp = datetime.datetime.strptime(created_at, created_at_format) \
+            .replace(tzinfo=datetime.timezone.utc).timestamp()
+
+    return {
+        'timestamp': timestamp,
+        'level': match.group('level'),
+        'invocation': match.group('logger'),
+        'step': logger_match.group('step'),
+        'message': match.group('message')
+    }
+
+
+def parse_json_line(line: str) -> Dict[str, object]:
+    """ Parses a JSON record written by lib.log.JSONFormatter
+    Args:
+        - line: Log line
+
+    Returns: Record, see iter_records, None if the line was not written by a Job
+    """
+    try:
+        body = json.loads(line)
+    except ValueError:
+        return None
+
+    if not isinstance(body, dict) or 'step' not in body or 'message' not in body:
+        return None
+
+    return {
+        'timestamp': body['time'],
+        'level': body['level'],
+        'invocation': "{}/{}".format(body['step'], body.get('request_id', None)),
+        'step': body['step'],
+        'message': body['message']
+    }
+
+
+def parse_event(text: str) -> Dict[str, object]:
+    """ Parses an event logged by a Job, Jobs log events as Python dicts
+    Returns: Event, None if text is not a valid event
+    """
+    try:
+        event = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+
+    if not isinstance(event, dict):
+        return None
+
+    return event
+
+
+class RunTimeline:
+    """ Invocations of one pipeline run
+    Fields:
+        - keys (Dict[str, str]): Event fields which identify the run, see RUN_KEY_FIELDS
+        - invocations (List[Dict[str, object]]): Invocations in the order they started, each has the `step` and
+            `started_at` fields
+        - overshoot (Dict[str, float]): Step name to total seconds repeats were invoked after they were due
+        - repeat_due_at (Dict[str, float]): Step name to unix time the step's next repeat is due
+        - loggers (List[str]): Invocations of the run, see iter_records
+        - last_seen (float): Unix time of the run's last record
+        - completed (bool): True if the last step of the run completed
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.invocations = []
+        self.overshoot = {}
+        self.repeat_due_at = {}
+        self.loggers = []
+        self.last_seen = None
+        self.completed = False
+
+    def run_id(self) -> str:
+        """ Returns: Value of the most preferred field which identifies the run, None if no fields are known
+        """
+        for field in RUN_KEY_FIELDS:
+            if field in self.keys:
+                return self.keys[field]
+
+        return None
+
+    def summarize(self) -> Dict[str, object]:
+        """ Builds the run's timeline
+        Returns: Dict with the `run_id`, `started_at`, `total_seconds`, `completed`, `steps` and `critical_step`
+            fields. `steps` lists steps in the order they first ran, each with the `step`, `seconds`, `invocations`
+            and `overshoot_seconds` fields
+        """
+        steps = []
+        steps_by_name = {}
+
+        for invocation in self.invocations:
+            if invocation['step'] not in steps_by_name:
+                steps_by_name[invocation['step']] = {
+                    'step': invocation['step'],
+                    'started_at': invocation['started_at'],
+                    'seconds': 0,
+                    'invocations': 0,
+                    'overshoot_seconds': self.overshoot.get(invocation['step'], 0)
+                }
+                steps.append(steps_by_name[invocation['step']])
+
+            steps_by_name[invocation['step']]['invocations'] += 1
+
+        for i, step in enumerate(steps):
+            step_finished_at = self.last_seen
+            if i + 1 < len(steps):
+                step_finished_at = steps[i + 1]['started_at']
+
+            step['seconds'] = step_finished_at - step['started_at']
+
+        started_at = self.last_seen
+        if len(steps) > 0:
+            started_at = steps[0]['started_at']
+
+        for step in steps:
+            del step['started_at']
+
+        critical_step = None
+        if len(steps) > 0:
+            critical_step = max(steps, key=lambda s: s['seconds'])['step']
+
+        return {
+            'run_id': self.run_id(),
+            'started_at': started_at,
+            'total_seconds': self.last_seen - started_at,
+            'completed': self.completed,
+            'steps': steps,
+            'critical_step': critical_step
+        }
+
+
+class TimelineBuilder:
+    """ Stitches records into runs
+    Fields:
+        - idle_timeout (float): Number of seconds of log time after a run's last record that the run is considered
+            complete
+        - runs_by_key (Dict[str, RunTimeline]): Value of an identifying event field to run
+        - runs_by_logger (Dict[str, RunTimeline]): Invocation to run, see iter_records
+        - open_runs (List[RunTimeline]): Runs which have not been completed
+        - latest_timestamp (float): Unix time of the newest record
+    """
+
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.runs_by_key = {}
+        self.runs_by_logger = {}
+        self.open_runs = []
+        self.latest_timestamp = None
+
+        self.__records_since_expire__ = 0
+
+    def __link__(self, run: RunTimeline, event: Dict[str, object]) -> RunTimeline:
+        """ Adds an event's identifying fields to a run, merging runs which turn out to be the same
+        Args:
+            - run: Run the event is part of, None if not known
+            - event: Event
+
+        Returns: Run
+        """
+        for field in RUN_KEY_FIELDS:
+            if field not in event:
+                continue
+
+            key = "{}={}".format(field, event[field])
+            key_run = self.runs_by_key.get(key, None)
+
+            if key_run is None:
+                if run is None:
+                    run = self.__new_run__()
+
+                self.runs_by_key[key] = run
+                run.keys[field] = event[field]
+            elif run is None:
+                run = key_run
+            elif key_run is not run:
+                run = self.__merge__(key_run, run)
+
+        if run is None:
+            run = self.__new_run__()
+
+        return run
+
+    def __new_run__(self) -> RunTimeline:
+        run = RunTimeline()
+        self.open_runs.append(run)
+
+        return run
+
+    def __merge__(self, run: RunTimeline, other: RunTimeline) -> RunTimeline:
+        """ Moves other's invocations into run
+        Returns: run
+        """
+        run.invocations = sorted(run.invocations + other.invocations, key=lambda invocation: invocation['started_at'])
+        run.loggers += other.loggers
+        run.last_seen = max(run.last_seen or 0, other.last_seen or 0)
+        run.completed = run.completed or other.completed
+
+        for step, seconds in other.overshoot.items():
+            run.overshoot[step] = run.overshoot.get(step, 0) + seconds
+
+        for field, value in other.keys.items():
+            run.keys.setdefault(field, value)
+            self.runs_by_key["{}={}".format(field, value)] = run
+
+        for logger in other.loggers:
+            self.runs_by_logger[logger] = run
+
+        self.open_runs.remove(other)
+
+        return run
+
+    def add(self, record: Dict[str, object]) -> List[RunTimeline]:
+        """ Adds a record to its run
+        Args:
+            - record: Record, see iter_records
+
+        Returns: Runs which completed
+        """
+        timestamp = record['timestamp']
+        message = record['message']
+
+        if self.latest_timestamp is None or timestamp > self.latest_timestamp:
+            self.latest_timestamp = timestamp
+
+        run = self.runs_by_logger.get(record['invocation'], None)
+
+        invoking_match = INVOKING_PATTERN.match(message)
+        if invoking_match is not None:
+            event = parse_event(invoking_match.group('event'))
+
+            if event is not None:
+                run = self.__link__(run, event)
+
+                self.runs_by_logger[record['invocation']] = run
+                run.loggers.append(record['invocation'])
+
+                # Record how late a repeat was, preferring the due time Jobs add to events
+                due_at = run.repeat_due_at.pop(record['step'], None)
+                if 'due_at' in event:
+                    due_at = event['due_at']
+
+                if event.get('iteration_count', 0) > 0 and due_at is not None:
+                    run.overshoot[record['step']] = run.overshoot.get(record['step'], 0) + max(0, timestamp - due_at)
+
+                run.invocations.append({'step': record['step'], 'started_at': timestamp})
+
+        if run is None:
+            return self.__expire__()
+
+        run.last_seen = max(run.last_seen or timestamp, timestamp)
+
+        invoked_match = INVOKED_PATTERN.match(message)
+        if invoked_match is not None:
+            event = parse_event(invoked_match.group('event'))
+
+            if event is not None:
+                run = self.__link__(run, event)
+
+        for repeat_pattern in REPEAT_PATTERNS:
+            repeat_match = repeat_pattern.match(message)
+
+            if repeat_match is not None:
+                run.repeat_due_at[record['step']] = timestamp + float(repeat_match.group('delay'))
+
+        completed = []
+
+        if message == TERMINATE_MESSAGE:
+            run.completed = True
+
+            self.__close__(run)
+            completed.append(run)
+
+        return completed + self.__expire__()
+
+    def __close__(self, run: RunTimeline):
+        """ Removes a run, so it is no longer kept in memory
+        """
+        self.open_runs.remove(run)
+
+        for field, value in run.keys.items():
+            self.runs_by_key.pop("{}={}".format(field, value), None)
+
+        for logger in run.loggers:
+            self.runs_by_logger.pop(logger, None)
+
+    def __expire__(self) -> List[RunTimeline]:
+        """ Closes runs which have not logged a record within the idle timeout, checked every 1000 records
+        Returns: Closed runs
+        """
+        self.__records_since_expire__ += 1
+
+        if self.__records_since_expire__ < 1000:
+            return []
+
+        self.__records_since_expire__ = 0
+
+        return self.flush(self.latest_timestamp - self.idle_timeout)
+
+    def flush(self, before: float = None) -> List[RunTimeline]:
+        """ Closes open runs
+        Args:
+            - before: Only close runs whose last record is older than this unix time, None to close every run
+
+        Returns: Closed runs
+        """
+        closed = []
+
+        for run in list(self.open_runs):
+            if before is None or run.last_seen is None or run.last_seen < before:
+                self.__close__(run)
+                closed.append(run)
+
+        return closed
+
+
+class TimelineSummary:
+    """ Summarizes many run timelines, keeping only the values needed for percentiles
+    Fields:
+        - run_count (int): Number of runs
+        - steps (Dict[str, Dict[str, List[float]]]): Step name to dict of `seconds`, `invocations` and
+            `overshoot_seconds` values, one per run
+        - critical_steps (Dict[str, int]): Step name to number of runs in which it took the longest
+        - days (Dict[str, Dict[str, object]]): UTC date to dict with the `runs`, `completed`, `total_seconds` and
+            `overshoot_seconds` fields
+    """
+
+    def __init__(self):
+        self.run_count = 0
+        self.steps = {}
+        self.critical_steps = {}
+        self.days = {}
+
+    def add(self, timeline: Dict[str, object]):
+        """ Adds a run's timeline, see RunTimeline.summarize
+        """
+        self.run_count += 1
+
+        if timeline['critical_step'] is not None:
+            self.critical_steps[timeline['critical_step']] = self.critical_steps.get(timeline['critical_step'], 0) + 1
+
+        overshoot_seconds = 0
+
+        for step in timeline['steps']:
+            values = self.steps.setdefault(step['step'], {'seconds': [], 'invocations': [], 'overshoot_seconds': []})
+
+            for field in values.keys():
+                values[field].append(step[field])
+
+            overshoot_seconds += step['overshoot_seconds']
+
+        date = datetime.datetime.fromtimestamp(timeline['started_at'], datetime.timezone.utc).date().isoformat()
+        day = self.days.setdefault(date, {'runs': 0, 'completed': 0, 'total_seconds': [], 'overshoot_seconds': []})
+
+        day['runs'] += 1
+        day['total_seconds'].append(timeline['total_seconds'])
+        day['overshoot_seconds'].append(overshoot_seconds)
+
+        if timeline['completed']:
+            day['completed'] += 1
+
+    def report(self) -> Dict[str, object]:
+        """ Returns: Dict with the `run_count`, `critical_steps`, `steps` and `days` fields
+        """
+        steps = {}
+        for step_name, values in self.steps.items():
+            steps[step_name] = {
+                'runs': len(values['seconds']),
+                'p50_seconds': percentile(values['seconds'], 0.5),
+                'p90_seconds': percentile(values['seconds'], 0.9),
+                'mean_invocations': sum(values['invocations']) / len(values['invocations']),
+                'mean_overshoot_seconds': sum(values['overshoot_seconds']) / len(values['overshoot_seconds'])
+            }
+
+        days = {}
+        for date, day in sorted(self.days.items()):
+            days[date] = {
+                'runs': day['runs'],
+                'completed': day['completed'],
+                'p50_total_seconds': percentile(day['total_seconds'], 0.5),
+                'max_total_seconds': max(day['total_seconds']),
+                'mean_overshoot_seconds': sum(day['overshoot_seconds']) / len(day['overshoot_seconds'])
+            }
+
+        return {
+            'run_count': self.run_count,
+            'critical_steps': self.critical_steps,
+            'steps': steps,
+            'days': days
+        }
+
+
+def print_timeline(timeline: Dict[str, object]):
+    """ Prints a run's timeline as a table
+    """
+    started_at = datetime.datetime.fromtimestamp(timeline['started_at'], datetime.timezone.utc)
+
+    print("run {} started={} total_seconds={:.1f} completed={}".format(timeline['run_id'], started_at.isoformat(),
+                                                                       timeline['total_seconds'],
+                                                                       timeline['completed']))
+
+    for step in timeline['steps']:
+        marker = '*' if step['step'] == timeline['critical_step'] else ' '
+
+        print("  {} {:<28} {:>10.1f} {:>8} {:>14.1f}".format(marker, step['step'], step['seconds'],
+                                                           step['invocations'], step['overshoot_seconds']))
+
+
+def print_report(report: Dict[str, object]):
+    """ Prints a TimelineSummary report as tables
+    """
+    print("runs={} critical_steps={}".format(report['run_count'], json.dumps(report['critical_steps'],
+                                                                             sort_keys=True)))
+    print()
+    print("{:<28} {:>6} {:>12} {:>12} {:>12} {:>14}".format('step', 'runs', 'p50_seconds', 'p90_seconds',
+                                                           'invocations', 'overshoot_sec'))
+
+    for step_name, step in report['steps'].items():
+        print("{:<28} {:>6} {:>12.1f} {:>12.1f} {:>12.1f} {:>14.1f}"
+              .format(step_name, step['runs'], step['p50_seconds'], step['p90_seconds'], step['mean_invocations'],
+                      step['mean_overshoot_seconds']))
+
+    print()
+    print("{:<12} {:>6} {:>10} {:>18} {:>18} {:>14}".format('date', 'runs', 'completed', 'p50_total_seconds',
+                                                           'max_total_seconds', 'overshoot_sec'))
+
+    for date, day in report['days'].items():
+        print("{:<12} {:>6} {:>10} {:>18.1f} {:>18.1f} {:>14.1f}"
+              .format(date, day['runs'], day['completed'], day['p50_total_seconds'], day['max_total_seconds'],
+                      day['mean_overshoot_seconds']))
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Build a timeline of each pipeline run from exported step logs")
+    parser.add_argument('files', nargs='+', help="Log files, - to read from stdin")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="Seconds of log time after a run's last record that it is considered complete")
+    parser.add_argument('--runs', action='store_true', help="Print the timeline of every run")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    builder = TimelineBuilder(idle_timeout=args.idle_timeout)
+    summary = TimelineSummary()
+
+    def report_runs(runs: List[RunTimeline]):
+        for run in runs:
+            if len(run.invocations) == 0:
+                continue
+
+            timeline = run.summarize()
+            summary.add(timeline)
+
+            if args.runs:
+                if args.json:
+                    print(json.dumps(timeline, sort_keys=True))
+                else:
+                    print_timeline(timeline)
+
+    for path in args.files:
+        for record in iter_records(path):
+            report_runs(builder.add(record))
+
+    report_runs(builder.flush())
+
+    if args.json:
+        print(json.dumps(summary.report(), sort_keys=True))
+    else:
+        if args.runs:
+            print()
+
+        print_report(summary.report())
+
+
+if __name__ == '__main__':
+    main()
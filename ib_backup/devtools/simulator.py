@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+""" Simulates running the entire pipeline, from the create volume step to the cleanup step, without AWS
+
+Steps run in process (see run_pipeline.py) against a simulated EC2 API and the fake Salt API. Simulated volumes move
+through the creating, available, in-use and detaching states, and Salt jobs complete, after a number of seconds drawn
+from configurable latency distributions. Time is provided by a lib.clock.VirtualClock, so waiting an hour takes no
+time.
+
+Reports for each run:
+    - total_seconds: Simulated time from the first step starting until the last step finished
+    - critical_path: Each step on the critical path in the order it ran, with the simulated time from the step
+        starting until the next step on the path started, the number of times the step was invoked, and the time spent
+        inside invocations
+    - invocations: Number of times each step was invoked
+    - api_calls: Number of calls to each EC2 API method, and requests to each Salt API path
+
+Latencies are given as DISTRIBUTION:PARAMETERS, in seconds:
+    - fixed:SECONDS
+    - uniform:MIN,MAX
+    - normal:MEAN,STDDEV, negative samples are 0
+    - lognormal:MEDIAN,SIGMA
+
+Usage: python -m devtools.simulator [--volume-create uniform:60,300] [--salt-job lognormal:900,0.5] [--runs 10]
+
+Run from the ib_backup directory.
+"""
+import os
+import copy
+import json
+import math
+import time
+import random
+import fnmatch
+import logging
+import argparse
+import datetime
+from typing import Dict, List
+
+import lib.clock
+import lib.steps
+import lib.salt
+import lib.aws_ec2
+import lib.aws_clients
+import lib.store
+import run_pipeline
+import step_setup_test
+import step_teardown_test
+from devtools.fake_salt_api import FakeSaltAPIServer, FakeSaltMaster
+from devtools.stats import percentile
+
+# Names and IDs of the simulated EC2 resources
+DEV_INSTANCE_NAME = 'ib02.dev.code418.net'
+DEV_INSTANCE_ID = 'i-00000000000000dev'
+PROD_INSTANCE_NAME = 'ib-backup.us-east-1.code418.net'
+PROD_INSTANCE_ID = 'i-0000000000000prod'
+PROD_DATA_VOLUME_ID = 'vol-0000000000000prod'
+PROD_DATA_DEVICE_NAME = '/dev/sdg'
+SNAPSHOT_ID = 'snap-00000000000000001'
+SNAPSHOT_SIZE = 500
+
+# Default latency of each simulated operation
+DEFAULT_LATENCIES = {
+    'api_call': 'uniform:0.05,0.3',
+    'volume_create': 'lognormal:240,0.5',
+    'volume_attach': 'uniform:5,30',
+    'volume_detach': 'uniform:5,60',
+    'salt_state': 'uniform:10,60',
+    'salt_job': 'lognormal:1200,0.3'
+}
+
+
+class Latency:
+    """ Distribution of the number of seconds an operation takes
+    Fields:
+        - distribution (str): Name of distribution, a key of DISTRIBUTIONS
+        - params (List[float]): Distribution parameters, see the module documentation
+        - rng (random.Random): Random number generator samples are drawn from
+    """
+
+    # Distribution name to number of parameters
+    DISTRIBUTIONS = {
+        'fixed': 1,
+        'uniform': 2,
+        'normal': 2,
+        'lognormal': 2
+    }
+
+    def __init__(self, distribution: str, params: List[float], rng: random.Random):
+        """ Creates a Latency
+        Args:
+            - distribution, params, rng: See class fields
+
+        Raises:
+            - ValueError: If the distribution does not exist, or the wrong number of parameters are provided
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError("Unknown distribution \"{}\", must be one of: {}"
+                             .format(distribution, list(self.DISTRIBUTIONS.keys())))
+
+        if len(params) != self.DISTRIBUTIONS[distribution]:
+            raise ValueError("Distribution \"{}\" takes {} parameters, got: {}"
+                             .format(distribution, self.DISTRIBUTIONS[distribution], params))
+
+        self.distribution = distribution
+        self.params = params
+        self.rng = rng
+
+    def sample(self) -> float:
+        """ Returns: Number of seconds
+        """
+        if self.distribution == 'fixed':
+            return self.params[0]
+        elif self.distribution == 'uniform':
+            return self.rng.uniform(self.params[0], self.params[1])
+        elif self.distribution == 'normal':
+            return max(0, self.rng.gauss(self.params[0], self.params[1]))
+        else:  # lognormal
+            return self.params[0] * math.exp(self.rng.gauss(0, self.params[1]))
+
+
+def parse_latency(spec: str, rng: random.Random) -> Latency:
+    """ Parses a latency distribution
+    Args:
+        - spec: Distribution in the DISTRIBUTION:PARAMETERS format, see the module documentation
+        - rng: Random number generator samples are drawn from
+
+    Raises:
+        - ValueError: If spec is not valid
+
+    Returns: Latency
+    """
+    distribution, _, params = spec.partition(':')
+
+    try:
+        return Latency(distribution, [float(param) for param in params.split(',')], rng)
+    except ValueError as e:
+        raise ValueError("Invalid latency \"{}\": {}".format(spec, e))
+
+
+class SimulatedPaginator:
+    """ Paginator which returns a simulated client's response as one page
+    """
+
+    def __init__(self, client: 'SimulatedEC2', method: str):
+        self.client = client
+        self.method = method
+
+    def paginate(self, **kwargs) -> List[Dict[str, object]]:
+        return [getattr(self.client, self.method)(**kwargs)]
+
+
+class SimulatedEC2:
+    """ EC2 API client which simulates the instances, snapshots and volumes used by the pipeline
+    Volume state changes complete after a number of seconds drawn from the `volume_create`, `volume_attach` and
+    `volume_detach` latencies. Every API call takes a number of seconds drawn from the `api_call` latency. Time is read
+    from lib.clock.
+
+    Fields:
+        - latencies (Dict[str, Latency]): Operation name to latency
+        - calls (Dict[str, int]): Number of calls to each method, keys are prefixed with "ec2."
+        - instances (List[Dict[str, object]]): Instances
+        - snapshots (List[Dict[str, object]]): Snapshots
+        - volumes (Dict[str, Dict[str, object]]): Volume ID to dict with the `volume` and `changes_at` fields,
+            `changes_at` is the unix time the volume's pending state change completes, None if no change is pending
+    """
+
+    def __init__(self, latencies: Dict[str, Latency], calls: Dict[str, int]):
+        self.latencies = latencies
+        self.calls = calls
+
+        self.instances = [
+            self.__instance__(DEV_INSTANCE_ID, DEV_INSTANCE_NAME, 'vol-00000000000000dev'),
+            self.__instance__(PROD_INSTANCE_ID, PROD_INSTANCE_NAME, PROD_DATA_VOLUME_ID)
+        ]
+        self.snapshots = [{
+            'SnapshotId': SNAPSHOT_ID,
+            'VolumeId': PROD_DATA_VOLUME_ID,
+            'VolumeSize': SNAPSHOT_SIZE,
+            'State': 'completed',
+            'StartTime': datetime.datetime.fromtimestamp(lib.clock.now() - (60 * 60), datetime.timezone.utc),
+            'Tags': []
+        }]
+        self.volumes = {}
+
+        self.__next_volume_number__ = 1
+
+    def __instance__(self, instance_id: str, name: str, data_volume_id: str) -> Dict[str, object]:
+        return {
+            'InstanceId': instance_id,
+            'State': {'Name': 'running'},
+            'Tags': [{'Key': 'Name', 'Value': name}],
+            'Placement': {'AvailabilityZone': 'us-east-1a'},
+            'BlockDeviceMappings': [{'DeviceName': PROD_DATA_DEVICE_NAME, 'Ebs': {'VolumeId': data_volume_id}}]
+        }
+
+    def __call_api__(self, method: str):
+        """ Records an API call and waits for the call's latency
+        Args:
+            - method: Name of API method
+        """
+        name = "ec2.{}".format(method)
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        lib.clock.sleep(self.latencies['api_call'].sample())
+
+    def __get_volume__(self, volume_id: str) -> Dict[str, object]:
+        """ Completes a volume's pending state change if it is due
+        Args:
+            - volume_id: ID of volume
+
+        Raises:
+            - ValueError: If the volume does not exist
+
+        Returns: Volume
+        """
+        if volume_id not in self.volumes:
+            raise ValueError("InvalidVolume.NotFound: The volume '{}' does not exist".format(volume_id))
+
+        entry = self.volumes[volume_id]
+        volume = entry['volume']
+
+        if entry['changes_at'] is None or entry['changes_at'] > lib.clock.now():
+            return volume
+
+        entry['changes_at'] = None
+
+        if volume['State'] == 'creating':
+            volume['State'] = 'available'
+
+        for attachment in list(volume['Attachments']):
+            if attachment['State'] == 'attaching':
+                attachment['State'] = 'attached'
+            elif attachment['State'] == 'detaching':
+                volume['Attachments'].remove(attachment)
+                volume['State'] = 'available'
+
+        return volume
+
+    def __change_volume__(self, volume_id: str, latency_name: str):
+        """ Schedules a volume's pending state change to complete
+        Args:
+            - volume_id: ID of volume
+            - latency_name: Name of latency which determines how long the change takes
+        """
+        self.volumes[volume_id]['changes_at'] = lib.clock.now() + self.latencies[latency_name].sample()
+
+    def get_paginator(self, method: str) -> SimulatedPaginator:
+        return SimulatedPaginator(self, method)
+
+    def describe_instances(self, Filters: List[Dict[str, object]] = []) -> Dict[str, object]:
+        self.__call_api__('describe_instances')
+
+        names = None
+        states = None
+        for api_filter in Filters:
+            if api_filter['Name'] == 'tag:Name':
+                names = api_filter['Values']
+            elif api_filter['Name'] == 'instance-state-name':
+                states = api_filter['Values']
+
+        reservations = []
+
+        for instance in self.instances:
+            if (names is None or instance['Tags'][0]['Value'] in names) and \
+                    (states is None or instance['State']['Name'] in states):
+                reservations.append({'Instances': [copy.deepcopy(instance)]})
+
+        return {'Reservations': reservations}
+
+    def describe_snapshots(self, Filters: List[Dict[str, object]] = []) -> Dict[str, object]:
+        self.__call_api__('describe_snapshots')
+
+        snapshots = []
+
+        for snapshot in self.snapshots:
+            values = {
+                'volume-id': snapshot['VolumeId'],
+                'status': snapshot['State'],
+                'start-time': snapshot['StartTime'].isoformat()
+            }
+
+            if all([any([fnmatch.fnmatchcase(values[api_filter['Name']], pattern)
+                         for pattern in api_filter['Values']])
+                    for api_filter in Filters]):
+                snapshots.append(copy.deepcopy(snapshot))
+
+        return {'Snapshots': snapshots}
+
+    def create_tags(self, Resources: List[str], Tags: List[Dict[str, str]]) -> Dict[str, object]:
+        self.__call_api__('create_tags')
+
+        for snapshot in self.snapshots:
+            if snapshot['SnapshotId'] in Resources:
+                tag_keys = [tag['Key'] for tag in Tags]
+                snapshot['Tags'] = [tag for tag in snapshot['Tags'] if tag['Key'] not in tag_keys] + Tags
+
+        return {}
+
+    def create_volume(self, AvailabilityZone: str, SnapshotId: str, Size: int, **kwargs) -> Dict[str, object]:
+        self.__call_api__('create_volume')
+
+        volume_id = "vol-{:017d}".format(self.__next_volume_number__)
+        self.__next_volume_number__ += 1
+
+        self.volumes[volume_id] = {
+            'volume': {
+                'VolumeId': volume_id,
+                'SnapshotId': SnapshotId,
+                'Size': Size,
+                'AvailabilityZone': AvailabilityZone,
+                'State': 'creating',
+                'Attachments': []
+            },
+            'changes_at': None
+        }
+        self.__change_volume__(volume_id, 'volume_create')
+
+        return {'VolumeId': volume_id, 'State': 'creating'}
+
+    def describe_volumes(self, VolumeIds: List[str]) -> Dict[str, object]:
+        self.__call_api__('describe_volumes')
+
+        return {'Volumes': [copy.deepcopy(self.__get_volume__(volume_id)) for volume_id in VolumeIds
+                            if volume_id in self.volumes]}
+
+    def attach_volume(self, Device: str, InstanceId: str, VolumeId: str) -> Dict[str, object]:
+        self.__call_api__('attach_volume')
+
+        volume = self.__get_volume__(VolumeId)
+
+        if volume['State'] != 'available':
+            raise ValueError("IncorrectState: Volume '{}' is {}".format(VolumeId, volume['State']))
+
+        volume['State'] = 'in-use'
+        volume['Attachments'].append({
+            'VolumeId': VolumeId,
+            'InstanceId': InstanceId,
+            'Device': Device,
+            'State': 'attaching'
+        })
+        self.__change_volume__(VolumeId, 'volume_attach')
+
+        return {'State': 'attaching'}
+
+    def detach_volume(self, Device: str, InstanceId: str, VolumeId: str) -> Dict[str, object]:
+        self.__call_api__('detach_volume')
+
+        volume = self.__get_volume__(VolumeId)
+
+        if volume['State'] != 'in-use' or volume['Attachments'][0]['State'] != 'attached':
+            raise ValueError("IncorrectState: Volume '{}' is not attached".format(VolumeId))
+
+        volume['Attachments'][0]['State'] = 'detaching'
+        self.__change_volume__(VolumeId, 'volume_detach')
+
+        return {'State': 'detaching'}
+
+    def delete_volume(self, VolumeId: str) -> Dict[str, object]:
+        self.__call_api__('delete_volume')
+
+        volume = self.__get_volume__(VolumeId)
+
+        if volume['State'] != 'available':
+            raise ValueError("VolumeInUse: Volume '{}' is {}".format(VolumeId, volume['State']))
+
+        del self.volumes[VolumeId]
+
+        return {}
+
+
+def critical_path(invocations: List[Dict[str, object]], finished_at: float) -> List[Dict[str, object]]:
+    """ Determines how long each step on the pipeline's critical path took
+    The critical path is found by starting at the last step, then repeatedly moving to the step it runs after which
+    finished last, see lib.steps.GRAPH. Steps on parallel branches which finished earlier did not delay the run. The
+    time from a step's first invocation until the next step on the path's first invocation is time the pipeline spent
+    on that step. A step which joins branches is invoked by each branch, the invocation by the branch on the path is
+    when the step started.
+
+    Args:
+        - invocations: lib.dispatch.InProcessDispatcher invocations
+        - finished_at: Time the last step finished
+
+    Returns: Steps on the critical path in the order they first ran, each has the `step`, `seconds`, `invocations` and
+        `busy_seconds` fields
+    """
+    steps = {}
+
+    for invocation in invocations:
+        step_name = invocation['lambda_name']
+
+        if step_name not in steps:
+            steps[step_name] = {
+                'step': step_name,
+                'started_at': invocation['started_at'],
+                'finished_at': invocation['finished_at'],
+                'starts': [],
+                'seconds': 0,
+                'invocations': 0,
+                'busy_seconds': 0
+            }
+
+        steps[step_name]['starts'].append(invocation['started_at'])
+        steps[step_name]['finished_at'] = max(steps[step_name]['finished_at'], invocation['finished_at'])
+        steps[step_name]['invocations'] += 1
+        steps[step_name]['busy_seconds'] += invocation['finished_at'] - invocation['started_at']
+
+    path = []
+    ran_steps = [step_name for step_name in lib.steps.GRAPH.order if step_name in steps]
+    step_name = ran_steps[-1] if len(ran_steps) > 0 else None
+
+    while step_name is not None:
+        path.insert(0, steps[step_name])
+
+        previous_steps = [previous for previous in lib.steps.GRAPH.previous_steps.get(step_name, [])
+                          if previous in steps]
+        step_name = max(previous_steps, key=lambda previous: steps[previous]['finished_at'], default=None)
+
+    for previous_step, step in zip(path, path[1:]):
+        step['started_at'] = min([started_at for started_at in step['starts']
+                                  if started_at >= previous_step['finished_at']], default=step['started_at'])
+
+    for i, step in enumerate(path):
+        step_finished_at = finished_at
+        if i + 1 < len(path):
+            step_finished_at = path[i + 1]['started_at']
+
+        step['seconds'] = step_finished_at - step['started_at']
+
+    for step in path:
+        del step['started_at']
+        del step['finished_at']
+        del step['starts']
+
+    return path
+
+
+def simulate(latencies: Dict[str, str], seed: int = None) -> Dict[str, object]:
+    """ Runs the pipeline once against simulated services
+    Sets the environment variables used by steps, and replaces the shared lib.clock and EC2 client while running.
+
+    Args:
+        - latencies: Operation name to latency distribution, see DEFAULT_LATENCIES for operation names. Operations
+            which are not provided use their default latency
+        - seed: Random seed, None to use a random seed
+
+    Raises:
+        - ValueError: If a latency is not valid
+        - Any exception raised by a step
+
+    Returns: Result, see the module documentation
+    """
+    rng = random.Random(seed)
+
+    # Polling policies add jitter using the shared random module
+    random.seed(rng.random())
+
+    operation_latencies = {}
+    for operation, spec in DEFAULT_LATENCIES.items():
+        operation_latencies[operation] = parse_latency(latencies.get(operation, spec), rng)
+
+    clock = lib.clock.VirtualClock()
+    previous_clock = lib.clock.set_clock(clock)
+
+    wall_start = time.perf_counter()
+    salt_server = None
+
+    try:
+        # Simulated services
+        calls = {}
+
+        lib.aws_clients.registry.register(SimulatedEC2(operation_latencies, calls), 'ec2')
+        lib.aws_ec2.get_instance_resolver().invalidate()
+
+        state_durations = {
+            step_setup_test.SetupTestJob.state_name: operation_latencies['salt_state'].sample,
+            step_teardown_test.TeardownTestJob.state_name: operation_latencies['salt_state'].sample
+        }
+
+        salt_server = FakeSaltAPIServer(FakeSaltMaster(job_duration=operation_latencies['salt_job'].sample,
+                                                       state_durations=state_durations)).start()
+
+        # Steps would use real AWS resources, or local files, configured by these variables
+        for env_var in lib.store.RESOURCE_ENV_VARS:
+            os.environ.pop(env_var, None)
+
+        os.environ['SALT_API_URL'] = salt_server.url
+        os.environ['SALT_API_USER'] = 'simulator'
+        os.environ['SALT_API_PASSWORD'] = 'simulator'
+
+        # Run
+        started_at = clock.time()
+
+        dispatcher = run_pipeline.new_dispatcher()
+        dispatcher.run({}, lib.steps.PIPELINE[0])
+
+        finished_at = clock.time()
+
+        for path, count in salt_server.master.request_counts.items():
+            if path.startswith('/jobs/'):
+                path = '/jobs/<job id>'
+
+            name = "salt.{}".format(path)
+            calls[name] = calls.get(name, 0) + count
+
+        invocations = {}
+        for invocation in dispatcher.invocations:
+            invocations[invocation['lambda_name']] = invocations.get(invocation['lambda_name'], 0) + 1
+
+        return {
+            'total_seconds': finished_at - started_at,
+            'wall_seconds': time.perf_counter() - wall_start,
+            'invocation_count': dispatcher.invocation_count,
+            'invocations': invocations,
+            'api_call_count': sum(calls.values()),
+            'api_calls': calls,
+            'critical_path': critical_path(dispatcher.invocations, finished_at)
+        }
+    finally:
+        lib.clock.set_clock(previous_clock)
+
+        if salt_server is not None:
+            salt_server.shutdown()
+            salt_server.server_close()
+            lib.salt.clients.pop(salt_server.url, None)
+
+
+def print_result(result: Dict[str, object]):
+    """ Prints a run's result as a table
+    """
+    print("{:<28} {:>10} {:>8} {:>12} {:>7}".format('step', 'seconds', 'invokes', 'busy_seconds', 'share'))
+
+    for step in result['critical_path']:
+        share = 0
+        if result['total_seconds'] > 0:
+            share = step['seconds'] / result['total_seconds']
+
+        print("{:<28} {:>10.1f} {:>8} {:>12.2f} {:>6.1f}%".format(step['step'], step['seconds'], step['invocations'],
+                                                                  step['busy_seconds'], share * 100))
+
+    print("total_seconds={:.1f} invocation_count={} api_call_count={} wall_seconds={:.3f}"
+          .format(result['total_seconds'], result['invocation_count'], result['api_call_count'],
+                  result['wall_seconds']))
+    print("api_calls={}".format(json.dumps(result['api_calls'], sort_keys=True)))
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Simulate the pipeline with configurable AWS and Salt latencies")
+
+    for operation, spec in DEFAULT_LATENCIES.items():
+        parser.add_argument("--{}".format(operation.replace('_', '-')), default=spec,
+                            help="Latency of {} operations, default: {}".format(operation, spec))
+
+    parser.add_argument('--runs', type=int, default=1, help="Number of times to run the pipeline")
+    parser.add_argument('--seed', type=int, help="Random seed of the first run, each run increments the seed")
+    parser.add_argument('--output', help="File to write every run's result to as JSON")
+    parser.add_argument('--verbose', action='store_true', help="Print step logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    latencies = {}
+    for operation in DEFAULT_LATENCIES.keys():
+        latencies[operation] = getattr(args, operation)
+
+    results = []
+
+    for i in range(args.runs):
+        seed = None
+        if args.seed is not None:
+            seed = args.seed + i
+
+        results.append(simulate(latencies, seed=seed))
+
+    if args.runs == 1:
+        print_result(results[0])
+    else:
+        for key in ['total_seconds', 'invocation_count', 'api_call_count']:
+            values = [result[key] for result in results]
+
+            print("{:<18} p50={:<10.1f} p90={:<10.1f} max={:<10.1f} mean={:.1f}"
+                  .format(key, percentile(values, 0.5), percentile(values, 0.9), max(values),
+                          sum(values) / len(values)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=4, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+import math
+from typing import List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """ Returns: Value below which the fraction of values fall, using the nearest rank, None if there are no values
+    """
+    if len(values) == 0:
+        return None
+
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, max(0, int(math.ceil(fraction * len(ordered))) - 1))]
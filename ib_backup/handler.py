@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" AWS Lambda entrypoint for every step and relay, so all lambdas can be deployed from one artifact
+
+The STEP_NAME environment variable names the module whose `main` function handles the invocation. Only that module is
+imported, the first time the lambda is invoked.
+
+Environment variables:
+    - STEP_NAME: Name of a step, or of a relay module, see HANDLER_MODULES
+"""
+import os
+import importlib
+
+import lib.steps
+
+# Modules which can handle invocations, step modules are named after their step
+HANDLER_MODULES = lib.steps.PIPELINE + ['delay_relay', 'volume_event_relay', 'resume_relay']
+
+
+def get_handler_module(name: str):
+    """ Imports the module which handles invocations for a step or relay
+    Args:
+        - name: Name of step or relay module
+
+    Raises:
+        - KeyError: If name is not in HANDLER_MODULES
+
+    Returns: Module
+    """
+    if name not in HANDLER_MODULES:
+        raise KeyError("Unknown step \"{}\", must be one of: {}".format(name, HANDLER_MODULES))
+
+    return importlib.import_module(name)
+
+
+def main(event, ctx):
+    """ Lambda function handler
+    Args:
+        - event: AWS event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    step_name = os.environ.get('STEP_NAME', None)
+
+    if not step_name:
+        raise KeyError("Missing environment variables: ['STEP_NAME']")
+
+    return get_handler_module(step_name).main(event, ctx)
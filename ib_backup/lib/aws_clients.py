@@ -0,0 +1,101 @@
+import json
+import time
+import threading
+from typing import Dict
+
+import lib.trace
+
+
+class ClientRegistry:
+    """ Creates AWS API clients once and reuses them
+    Creating a boto3 client loads the service's model, which is slow. Clients are cached per service, region, and
+    config. Use the shared registry via `get_client` so clients are kept between warm lambda invocations. boto3 is only
+    imported when the first client is created. The duration of each call made by a created client is recorded by
+    lib.trace.
+
+    Fields:
+        - clients (Dict[str, object]): Cache key to client
+        - hit_count (int): Number of times a cached client was returned
+        - construction_count (int): Number of clients created
+        - construction_seconds (float): Total time spent creating clients
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.hit_count = 0
+        self.construction_count = 0
+        self.construction_seconds = 0.0
+
+        self.__lock__ = threading.Lock()
+
+    def __key__(self, service_name: str, region_name: str, config: Dict[str, object]) -> str:
+        return "{}|{}|{}".format(service_name, region_name, json.dumps(config, sort_keys=True))
+
+    def register(self, client, service_name: str, region_name: str = None, config: Dict[str, object] = None):
+        """ Adds a client to the cache, used to replace AWS API clients with stubs
+        Args:
+            - client: Client returned by get_client for the service, region, and config
+            - service_name, region_name, config: See get_client
+        """
+        with self.__lock__:
+            self.clients[self.__key__(service_name, region_name, config)] = client
+
+    def get_client(self, service_name: str, region_name: str = None, config: Dict[str, object] = None):
+        """ Retrieves a client, creating it if it does not exist
+        Args:
+            - service_name: Name of AWS service
+            - region_name: AWS region, None to use the default region
+            - config: botocore.config.Config constructor arguments, None to use the default config
+
+        Returns: boto3 client
+        """
+        key = self.__key__(service_name, region_name, config)
+
+        with self.__lock__:
+            if key in self.clients:
+                self.hit_count += 1
+
+                return self.clients[key]
+
+            start = time.time()
+
+            import boto3
+            import botocore.config
+
+            client_args = {}
+
+            if region_name is not None:
+                client_args['region_name'] = region_name
+
+            if config is not None:
+                client_args['config'] = botocore.config.Config(**config)
+
+            client = boto3.client(service_name, **client_args)
+            lib.trace.instrument_aws_client(client)
+
+            self.construction_seconds += time.time() - start
+            self.construction_count += 1
+
+            self.clients[key] = client
+
+            return client
+
+    def stats(self) -> Dict[str, object]:
+        """ Returns: Dict with the `hit_count`, `construction_count`, and `construction_seconds` fields
+        """
+        with self.__lock__:
+            return {
+                'hit_count': self.hit_count,
+                'construction_count': self.construction_count,
+                'construction_seconds': self.construction_seconds
+            }
+
+
+# Shared registry, kept between warm lambda invocations
+registry = ClientRegistry()
+
+
+def get_client(service_name: str, region_name: str = None, config: Dict[str, object] = None):
+    """ Retrieves a client from the shared registry, see ClientRegistry.get_client
+    """
+    return registry.get_client(service_name, region_name=region_name, config=config)
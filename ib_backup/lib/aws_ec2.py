@@ -1,8 +1,126 @@
-from typing import Dict
+import os
+from typing import Dict, List
+
+import lib.clock
+
+# Number of seconds instances are cached by the shared InstanceResolver
+DEFAULT_INSTANCE_CACHE_TTL = 300
+
+# Instance states of instances which are not being replaced, instances in other states are ignored
+LIVE_INSTANCE_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+
+class InstanceResolver:
+    """ Finds EC2 instances by their Name tag, caches instances for a limited time
+    Many names are looked up with one describe_instances call. Instances which are shutting down or terminated are
+    ignored, so a replaced instance is never returned instead of its replacement. Use the shared resolver returned by
+    `get_instance_resolver` so the cache is kept between warm lambda invocations. Invalidate an instance's name if it
+    is replaced.
+
+    Fields:
+        - ttl (float): Number of seconds instances are cached for
+        - cache (Dict[str, Dict[str, object]]): Instance name to dict with `instance` and `expires_at` fields
+    """
+
+    def __init__(self, ttl: float = DEFAULT_INSTANCE_CACHE_TTL):
+        self.ttl = ttl
+        self.cache = {}
+
+    def resolve(self, ec2, names: List[str]) -> Dict[str, Dict[str, object]]:
+        """ Finds EC2 instances by their names
+        Args:
+            - ec2: AWS EC2 API client
+            - names: Names of EC2 instances to find
+
+        Raises:
+            - ValueError: If no EC2 instance, or multiple EC2 instances, have one of the names
+
+        Returns: Instance name to EC2 instance object
+        """
+        now = lib.clock.now()
+
+        instances = {}
+        missing_names = []
+
+        for name in names:
+            cached = self.cache.get(name, None)
+
+            if cached is not None and cached['expires_at'] > now:
+                instances[name] = cached['instance']
+            else:
+                missing_names.append(name)
+
+        if len(missing_names) == 0:
+            return instances
+
+        # Look up instances which are not cached, and are not being replaced
+        found = {}
+
+        instances_pager = ec2.get_paginator('describe_instances')
+        for instances_resp in instances_pager.paginate(Filters=[{
+            'Name': 'tag:Name',
+            'Values': missing_names
+        }, {
+            'Name': 'instance-state-name',
+            'Values': LIVE_INSTANCE_STATES
+        }]):
+            for reservation in instances_resp['Reservations']:
+                for instance in reservation['Instances']:
+                    for tag in instance.get('Tags', []):
+                        if tag['Key'] == 'Name' and tag['Value'] in missing_names:
+                            found.setdefault(tag['Value'], []).append(instance)
+
+        for name in missing_names:
+            if name not in found:
+                raise ValueError("Could not find EC2 instance with name: \"{}\"".format(name))
+
+            if len(found[name]) != 1:
+                raise ValueError("Multiple EC2 instances found with name: \"{}\"".format(name))
+
+            instance = found[name][0]
+            instances[name] = instance
+
+            self.cache[name] = {
+                'instance': instance,
+                'expires_at': now + self.ttl
+            }
+
+        return instances
+
+    def invalidate(self, names: List[str] = None):
+        """ Removes instances from the cache, so they are looked up again
+        Args:
+            - names: Names of instances to remove, None to remove all instances
+        """
+        if names is None:
+            self.cache = {}
+            return
+
+        for name in names:
+            self.cache.pop(name, None)
+
+
+# Shared resolver, kept between warm lambda invocations
+instance_resolver = None
+
+
+def get_instance_resolver() -> InstanceResolver:
+    """ Retrieves the shared instance resolver, creating it if it does not exist
+    The INSTANCE_CACHE_TTL environment variable sets the number of seconds instances are cached for.
+
+    Returns: Instance resolver
+    """
+    global instance_resolver
+
+    if instance_resolver is None:
+        instance_resolver = InstanceResolver(ttl=float(os.environ.get('INSTANCE_CACHE_TTL',
+                                                                      DEFAULT_INSTANCE_CACHE_TTL)))
+
+    return instance_resolver
 
 
 def find_instance_by_name(ec2, name: str) -> Dict[str, object]:
-    """ Finds an EC2 instance by its name
+    """ Finds an EC2 instance by its name, using the shared instance resolver
     Args:
         - ec2: AWS EC2 API client
         - name: Name of EC2 instance to find
@@ -12,19 +130,4 @@ def find_instance_by_name(ec2, name: str) -> Dict[str, object]:
 
     Returns: EC2 instance object
     """
-    instances_resp = ec2.describe_instances(Filters=[{
-        'Name': 'tag:Name',
-        'Values': [name]
-    }])
-
-    instances_rs = instances_resp['Reservations']
-
-    if len(instances_rs) == 0:
-        raise ValueError("Could not find EC2 instance with name: \"{}\"".format(name))
-
-    if len(instances_rs) != 1:
-        raise ValueError("Multiple EC2 instances found with name: \"{}\"".format(name))
-
-    instance = instances_rs[0]['Instances'][0]
-
-    return instance
+    return get_instance_resolver().resolve(ec2, [name])[name]
@@ -0,0 +1,136 @@
+import os
+import tempfile
+
+import lib.aws_clients
+import lib.store
+
+lib.store.register_env_vars('CLAIM_CHECK_BUCKET', 'CLAIM_CHECK_DIR')
+
+# Prefix of references to values stored in a directory
+FILE_REF_PREFIX = 'file://'
+
+# Prefix of references to values stored in S3
+S3_REF_PREFIX = 's3://'
+
+
+class ClaimCheckStore:
+    """ Stores large event fields outside of the event, so only a small reference is sent between steps
+    Values are stored under a key derived from their content, so storing the same value twice is safe.
+    """
+
+    def put(self, key: str, data: bytes) -> str:
+        """ Stores a value
+        Args:
+            - key: Key of value
+            - data: Value to store
+
+        Returns: Reference used to retrieve the value with `get`
+        """
+        raise NotImplementedError()
+
+    def get(self, ref: str) -> bytes:
+        """ Retrieves a value
+        Args:
+            - ref: Reference returned by `put`
+
+        Raises:
+            - ValueError: If ref is not a reference to this store
+            - KeyError: If no value is stored for ref
+
+        Returns: Value
+        """
+        raise NotImplementedError()
+
+
+class FileClaimCheckStore(ClaimCheckStore):
+    """ Stores values as files in a directory, used when running locally
+    Fields:
+        - directory (str): Directory files are written to, created if it does not exist
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, key: str, data: bytes) -> str:
+        path = os.path.join(self.directory, key)
+
+        # Write to a temporary file first so readers never see a partially written value
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+
+        os.replace(tmp_path, path)
+
+        return FILE_REF_PREFIX + path
+
+    def get(self, ref: str) -> bytes:
+        if not ref.startswith(FILE_REF_PREFIX):
+            raise ValueError("Not a file claim check reference: \"{}\"".format(ref))
+
+        path = ref[len(FILE_REF_PREFIX):]
+
+        try:
+            with open(path, 'rb') as value_file:
+                return value_file.read()
+        except FileNotFoundError:
+            raise KeyError("No claim check value stored for reference: \"{}\"".format(ref))
+
+
+class S3ClaimCheckStore(ClaimCheckStore):
+    """ Stores values as objects in an AWS S3 bucket
+    The lambda must be allowed to list the bucket, otherwise S3 responds to a missing object with 403 Access Denied
+    instead of 404 Not Found, and `get` raises the client error instead of a KeyError.
+
+    Fields:
+        - bucket (str): Name of S3 bucket
+        - prefix (str): Prefix of object keys
+    """
+
+    def __init__(self, bucket: str, prefix: str = 'claim-check/'):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def put(self, key: str, data: bytes) -> str:
+        s3 = lib.aws_clients.get_client('s3')
+
+        object_key = self.prefix + key
+
+        s3.put_object(Bucket=self.bucket, Key=object_key, Body=data)
+
+        return "{}{}/{}".format(S3_REF_PREFIX, self.bucket, object_key)
+
+    def get(self, ref: str) -> bytes:
+        bucket_prefix = "{}{}/".format(S3_REF_PREFIX, self.bucket)
+
+        if not ref.startswith(bucket_prefix):
+            raise ValueError("Not a claim check reference to bucket \"{}\": \"{}\"".format(self.bucket, ref))
+
+        s3 = lib.aws_clients.get_client('s3')
+
+        try:
+            resp = s3.get_object(Bucket=self.bucket, Key=ref[len(bucket_prefix):])
+        except s3.exceptions.NoSuchKey:
+            raise KeyError("No claim check value stored for reference: \"{}\"".format(ref))
+
+        return resp['Body'].read()
+
+
+def get_claim_check_store() -> ClaimCheckStore:
+    """ Creates the store large event fields are offloaded to, configured by the CLAIM_CHECK_BUCKET or
+    CLAIM_CHECK_DIR environment variables
+    Returns: Store which keeps values in the S3 bucket named by CLAIM_CHECK_BUCKET, or if not set in the directory
+        named by CLAIM_CHECK_DIR, None if neither are set
+    """
+    bucket = os.environ.get('CLAIM_CHECK_BUCKET', None)
+
+    if bucket:
+        return S3ClaimCheckStore(bucket)
+
+    directory = os.environ.get('CLAIM_CHECK_DIR', None)
+
+    if directory:
+        return FileClaimCheckStore(directory)
+
+    return None
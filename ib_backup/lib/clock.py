@@ -0,0 +1,98 @@
+import time
+
+
+class Clock:
+    """ Source of the current time, used by Jobs and delay queues to measure and wait for time
+    Use the shared clock via `now` and `sleep`. The shared clock can be replaced with `set_clock`, so simulations can
+    control time.
+    """
+
+    def time(self) -> float:
+        """ Returns: Current unix time
+        """
+        raise NotImplementedError()
+
+    def sleep(self, seconds: float):
+        """ Waits
+        Args:
+            - seconds: Number of seconds to wait
+        """
+        raise NotImplementedError()
+
+
+class SystemClock(Clock):
+    """ Clock which uses the system's time
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """ Clock which only moves forward when it is told to, sleeping returns immediately
+    Fields:
+        - current_time (float): Current unix time of the clock
+        - slept_seconds (float): Total number of seconds slept
+    """
+
+    def __init__(self, start_time: float = None):
+        """ Creates a VirtualClock
+        Args:
+            - start_time: Unix time the clock starts at, defaults to the system's time
+        """
+        self.current_time = start_time
+
+        if self.current_time is None:
+            self.current_time = time.time()
+
+        self.slept_seconds = 0.0
+
+    def time(self) -> float:
+        return self.current_time
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+        self.slept_seconds += max(0, seconds)
+
+    def advance(self, seconds: float):
+        """ Moves the clock forward
+        Args:
+            - seconds: Number of seconds to move forward, negative values are ignored
+        """
+        self.current_time += max(0, seconds)
+
+
+# Shared clock
+clock = SystemClock()
+
+
+def set_clock(new_clock: Clock) -> Clock:
+    """ Replaces the shared clock
+    Args:
+        - new_clock: Clock to use
+
+    Returns: Previous shared clock
+    """
+    global clock
+
+    previous_clock = clock
+    clock = new_clock
+
+    return previous_clock
+
+
+def now() -> float:
+    """ Returns: Current unix time of the shared clock
+    """
+    return clock.time()
+
+
+def sleep(seconds: float):
+    """ Waits using the shared clock
+    Args:
+        - seconds: Number of seconds to wait
+    """
+    clock.sleep(seconds)
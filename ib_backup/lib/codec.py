@@ -0,0 +1,88 @@
+import json
+from typing import Dict
+
+
+def get_yaml_loader() -> type:
+    """ Imports PyYAML and selects the fastest safe loader, PyYAML is only imported when YAML is used
+    Returns: LibYAML C parser loader if PyYAML was built with LibYAML, pure Python loader otherwise
+    """
+    import yaml
+
+    try:
+        return yaml.CSafeLoader
+    except AttributeError:
+        return yaml.SafeLoader
+
+
+class Codec:
+    """ Decodes Salt API response bodies
+    Fields:
+        - content_type (str): Media type requested from the Salt API via the Accept header
+    """
+    content_type = None
+
+    def decode(self, data: bytes) -> Dict[str, object]:
+        """ Decodes a response body
+        Args:
+            - data: Response body
+
+        Raises:
+            - ValueError: If data is not valid
+
+        Returns: Decoded response body
+        """
+        raise NotImplementedError()
+
+
+class JSONCodec(Codec):
+    """ Decodes JSON responses
+    """
+    content_type = 'application/json'
+
+    def decode(self, data: bytes) -> Dict[str, object]:
+        return json.loads(data.decode('utf-8'))
+
+
+class YAMLCodec(Codec):
+    """ Decodes YAML responses, using the LibYAML C parser if available
+    Fields:
+        - loader (type): PyYAML loader class, defaults to the loader returned by get_yaml_loader
+    """
+    content_type = 'application/x-yaml'
+
+    def __init__(self, loader: type = None):
+        self.loader = loader
+
+        if self.loader is None:
+            self.loader = get_yaml_loader()
+
+    def decode(self, data: bytes) -> Dict[str, object]:
+        import yaml
+
+        try:
+            return yaml.load(data, Loader=self.loader)
+        except yaml.YAMLError as e:
+            raise ValueError("Failed to parse YAML: {}".format(e))
+
+
+# Codecs by name
+CODECS = {
+    'json': JSONCodec,
+    'yaml': YAMLCodec
+}
+
+
+def get_codec(name: str) -> Codec:
+    """ Creates a codec
+    Args:
+        - name: Name of codec, a key of CODECS
+
+    Raises:
+        - KeyError: If no codec with name exists
+
+    Returns: Codec
+    """
+    if name not in CODECS:
+        raise KeyError("Unknown codec \"{}\", must be one of: {}".format(name, list(CODECS.keys())))
+
+    return CODECS[name]()
@@ -0,0 +1,173 @@
+import json
+import heapq
+import sqlite3
+import itertools
+from typing import Dict, List, Tuple
+
+import lib.aws_clients
+import lib.clock
+
+
+class DelayQueue:
+    """ Schedules a lambda to be invoked after a delay
+    Used by Job when a `handle` method returns NextAction.REPEAT, so the lambda does not have to sleep while it waits.
+    """
+
+    def schedule(self, event: Dict[str, object], lambda_name: str, delay: int):
+        """ Schedules a lambda invocation
+        Args:
+            - event: Event to send to the lambda
+            - lambda_name: Name of the lambda to invoke
+            - delay: Number of seconds to wait before invoking the lambda
+
+        Raises: Any exception on any failure
+        """
+        raise NotImplementedError()
+
+
+class SQSDelayQueue(DelayQueue):
+    """ Schedules lambda invocations by sending delayed messages to an AWS SQS queue
+    The queue triggers the delay relay lambda (delay_relay.py) which invokes the scheduled lambda. SQS can only delay
+    a message for up to MAX_DELAY_SECONDS. Longer delays are split into multiple messages by `relay_messages`.
+
+    Fields:
+        - queue_url (str): URL of SQS queue
+    """
+    MAX_DELAY_SECONDS = 900
+
+    def __init__(self, queue_url: str):
+        self.queue_url = queue_url
+
+    def schedule(self, event: Dict[str, object], lambda_name: str, delay: int):
+        not_before = lib.clock.now() + delay
+
+        self.__send_message__(event, lambda_name, not_before)
+
+    def __send_message__(self, event: Dict[str, object], lambda_name: str, not_before: float):
+        """ Sends a schedule message to the SQS queue
+        Args:
+            - event: Event to send to the lambda
+            - lambda_name: Name of the lambda to invoke
+            - not_before: Unix time before which the lambda should not be invoked
+        """
+        delay = int(max(0, min(self.MAX_DELAY_SECONDS, not_before - lib.clock.now())))
+
+        sqs = lib.aws_clients.get_client('sqs')
+
+        sqs.send_message(QueueUrl=self.queue_url,
+                         DelaySeconds=delay,
+                         MessageBody=json.dumps({
+                             'lambda_name': lambda_name,
+                             'event': event,
+                             'not_before': not_before
+                         }))
+
+    def relay_messages(self, records: List[Dict[str, object]], dispatcher) -> int:
+        """ Invokes the lambdas scheduled by SQS messages
+        Messages which were scheduled for longer than MAX_DELAY_SECONDS are sent back to the queue with the remaining
+        delay.
+
+        Args:
+            - records: Records field of the AWS SQS Lambda event
+            - dispatcher (lib.dispatch.Dispatcher): Used to invoke lambdas
+
+        Returns: Number of lambdas invoked
+        """
+        invoked_count = 0
+
+        for record in records:
+            body = json.loads(record['body'])
+
+            if body['not_before'] - lib.clock.now() >= 1:
+                self.__send_message__(body['event'], body['lambda_name'], body['not_before'])
+                continue
+
+            dispatcher.dispatch(body['event'], body['lambda_name'])
+            invoked_count += 1
+
+        return invoked_count
+
+
+class LocalDelayQueue(DelayQueue):
+    """ Delay queue which is stored locally, used when running steps in process
+    Scheduled invocations are not run automatically. Call `pop_due` to retrieve the invocations which should run.
+    """
+
+    def next_due(self) -> float:
+        """ Returns: Unix time the next scheduled invocation is due at, None if no invocations are scheduled
+        """
+        raise NotImplementedError()
+
+    def pop_due(self, now: float) -> List[Tuple[str, Dict[str, object]]]:
+        """ Removes scheduled invocations which are due
+        Args:
+            - now: Current unix time
+
+        Returns: List of (lambda name, event) tuples, in the order they are due
+        """
+        raise NotImplementedError()
+
+
+class MemoryDelayQueue(LocalDelayQueue):
+    """ Local delay queue which is stored in memory
+    Fields:
+        - scheduled (List[Tuple]): Heap of (due time, sequence number, lambda name, event) tuples
+    """
+
+    def __init__(self):
+        self.scheduled = []
+        self.__sequence__ = itertools.count()
+
+    def schedule(self, event: Dict[str, object], lambda_name: str, delay: int):
+        heapq.heappush(self.scheduled, (lib.clock.now() + delay, next(self.__sequence__), lambda_name, event))
+
+    def next_due(self) -> float:
+        if len(self.scheduled) == 0:
+            return None
+
+        return self.scheduled[0][0]
+
+    def pop_due(self, now: float) -> List[Tuple[str, Dict[str, object]]]:
+        due = []
+
+        while len(self.scheduled) > 0 and self.scheduled[0][0] <= now:
+            _, _, lambda_name, event = heapq.heappop(self.scheduled)
+            due.append((lambda_name, event))
+
+        return due
+
+
+class SqliteDelayQueue(LocalDelayQueue):
+    """ Local delay queue which is stored in a sqlite database, so scheduled invocations survive process restarts
+    Fields:
+        - db (sqlite3.Connection): Database connection
+    """
+
+    def __init__(self, db_path: str):
+        """ Creates a SqliteDelayQueue
+        Args:
+            - db_path: Path to sqlite database file, ':memory:' to not store the database in a file
+        """
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS delay_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, " +
+                        "due REAL NOT NULL, lambda_name TEXT NOT NULL, event TEXT NOT NULL)")
+        self.db.commit()
+
+    def schedule(self, event: Dict[str, object], lambda_name: str, delay: int):
+        with self.db:
+            self.db.execute("INSERT INTO delay_queue (due, lambda_name, event) VALUES (?, ?, ?)",
+                            (lib.clock.now() + delay, lambda_name, json.dumps(event)))
+
+    def next_due(self) -> float:
+        row = self.db.execute("SELECT MIN(due) FROM delay_queue").fetchone()
+
+        return row[0]
+
+    def pop_due(self, now: float) -> List[Tuple[str, Dict[str, object]]]:
+        with self.db:
+            rows = self.db.execute("SELECT id, lambda_name, event FROM delay_queue WHERE due <= ? ORDER BY due, id",
+                                   (now,)).fetchall()
+
+            self.db.executemany("DELETE FROM delay_queue WHERE id = ?", [(row[0],) for row in rows])
+
+        return [(row[1], json.loads(row[2])) for row in rows]
@@ -0,0 +1,185 @@
+import json
+import uuid
+import collections
+from typing import Dict, List, Callable
+
+import lib.delay_queue
+import lib.clock
+import lib.event_bus
+import lib.aws_clients
+import lib.store
+import lib.run_state
+
+
+class Dispatcher:
+    """ Delivers an event to the next step of a pipeline
+    Override the `dispatch` method to change how steps are invoked. Job uses a LambdaDispatcher by default.
+    """
+
+    def dispatch(self, event: Dict[str, object], lambda_name: str):
+        """ Sends an event to a step
+        Args:
+            - event: Event to provide to the step
+            - lambda_name: Name of step to invoke
+
+        Raises: Any exception on any failure
+
+        Returns: Backend specific invocation result, used for logging
+        """
+        raise NotImplementedError()
+
+
+class LambdaDispatcher(Dispatcher):
+    """ Invokes steps as asynchronous AWS Lambda functions
+    """
+
+    def dispatch(self, event: Dict[str, object], lambda_name: str):
+        lambda_client = lib.aws_clients.get_client('lambda')
+
+        return lambda_client.invoke(FunctionName=lambda_name,
+                                    InvocationType='Event',
+                                    Payload=json.dumps(event, separators=(',', ':')))
+
+
+class InProcessContext:
+    """ Stand in for the AWS Lambda invocation context when steps run in process
+    Fields:
+        - function_name (str): Name of step being run
+        - aws_request_id (str): Unique ID of the invocation
+    """
+
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+        self.aws_request_id = uuid.uuid4().hex
+
+    def get_remaining_time_in_millis(self) -> int:
+        """ Steps which run in process have no time limit. However 0 is returned so waiting steps are scheduled on the
+        dispatcher's delay queue instead of blocking other steps which are waiting to run.
+
+        Returns: 0
+        """
+        return 0
+
+
+class InProcessDispatcher(Dispatcher):
+    """ Runs steps one after another in the current Python process
+    Steps are registered with a factory which builds the step's Job. Dispatched events are queued and run in the order
+    they were dispatched by the `run` method. Steps which repeat are scheduled on a local delay queue, `run` waits for
+    them to become due once no other steps are left to run.
+
+    Fields:
+        - job_factories (Dict[str, Callable]): Step name to function which creates a Job for that step, the function is
+            called with the `next_lambda_name`, `next_lambda_names`, `dispatcher`, `delay_queue`, `event_bus` and
+            `run_state_store` keyword arguments
+        - next_steps (Dict[str, List[str]]): Step name to names of the steps which run after it
+        - pending (collections.deque): Queue of (step name, event) tuples waiting to be run
+        - delay_queue (lib.delay_queue.LocalDelayQueue): Schedules steps which repeat
+        - event_bus (lib.event_bus.EventBus): Event bus steps subscribe to, None to use the event bus configured by
+            the environment
+        - run_state_store (lib.run_state.RunStateStore): Checkpoints runs and joins branches, defaults to the store
+            configured by the environment, or if none is configured a store which keeps run states in memory
+        - invocation_count (int): Number of steps which have been run
+        - invocations (List[Dict[str, object]]): Steps which have been run, in order, each has the `lambda_name`,
+            `started_at` and `finished_at` fields. Times are read from lib.clock
+    """
+
+    def __init__(self, delay_queue: lib.delay_queue.LocalDelayQueue = None, event_bus: lib.event_bus.EventBus = None,
+                 run_state_store: lib.run_state.RunStateStore = None):
+        self.job_factories = {}
+        self.next_steps = {}
+        self.pending = collections.deque()
+
+        self.delay_queue = delay_queue
+
+        if self.delay_queue is None:
+            self.delay_queue = lib.delay_queue.MemoryDelayQueue()
+
+        self.event_bus = event_bus
+
+        self.run_state_store = run_state_store
+
+        if self.run_state_store is None:
+            self.run_state_store = lib.run_state.get_run_state_store()
+
+        if self.run_state_store is None:
+            self.run_state_store = lib.run_state.RunStateStore(lib.store.MemoryStore())
+
+        self.invocation_count = 0
+        self.invocations = []
+
+    def register(self, lambda_name: str, job_factory: Callable, next_lambda_name: str = None,
+                 next_lambda_names: List[str] = None):
+        """ Registers a step
+        Args:
+            - lambda_name: Name of step
+            - job_factory: Function which creates the step's Job, see the `job_factories` field
+            - next_lambda_name: Name of step to run after this step, None if this is the last step
+            - next_lambda_names: Names of steps to run after this step in parallel, overrides next_lambda_name
+        """
+        self.job_factories[lambda_name] = job_factory
+
+        self.next_steps[lambda_name] = next_lambda_names
+
+        if next_lambda_names is None:
+            self.next_steps[lambda_name] = [next_lambda_name] if next_lambda_name else []
+
+    def dispatch(self, event: Dict[str, object], lambda_name: str):
+        if lambda_name not in self.job_factories:
+            raise ValueError("No step registered with name: \"{}\"".format(lambda_name))
+
+        self.pending.append((lambda_name, event))
+
+        return {'queued': len(self.pending)}
+
+    def run(self, event: Dict[str, object], lambda_name: str):
+        """ Runs a step, and all the steps it dispatches, until no steps are left to run
+        Args:
+            - event: Event to provide to the first step
+            - lambda_name: Name of first step to run
+
+        Raises: Any exception raised by a step
+        """
+        self.dispatch(event, lambda_name)
+        self.run_pending()
+
+    def run_pending(self):
+        """ Runs the steps which have been dispatched, and all the steps they dispatch, until no steps are left to run
+        Raises: Any exception raised by a step
+        """
+        while True:
+            # Wait for a repeating step if nothing else is left to run
+            if len(self.pending) == 0:
+                next_due = self.delay_queue.next_due()
+
+                if next_due is None:
+                    return
+
+                lib.clock.sleep(max(0, next_due - lib.clock.now()))
+
+                for due_step_name, due_event in self.delay_queue.pop_due(lib.clock.now()):
+                    self.dispatch(due_event, due_step_name)
+
+                continue
+
+            step_name, step_event = self.pending.popleft()
+
+            next_steps = self.next_steps[step_name]
+
+            job = self.job_factories[step_name](next_lambda_name=next_steps[0] if len(next_steps) > 0 else None,
+                                                next_lambda_names={name: name for name in next_steps},
+                                                dispatcher=self, delay_queue=self.delay_queue,
+                                                event_bus=self.event_bus, run_state_store=self.run_state_store)
+
+            self.invocation_count += 1
+
+            invocation = {
+                'lambda_name': step_name,
+                'started_at': lib.clock.now(),
+                'finished_at': None
+            }
+            self.invocations.append(invocation)
+
+            try:
+                job.run(step_event, InProcessContext(step_name))
+            finally:
+                invocation['finished_at'] = lib.clock.now()
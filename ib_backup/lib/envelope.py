@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+from typing import Dict
+
+import lib.claim_check
+
+# Version of the event envelope written by `pack`, events without a version field are version 1
+EVENT_VERSION = 1
+
+# Event field which holds the version of the event envelope
+VERSION_FIELD = 'event_version'
+
+# Key of the dict which replaces a field stored in a claim check store
+CLAIM_CHECK_REF_KEY = 'claim_check_ref'
+
+# Fields whose JSON encoding is larger than this number of bytes are stored in the claim check store, if the
+# CLAIM_CHECK_THRESHOLD environment variable is not set
+DEFAULT_CLAIM_CHECK_THRESHOLD = 16 * 1024
+
+
+class EventSchema:
+    """ Fields a step requires in its event
+    Fields:
+        - fields (Dict[str, type]): Name of required field to the type its value must have
+    """
+
+    def __init__(self, fields: Dict[str, type]):
+        self.fields = fields
+
+    def validate(self, event: Dict[str, object]):
+        """ Checks an event has every required field, with the correct type, reporting every problem at once
+        Args:
+            - event: Event to check, after it was unpacked
+
+        Raises:
+            - KeyError: If fields are missing
+            - ValueError: If fields have the wrong type
+        """
+        missing_fields = []
+        wrong_type_fields = []
+
+        for name, field_type in self.fields.items():
+            if name not in event:
+                missing_fields.append(name)
+            elif not isinstance(event[name], field_type):
+                wrong_type_fields.append("{} (expected {}, got {})".format(name, field_type.__name__,
+                                                                          type(event[name]).__name__))
+
+        if len(missing_fields) > 0:
+            raise KeyError("event must contain fields: {}".format(missing_fields))
+
+        if len(wrong_type_fields) > 0:
+            raise ValueError("event fields have the wrong type: {}".format(wrong_type_fields))
+
+
+def get_claim_check_threshold() -> int:
+    """ Returns: Size in bytes above which fields are stored in the claim check store, configured by the
+        CLAIM_CHECK_THRESHOLD environment variable
+    """
+    return int(os.environ.get('CLAIM_CHECK_THRESHOLD', DEFAULT_CLAIM_CHECK_THRESHOLD))
+
+
+def encode_field(value: object) -> bytes:
+    """ Encodes an event field as compact JSON, keys are sorted so equal values have equal encodings
+    Args:
+        - value: Field value
+
+    Returns: JSON encoded value
+    """
+    return json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def is_ref(value: object) -> bool:
+    """ Returns: True if value is a reference to a field stored in a claim check store
+    """
+    return isinstance(value, dict) and CLAIM_CHECK_REF_KEY in value
+
+
+def pack(event: Dict[str, object], store: lib.claim_check.ClaimCheckStore, threshold: int,
+         known_refs: Dict[str, Dict[str, object]] = None) -> Dict[str, object]:
+    """ Builds the envelope sent to a step
+    Fields larger than threshold are stored in the claim check store and replaced by a reference, so the envelope stays
+    small enough to invoke a lambda with and is cheap to serialize and log.
+
+    Args:
+        - event: Event to send, not modified
+        - store: Store large fields are stored in, None to keep every field in the envelope
+        - threshold: Size in bytes of a field's JSON encoding above which the field is stored
+        - known_refs: SHA-256 digest of values which are already stored to their reference, values in here are not
+            stored again. References to newly stored values are added
+
+    Returns: Envelope
+    """
+    envelope = dict(event)
+    envelope[VERSION_FIELD] = EVENT_VERSION
+
+    if store is None:
+        return envelope
+
+    if known_refs is None:
+        known_refs = {}
+
+    for name, value in event.items():
+        if is_ref(value):
+            continue
+
+        data = encode_field(value)
+
+        if len(data) <= threshold:
+            continue
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        if digest not in known_refs:
+            known_refs[digest] = {
+                CLAIM_CHECK_REF_KEY: store.put(digest, data),
+                'sha256': digest,
+                'size': len(data)
+            }
+
+        envelope[name] = known_refs[digest]
+
+    return envelope
+
+
+def unpack(envelope: Dict[str, object], store: lib.claim_check.ClaimCheckStore,
+           known_refs: Dict[str, Dict[str, object]] = None) -> Dict[str, object]:
+    """ Retrieves the event from an envelope, loading fields stored in the claim check store
+    Args:
+        - envelope: Envelope a step was invoked with, not modified
+        - store: Store fields were stored in
+        - known_refs: References of loaded values are added by SHA-256 digest, so `pack` does not store them again
+
+    Raises:
+        - ValueError: If the envelope's version is not supported, or it has references but no store is provided
+
+    Returns: Event
+    """
+    version = envelope.get(VERSION_FIELD, 1)
+
+    if version > EVENT_VERSION:
+        raise ValueError("Unsupported event version {}, newest supported version is {}".format(version,
+                                                                                              EVENT_VERSION))
+
+    event = dict(envelope)
+    event.pop(VERSION_FIELD, None)
+
+    for name, value in envelope.items():
+        if not is_ref(value):
+            continue
+
+        if store is None:
+            raise ValueError("event field \"{}\" is stored in a claim check store, but no store is configured"
+                             .format(name))
+
+        event[name] = json.loads(store.get(value[CLAIM_CHECK_REF_KEY]).decode('utf-8'))
+
+        if known_refs is not None and 'sha256' in value:
+            known_refs[value['sha256']] = value
+
+    return event
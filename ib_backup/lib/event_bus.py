@@ -0,0 +1,163 @@
+import os
+from typing import Dict, List
+
+import lib.store
+
+lib.store.register_env_vars('EVENT_BUS_TABLE')
+
+# AWS EC2 EBS volume notification event names
+VOLUME_EVENT_CREATE = 'createVolume'
+VOLUME_EVENT_ATTACH = 'attachVolume'
+VOLUME_EVENT_DETACH = 'detachVolume'
+
+# Prefix of Salt job topics
+SALT_JOB_TOPIC_PREFIX = 'salt/job/'
+
+
+def volume_topic(volume_id: str, volume_event: str) -> str:
+    """ Builds the topic published when an EBS volume notification is received
+    Args:
+        - volume_id: ID of volume
+        - volume_event: Name of EBS volume notification event, one of the VOLUME_EVENT_* constants
+
+    Returns: Topic
+    """
+    return "volume/{}/{}".format(volume_id, volume_event)
+
+
+def salt_job_topic(job_id: str) -> str:
+    """ Builds the topic published when a minion returns the result of a Salt job
+    Args:
+        - job_id: ID of Salt job
+
+    Returns: Topic
+    """
+    return "{}{}".format(SALT_JOB_TOPIC_PREFIX, job_id)
+
+
+def parse_salt_job_topic(topic: str) -> str:
+    """ Parses a topic built by salt_job_topic
+    Args:
+        - topic: Topic
+
+    Returns: ID of Salt job, None if topic is not a Salt job topic
+    """
+    if not topic.startswith(SALT_JOB_TOPIC_PREFIX):
+        return None
+
+    return topic[len(SALT_JOB_TOPIC_PREFIX):]
+
+
+def parse_volume_notification(notification: Dict[str, object]) -> (str, Dict[str, object]):
+    """ Parses an AWS EC2 EBS volume notification CloudWatch event
+    Args:
+        - notification: CloudWatch event, with the detail-type "EBS Volume Notification"
+
+    Raises:
+        - ValueError: If the notification is not an EBS volume notification
+
+    Returns: Tuple of the topic to publish, and the notification detail
+    """
+    if notification.get('detail-type', None) != 'EBS Volume Notification':
+        raise ValueError("Event is not an EBS volume notification, event={}".format(notification))
+
+    # Volume ARN format: arn:aws:ec2:<region>:<account>:volume/<volume id>
+    volume_id = notification['resources'][0].split('/')[-1]
+    detail = notification['detail']
+
+    return volume_topic(volume_id, detail['event']), detail
+
+
+class EventBus:
+    """ Resumes waiting lambdas when an external event is published, instead of waiting for them to poll
+    A Job which is waiting for something to happen subscribes to a topic with the event it should be invoked with. When
+    the topic is published the subscription is claimed and the Job's lambda is invoked. A Job which notices the same
+    thing by polling must also claim the subscription before continuing, so the pipeline only continues once.
+
+    Each subscription has an ID. A Job which keeps polling while it is subscribed stops once its subscription is no
+    longer the current one, since the lambda invoked by the event bus has taken over waiting.
+
+    Fields:
+        - store (lib.store.Store): Stores subscriptions
+    """
+
+    def __init__(self, store: lib.store.Store):
+        self.store = store
+
+    def subscribe(self, topic: str, lambda_name: str, event: Dict[str, object], subscription_id: str = None):
+        """ Subscribes a lambda to a topic, replaces any existing subscription
+        Args:
+            - topic: Topic to subscribe to
+            - lambda_name: Name of lambda to invoke when topic is published
+            - event: Event to invoke lambda with
+            - subscription_id: ID of subscription, see `is_subscribed`
+        """
+        self.store.put(topic, {
+            'lambda_name': lambda_name,
+            'event': event,
+            'subscription_id': subscription_id
+        })
+
+    def is_subscribed(self, topic: str, subscription_id: str) -> bool:
+        """ Determines if a subscription is still waiting to be published
+        Args:
+            - topic: Topic subscription is for
+            - subscription_id: ID the subscription was made with
+
+        Returns: False if the subscription was claimed, or replaced by another subscription
+        """
+        subscription = self.store.get(topic)
+
+        return subscription is not None and subscription.get('subscription_id', None) == subscription_id
+
+    def claim(self, topic: str) -> Dict[str, object]:
+        """ Removes a subscription
+        Args:
+            - topic: Topic subscription is for
+
+        Returns: Subscription, None if no subscription exists or it was already claimed
+        """
+        return self.store.pop(topic)
+
+    def topics(self, prefix: str) -> List[str]:
+        """ Lists topics which have a subscription
+        Args:
+            - prefix: Only list topics which start with this prefix
+
+        Returns: Topics
+        """
+        return self.store.keys(prefix)
+
+    def publish(self, topic: str, detail: Dict[str, object], dispatcher) -> bool:
+        """ Invokes the lambda subscribed to a topic
+        Args:
+            - topic: Topic to publish
+            - detail: Information about the event, provided to the lambda in the `event_bus_detail` field
+            - dispatcher (lib.dispatch.Dispatcher): Used to invoke subscribed lambda
+
+        Returns: True if a lambda was subscribed
+        """
+        subscription = self.claim(topic)
+
+        if subscription is None:
+            return False
+
+        event = subscription['event']
+        event['event_bus_claimed'] = True
+        event['event_bus_detail'] = detail
+
+        dispatcher.dispatch(event, subscription['lambda_name'])
+
+        return True
+
+
+def get_event_bus() -> EventBus:
+    """ Creates the event bus configured by the EVENT_BUS_TABLE environment variable
+    Returns: Event bus which stores subscriptions in the DynamoDB table named by EVENT_BUS_TABLE, None if not set
+    """
+    table_name = os.environ.get('EVENT_BUS_TABLE', None)
+
+    if not table_name:
+        return None
+
+    return EventBus(lib.store.DynamoDBStore(table_name))
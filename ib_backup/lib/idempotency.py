@@ -0,0 +1,139 @@
+import os
+
+import lib.clock
+import lib.store
+
+lib.store.register_env_vars('IDEMPOTENCY_TABLE', 'IDEMPOTENCY_DB')
+
+# Statuses of an invocation key
+KEY_STATUS_STARTED = 'started'
+KEY_STATUS_COMPLETED = 'completed'
+
+# Number of seconds after which a started invocation which never completed or failed is assumed to have timed out,
+# the longest an AWS Lambda function can run for
+DEFAULT_LEASE_SECONDS = 15 * 60
+
+# Number of seconds invocation keys are kept after they were last written, longer than any delivery is retried for
+DEFAULT_EXPIRE_SECONDS = 7 * 24 * 60 * 60
+
+
+def invocation_key(run_id: str, step_name: str, iteration_count: int, event_bus_claimed: bool,
+                   resume_count: int = 0, from_step: str = None) -> str:
+    """ Builds the key which identifies an invocation of a step
+    Duplicate deliveries of the same event have the same key. An invocation by the event bus has a different key than
+    the polling invocation of the same iteration, so neither is ignored. Invocations of a resumed run have different
+    keys than the invocations before it was resumed. Each branch which invokes a step that joins branches has a
+    different key.
+
+    Args:
+        - run_id: ID of run
+        - step_name: Name of step
+        - iteration_count: Number of times the step repeated before the invocation
+        - event_bus_claimed: True if the event bus invoked the step
+        - resume_count: Number of times the run was resumed
+        - from_step: Name of the step which invoked the step, None if the step invoked itself
+
+    Returns: Key
+    """
+    key = "{}/{}/{}".format(run_id, step_name, iteration_count)
+
+    if resume_count > 0:
+        key += "/resume-{}".format(resume_count)
+
+    if event_bus_claimed:
+        key += "/event_bus"
+
+    if from_step is not None:
+        key += "/from-{}".format(from_step)
+
+    return key
+
+
+class IdempotencyStore:
+    """ Records which invocations have run, so duplicate deliveries of an event do nothing
+    AWS Lambda retries asynchronous invocations, and SQS and CloudWatch deliver events at least once. An invocation
+    claims its key before running, using a conditional write, so only one delivery of an event runs. If the invocation
+    fails its key is released, so the retry runs.
+
+    Fields:
+        - store (lib.store.Store): Stores invocation keys
+        - lease_seconds (float): Number of seconds after which a key which was claimed, but never completed or
+            released, can be claimed again. So a retry runs if the invocation which claimed the key timed out
+        - expire_seconds (float): Number of seconds keys are kept after they were last written, so the store does not
+            grow without bound
+    """
+
+    def __init__(self, store: lib.store.Store, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 expire_seconds: float = DEFAULT_EXPIRE_SECONDS):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.expire_seconds = expire_seconds
+
+    def claim(self, key: str) -> bool:
+        """ Claims an invocation key
+        Args:
+            - key: Invocation key, see invocation_key
+
+        Returns: True if the invocation should run, False if it is a duplicate
+        """
+        record = {
+            'status': KEY_STATUS_STARTED,
+            'claimed_at': lib.clock.now()
+        }
+        expires_at = record['claimed_at'] + self.expire_seconds
+
+        if self.store.put(key, record, only_if_absent=True, expires_at=expires_at):
+            return True
+
+        existing = self.store.get(key)
+
+        if existing is None:  # Released since
+            return self.store.put(key, record, only_if_absent=True, expires_at=expires_at)
+
+        if existing['status'] == KEY_STATUS_STARTED and \
+                lib.clock.now() - existing['claimed_at'] > self.lease_seconds:
+            # Invocation which claimed the key timed out, not atomic, the retries of a timed out invocation are minutes
+            # apart
+            self.store.put(key, record, expires_at=expires_at)
+
+            return True
+
+        return False
+
+    def complete(self, key: str):
+        """ Records that an invocation completed, so it never runs again
+        Args:
+            - key: Invocation key
+        """
+        completed_at = lib.clock.now()
+
+        self.store.put(key, {
+            'status': KEY_STATUS_COMPLETED,
+            'claimed_at': completed_at
+        }, expires_at=completed_at + self.expire_seconds)
+
+    def release(self, key: str):
+        """ Releases an invocation key, so a retry of the invocation runs
+        Args:
+            - key: Invocation key
+        """
+        self.store.pop(key)
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """ Creates the store invocation keys are kept in, configured by the IDEMPOTENCY_TABLE or IDEMPOTENCY_DB
+    environment variables
+    Returns: Store which keeps keys in the DynamoDB table named by IDEMPOTENCY_TABLE, or if not set in the sqlite
+        database file named by IDEMPOTENCY_DB, None if neither are set
+    """
+    table_name = os.environ.get('IDEMPOTENCY_TABLE', None)
+
+    if table_name:
+        return IdempotencyStore(lib.store.DynamoDBStore(table_name))
+
+    db_path = os.environ.get('IDEMPOTENCY_DB', None)
+
+    if db_path:
+        return IdempotencyStore(lib.store.SqliteStore(db_path))
+
+    return None
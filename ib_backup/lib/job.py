@@ -1,22 +1,35 @@
 import os
 import json
+import uuid
 from enum import Enum
 from typing import Dict
-import datetime
-import time
 
 import lib.log
-
-import boto3
+import lib.clock
+import lib.dispatch
+import lib.delay_queue
+import lib.polling
+import lib.event_bus
+import lib.aws_clients
+import lib.trace
+import lib.envelope
+import lib.claim_check
+import lib.run_state
+import lib.idempotency
+import lib.steps
+import lib.store
+
+lib.store.register_env_vars('WAIT_QUEUE_URL')
 
 
 class NextAction(Enum):
         """ Indicates what should happen after the `handle` method completes
         Fields:
             - TERMINATE (int): Do nothing
-            - NEXT (int): Invoke the lambda specified by the `next_lambda_name` field
-            - REPEAT (int): Send a message to the wait SQS queue specified by the `wait_queue_url` to re-invoke this
-                same lambda
+            - NEXT (int): Invoke the lambdas specified by the `next_lambda_names` field, or if not set the lambda
+                specified by the `next_lambda_name` field
+            - REPEAT (int): Schedule this same lambda to be re-invoked using the `delay_queue`. If no delay queue is
+                configured the lambda waits the delay determined by `polling_policy` and then re-invokes itself
         """
         TERMINATE = 1
         NEXT = 2
@@ -35,6 +48,14 @@ class Job:
 
     These 2 behaviors can be combined to create more complex behavior.
 
+    A lambda can invoke multiple lambdas, which run in parallel branches. A step which runs after multiple steps in the
+    `graph` joins their branches:
+
+        lambda a --invokes--> lambda b --invokes--> lambda d
+                 --invokes--> lambda c --invokes--> lambda d
+
+    Lambda d only runs once its join condition is met, see lib.steps.StepGraph.
+
     Override the `handle` method with custom lambda code. The return value of this method determines what will happen
     when the `handle` method is finished. See method documentation for more information.
 
@@ -45,23 +66,77 @@ class Job:
         - lambda_name (str): Required, Name of lambda step
         - next_lambda_name (str): Required if `handle` returns NextAction.NEXT, Name of the lambda to trigger after
             this one completes, None if no lambdas should be triggered after
+        - next_lambda_names (Dict[str, str]): Name of each step to trigger after this one completes, to the name of
+            its lambda, overrides next_lambda_name. None to trigger only next_lambda_name
         - next_lambda_event (Dict[str, object]): Required if `handle` returns NextAction.NEXT, The event to provide to
-            the lambda specified by next_lambda_name, None if no lambda should be triggered after
+            the lambdas specified by next_lambda_names or next_lambda_name, None if no lambda should be triggered after
+        - graph (lib.steps.StepGraph): Order steps run in, used to join branches. Defaults to lib.steps.GRAPH
         - max_iteration_count (int): Required if `handle` returns NextAction.REPEAT, maximum number of times a lambda
             can repeat before being considered repeating infinitely
         - repeat_delay (int): Required if `handle` returns NextAction.REPEAT, Number of seconds a job will wait before
             invoking itself again, default to 15 seconds
-        - logger (logging.Logger): Logger for lambda
+        - polling_policy (lib.polling.PollingPolicy): Determines how long to wait before repeating and when to stop
+            repeating, defaults to a lib.polling.FixedPolicy using `repeat_delay` and `max_iteration_count`
+        - wait_started_at (float): Unix time the Job started repeating, set by `run` before `handle` is invoked
+        - wait_interval (float): If set, when `handle` returns NextAction.REPEAT the Job waits this many seconds and
+            invokes `handle` again inside the same invocation, for as long as the lambda has time remaining. Only
+            then is the lambda re-invoked. None to always re-invoke. `handle` must be safe to call multiple times
+        - wait_reserved_time (float): Number of seconds of lambda run time to keep free when waiting inside an
+            invocation, so the Job has time to re-invoke itself
+        - event_bus (lib.event_bus.EventBus): If set, when `handle` returns NextAction.REPEAT the Job subscribes to the
+            `wait_topic` so it is invoked as soon as the topic is published. The `polling_policy` is still used as a
+            fallback. Defaults to the event bus configured by the EVENT_BUS_TABLE environment variable
+        - wait_topic (str): Event bus topic the Job is waiting for, set by `handle`, None if the Job does not support
+            waiting for events
+        - wait_queue_url (str): URL of the SQS queue used to delay re-invocations, None if not using SQS
+        - delay_queue (lib.delay_queue.DelayQueue): Schedules re-invocations when `handle` returns NextAction.REPEAT,
+            defaults to a lib.delay_queue.SQSDelayQueue if `wait_queue_url` is set. If None the lambda sleeps for
+            the delay determined by `polling_policy` and then invokes itself
+        - dispatcher (lib.dispatch.Dispatcher): Used to invoke the next lambda, or this lambda again. Defaults to a
+            lib.dispatch.LambdaDispatcher
+        - run_id (str): ID of the pipeline run the Job is part of, set by `run` from the event's `run_id` field. A new
+            ID is created by the first step of a run
+        - handle_seconds (float): Time spent in the `handle` method during the current invocation
+        - logger (lib.log.ContextLogger): Logger for lambda, records include the step's name, the run ID and the
+            invocation's request ID
+        - event_schema (lib.envelope.EventSchema): Fields `handle` requires in its event, checked before `handle` is
+            invoked, None to not check. Set by subclasses
+        - claim_check_store (lib.claim_check.ClaimCheckStore): Event fields larger than `claim_check_threshold` are
+            stored here and sent to the next lambda by reference. Defaults to the store configured by the
+            CLAIM_CHECK_BUCKET or CLAIM_CHECK_DIR environment variables, if None every field is sent in the event
+        - claim_check_threshold (int): Size in bytes above which event fields are stored in the `claim_check_store`,
+            defaults to the CLAIM_CHECK_THRESHOLD environment variable
+        - run_state_store (lib.run_state.RunStateStore): Checkpoints the run each time the Job completes or fails, so
+            a failed run can be resumed. Defaults to the store configured by the RUN_STATE_TABLE or RUN_STATE_DB
+            environment variables, None to not checkpoint
+        - idempotency_store (lib.idempotency.IdempotencyStore): Records which invocations have run, so duplicate
+            deliveries of an event do nothing. Defaults to the store configured by the IDEMPOTENCY_TABLE or
+            IDEMPOTENCY_DB environment variables, None to run every delivery
+        - idempotency_key (str): Key of the current invocation, set by `run` if it was claimed in the
+            `idempotency_store`, otherwise None
     """
+    event_schema = None
+
     def __init__(self, lambda_name: str, next_lambda_name: str = None, wait_queue_url: str = None,
-                 max_iteration_count: int = 3, repeat_delay: int = 15):
+                 max_iteration_count: int = 3, repeat_delay: int = 15, dispatcher: lib.dispatch.Dispatcher = None,
+                 delay_queue: lib.delay_queue.DelayQueue = None, polling_policy: lib.polling.PollingPolicy = None,
+                 wait_interval: float = None, wait_reserved_time: float = 10, event_bus: lib.event_bus.EventBus = None,
+                 event_polling_policy: lib.polling.PollingPolicy = None,
+                 claim_check_store: lib.claim_check.ClaimCheckStore = None, claim_check_threshold: int = None,
+                 run_state_store: lib.run_state.RunStateStore = None,
+                 idempotency_store: lib.idempotency.IdempotencyStore = None,
+                 next_lambda_names: Dict[str, str] = None, graph: lib.steps.StepGraph = None):
         """ Creates a Job instance and runs the `handle` method
         Args:
             - See class fields
             - If next_lambda_name is not specified will attempt to load a value from the NEXT_LAMBDA_NAME environment
                 variable
+            - If next_lambda_names is not specified will attempt to load a value from the NEXT_LAMBDA_NAMES environment
+                variable, a JSON object
             - If wait_queue_url is not specified will attempt to load a value from the WAIT_QUEUE_URL environment
                 variable
+            - event_polling_policy: Used instead of polling_policy if an event bus is configured, usually polls less
+                often since polling is only a fallback
 
         Raises:
             - ValueError: If lambda_name is none or empty
@@ -77,84 +152,534 @@ class Job:
         if not self.next_lambda_name:
             self.next_lambda_name = os.environ.get("NEXT_LAMBDA_NAME", None)
 
+        self.next_lambda_names = next_lambda_names
+
+        if not self.next_lambda_names and os.environ.get("NEXT_LAMBDA_NAMES", None):
+            self.next_lambda_names = json.loads(os.environ["NEXT_LAMBDA_NAMES"])
+
         self.next_lambda_event = None
 
+        self.graph = graph
+
+        if self.graph is None:
+            self.graph = lib.steps.GRAPH
+
         self.max_iteration_count = max_iteration_count
         self.repeat_delay = repeat_delay
 
-        self.logger = lib.log.get_logger("{}-{}".format(self.lambda_name, datetime.datetime.now()))
+        self.polling_policy = polling_policy
+
+        if self.polling_policy is None:
+            self.polling_policy = lib.polling.FixedPolicy(self.repeat_delay, self.max_iteration_count)
+
+        self.wait_started_at = None
+
+        self.wait_interval = wait_interval
+        self.wait_reserved_time = wait_reserved_time
+
+        self.event_bus = event_bus
+
+        if self.event_bus is None:
+            self.event_bus = lib.event_bus.get_event_bus()
+
+        if self.event_bus is not None and event_polling_policy is not None:
+            self.polling_policy = event_polling_policy
+
+        self.wait_topic = None
+
+        self.wait_queue_url = wait_queue_url
+
+        if not self.wait_queue_url:
+            self.wait_queue_url = os.environ.get("WAIT_QUEUE_URL", None)
+
+        self.delay_queue = delay_queue
+
+        if self.delay_queue is None and self.wait_queue_url:
+            self.delay_queue = lib.delay_queue.SQSDelayQueue(self.wait_queue_url)
+
+        self.dispatcher = dispatcher
+
+        if self.dispatcher is None:
+            self.dispatcher = lib.dispatch.LambdaDispatcher()
+
+        self.run_id = None
+        self.handle_seconds = 0.0
+
+        self.logger = lib.log.get_logger(self.lambda_name, step=self.lambda_name)
+
+        self.claim_check_store = claim_check_store
+
+        if self.claim_check_store is None:
+            self.claim_check_store = lib.claim_check.get_claim_check_store()
+
+        self.claim_check_threshold = claim_check_threshold
+
+        if self.claim_check_threshold is None:
+            self.claim_check_threshold = lib.envelope.get_claim_check_threshold()
+
+        self.run_state_store = run_state_store
+
+        if self.run_state_store is None:
+            self.run_state_store = lib.run_state.get_run_state_store()
+
+        self.idempotency_store = idempotency_store
+
+        if self.idempotency_store is None:
+            self.idempotency_store = lib.idempotency.get_idempotency_store()
+
+        self.idempotency_key = None
+
+        # SHA-256 digest of event fields stored in the claim check store to their reference, so unchanged fields are
+        # not stored again when the event is sent on
+        self.__claim_check_refs__ = {}
 
     def run(self, event: Dict[str, object], ctx):
         """ Invokes the custom `handle` method and performs an action based on the returned NextAction value
         See the NextAction documentation for more details on what actions will be performed for each value.
 
+        Records how many AWS API clients were reused, how long creating clients took, how long `handle` took, and how
+        long each external API call took during the invocation.
+
         Args:
             - event: AWS event which caused lambda to be run
             - ctx: AWS lambda invocation context
 
         Raises: Any exception on any failure
         """
+        start_client_stats = lib.aws_clients.registry.stats()
+
+        # Only record API calls made during this invocation
+        lib.trace.recorder.drain()
+
+        self.logger.context['request_id'] = getattr(ctx, 'aws_request_id', None)
+
+        self.handle_seconds = 0.0
+        self.run_id = None
+        self.idempotency_key = None
+
+        try:
+            self.__run__(event, ctx)
+        except Exception as e:
+            self.__release_idempotency_key__()
+            self.__record_failure__(event, ctx, e)
+            raise
+        else:
+            if self.idempotency_key is not None:
+                self.idempotency_store.complete(self.idempotency_key)
+        finally:
+            client_stats = lib.aws_clients.registry.stats()
+
+            self.__monitor__('count', 'aws_client_cache_hits',
+                             client_stats['hit_count'] - start_client_stats['hit_count'])
+            self.__monitor__('gauge', 'aws_client_construction_seconds',
+                             client_stats['construction_seconds'] - start_client_stats['construction_seconds'])
+            self.__monitor__('histogram', 'step_handle_seconds', self.handle_seconds)
+
+            for api_name, api_seconds in lib.trace.recorder.drain():
+                self.__monitor__('histogram', 'api_call_seconds', api_seconds, tags="api:{}".format(api_name))
+
+    def __monitor__(self, metric_type: str, metric: str, value: float, tags: str = None):
+        """ Logs a metric in the DogStatsD log format, tagged with the step's name
+        Args:
+            - metric_type: DogStatsD metric type
+            - metric: Name of metric
+            - value: Value of metric
+            - tags: Additional comma separated tags, None if the metric has no additional tags
+        """
+        all_tags = "step:{}".format(self.lambda_name)
+        if tags:
+            all_tags += ",{}".format(tags)
+
+        self.logger.info("MONITORING|{}|{}|{}|{}|#{}", int(lib.clock.now()), value, metric_type, metric, all_tags)
+
+    def __handle__(self, event: Dict[str, object], ctx) -> NextAction:
+        """ Invokes the `handle` method and records how long it took
+        Args:
+            - event: AWS event which caused lambda to be run
+            - ctx: AWS lambda invocation context
+
+        Returns: Value returned by `handle`
+        """
+        started_at = lib.clock.now()
+
+        try:
+            return self.handle(event, ctx)
+        finally:
+            self.handle_seconds += lib.clock.now() - started_at
+
+    def __run__(self, envelope: Dict[str, object], ctx):
+        """ Performs the work of `run`
+        Args:
+            - envelope: AWS event which caused lambda to be run, see lib.envelope.pack
+            - ctx: AWS lambda invocation context
+
+        Raises: Any exception on any failure
+        """
+        # Retrieve event from envelope
+        self.__claim_check_refs__ = {}
+
+        event = lib.envelope.unpack(envelope, self.claim_check_store, self.__claim_check_refs__)
+
+        from_step = event.pop(lib.steps.FROM_STEP_FIELD, None)
+
+        # Get run the event is part of, or start a new run
+        if lib.trace.RUN_ID_FIELD not in event:
+            event[lib.trace.RUN_ID_FIELD] = lib.trace.new_run_id(event.get('id', None))
+            event[lib.trace.RUN_STARTED_AT_FIELD] = lib.clock.now()
+
+        self.run_id = event[lib.trace.RUN_ID_FIELD]
+        self.logger.context['run_id'] = self.run_id
+
+        # Do nothing if this event was already delivered
+        if self.idempotency_store is not None:
+            idempotency_key = lib.idempotency.invocation_key(self.run_id, self.lambda_name,
+                                                             event.get('iteration_count', 0),
+                                                             event.get('event_bus_claimed', False),
+                                                             event.get(lib.run_state.RESUME_COUNT_FIELD, 0),
+                                                             from_step)
+
+            if not self.idempotency_store.claim(idempotency_key):
+                self.logger.info("Duplicate invocation, doing nothing, idempotency_key={}", idempotency_key)
+                return
+
+            self.idempotency_key = idempotency_key
+
+        # Stop polling if the event bus invoked this lambda, that invocation continues waiting
+        if self.__replaced_by_event_bus__(event):
+            self.logger.info("Event bus already invoked lambda, stopping polling, topic={}", event['event_bus_topic'])
+            return
+
+        # Wait for every branch if this step joins branches
+        if from_step is not None and self.graph.join_condition(self.lambda_name) is not None:
+            event = self.__join__(envelope, event, from_step)
+
+            if event is None:
+                return
+
+        # Check event has the fields handle requires
+        if self.event_schema is not None:
+            self.event_schema.validate(event)
+
+        # Record how long the event waited to be delivered
+        if lib.trace.DUE_AT_FIELD in event:
+            self.__monitor__('histogram', 'step_queued_seconds',
+                             max(0, lib.clock.now() - event[lib.trace.DUE_AT_FIELD]))
+
         # Get iteration count, or set if it doesn't exist
         iteration_count = 0
         if 'iteration_count' in event:
             iteration_count = event['iteration_count']
 
-        # Check iteration count is not over max
-        if iteration_count > self.max_iteration_count:
-            raise ValueError("Lambda invoked too many times in a row, iteration_count={}, max_iteration_count={}"
-                             .format(iteration_count, self.max_iteration_count))
+        # Get time lambda started repeating, or set if it doesn't exist
+        self.wait_started_at = lib.clock.now()
+        if 'wait_started_at' in event:
+            self.wait_started_at = event['wait_started_at']
+
+        # Check lambda has not been repeating for too long
+        if self.polling_policy.is_expired(iteration_count, lib.clock.now() - self.wait_started_at):
+            raise ValueError("Lambda repeated for too long, iteration_count={}, wait_started_at={}"
+                             .format(iteration_count, self.wait_started_at))
 
         # Invoke handle method
-        self.logger.debug("Invoking handle, event={}".format(event))
+        self.wait_topic = None
 
-        next_action = self.handle(event, ctx)
+        self.logger.info("Invoking handle, event={}", envelope)
+
+        next_action = self.__handle__(event, ctx)
+
+        # Wait inside this invocation while there is time
+        probe_count = 1
+
+        while next_action == NextAction.REPEAT and self.__can_wait_in_invocation__(ctx):
+            lib.clock.sleep(self.wait_interval)
+
+            next_action = self.__handle__(event, ctx)
+            probe_count += 1
+
+        if probe_count > 1:
+            self.logger.debug("Waited inside invocation, probe_count={}", probe_count)
 
         # Handle return value
         if next_action == NextAction.TERMINATE:  # Do nothing after lambda is finished
-            self.logger.debug("Handle finished, next action=TERMINATE")
+            self.logger.info("Handle finished, next action=TERMINATE")
+
+            self.__complete_step__(event, iteration_count)
+
+            if self.run_state_store is not None:
+                self.run_state_store.record_completed(self.run_id, self.lambda_name)
+
+            if lib.trace.RUN_STARTED_AT_FIELD in event:
+                self.__monitor__('histogram', 'run_seconds', lib.clock.now() - event[lib.trace.RUN_STARTED_AT_FIELD])
+
+            self.logger.info("Run completed, run_id={}, spans={}", self.run_id, event.get(lib.trace.SPANS_FIELD, []))
             return
-        elif next_action == NextAction.NEXT:  # Invoke the lambda specified by the `next_lambda_name` class field
-            # Check `next_lambda_name` provided
-            if not self.next_lambda_name:
+        elif next_action == NextAction.NEXT:  # Invoke the lambdas specified by the `next_lambda_names` class field
+            # Check `next_lambda_names` or `next_lambda_name` provided
+            next_lambda_names = [self.next_lambda_name]
+
+            if self.next_lambda_names:
+                next_lambda_names = list(self.next_lambda_names.values())
+
+            if not next_lambda_names[0]:
                 raise ValueError("Job.handle returned NextAction.NEXT but the Job.next_lambda_name field was not set")
 
             # Check `next_lambda_event` provided
             if not self.next_lambda_event:
                 raise ValueError("Job.handle returned NextAction.NEXT but the job.next_lambda_event field was not set")
 
-            self.logger.debug("Handle finished, next action=NEXT, next_lambda_name={}, next_lambda_event={}"
-                              .format(self.next_lambda_name, self.next_lambda_event))
+            # Check the event bus has not already continued the pipeline
+            if not self.__claim_wait_topic__(event):
+                self.logger.debug("Handle finished, next action=NEXT, but event bus already invoked next lambda")
+                return
+
+            # Carry the run's trace to the next lambda
+            self.__complete_step__(event, iteration_count)
+
+            self.next_lambda_event[lib.trace.RUN_ID_FIELD] = self.run_id
+            self.next_lambda_event[lib.trace.DUE_AT_FIELD] = lib.clock.now()
+
+            # The resume count keys the idempotency records and joins of a resumed run's later steps
+            for field in [lib.trace.RUN_STARTED_AT_FIELD, lib.trace.SPANS_FIELD, lib.run_state.RESUME_COUNT_FIELD]:
+                if field in event:
+                    self.next_lambda_event[field] = event[field]
+
+            next_envelope = self.__pack__(self.next_lambda_event)
+            next_envelope[lib.steps.FROM_STEP_FIELD] = self.lambda_name
+
+            # Envelope is logged instead of the event, so claim checked fields are not written to the logs
+            self.logger.debug("Handle finished, next action=NEXT, next_lambda_names={}, next_envelope={}",
+                              next_lambda_names, next_envelope)
+
+            next_invocations = {next_lambda_name: dict(next_envelope) for next_lambda_name in next_lambda_names}
+
+            # Checkpoint before invoking, so if invoking fails the run can be resumed from the next lambdas
+            if self.run_state_store is not None:
+                self.run_state_store.record_step(self.run_id, self.lambda_name, ctx.function_name, next_invocations)
 
             # Invoke
-            self.__invoke_lambda__(self.next_lambda_event, self.next_lambda_name)
+            for next_lambda_name, envelope in next_invocations.items():
+                self.__invoke_lambda__(envelope, next_lambda_name)
         elif next_action == NextAction.REPEAT:  # Invoke this lambda again
-            self.logger.debug("Handle finished, next action=REPEAT, event={}".format(event))
+            repeat_delay = self.polling_policy.next_delay(iteration_count, lib.clock.now() - self.wait_started_at,
+                                                          event)
 
-            self.logger.debug("Waiting {} seconds, then invoking self again".format(self.repeat_delay))
+            event['iteration_count'] = iteration_count + 1
+            event['wait_started_at'] = self.wait_started_at
+            event[lib.trace.DUE_AT_FIELD] = lib.clock.now() + repeat_delay
 
-            time.sleep(self.repeat_delay)
+            # Subscribe to be invoked by the event bus, if not already subscribed
+            subscribe = self.event_bus is not None and self.wait_topic is not None and \
+                (not event.get('event_bus_subscribed', False) or event.get('event_bus_claimed', False))
 
-            event['iteration_count'] = iteration_count + 1
+            if subscribe:
+                event.pop('event_bus_claimed', None)
+                event.pop('event_bus_detail', None)
+                event['event_bus_subscribed'] = True
+                event['event_bus_topic'] = self.wait_topic
+                event['event_bus_subscription_id'] = uuid.uuid4().hex
+
+            # Packed after the subscription fields are set, so every re-invocation carries them
+            repeat_envelope = self.__pack__(event)
+
+            self.logger.debug("Handle finished, next action=REPEAT, repeat_envelope={}", repeat_envelope)
+
+            if subscribe:
+                self.event_bus.subscribe(self.wait_topic, ctx.function_name, repeat_envelope,
+                                         subscription_id=event['event_bus_subscription_id'])
+
+                self.logger.debug("Subscribed to event bus, topic={}", self.wait_topic)
+
+            if self.delay_queue is not None:  # Let the delay queue invoke this lambda again, instead of waiting here
+                self.delay_queue.schedule(repeat_envelope, ctx.function_name, repeat_delay)
+
+                self.logger.info("Scheduled self to be invoked again in {} seconds", repeat_delay)
+                return
+
+            self.logger.info("Waiting {} seconds, then invoking self again", repeat_delay)
+
+            lib.clock.sleep(repeat_delay)
 
             self.logger.debug("Done waiting, invoking self again")
-            self.__invoke_lambda__(event, ctx.function_name)
+            self.__invoke_lambda__(repeat_envelope, ctx.function_name)
         else:
             raise ValueError("Unknown Job.handle return value: {}".format(next_action))
 
-    def __invoke_lambda__(self, event: Dict[str, object], invoke_lambda_name: str):
-        """ Invokes an AWS Lambda function
+    def __join__(self, envelope: Dict[str, object], event: Dict[str, object],
+                 from_step: str) -> Dict[str, object]:
+        """ Records that a branch arrived at this step, and joins the branches once the step's join condition is met
+        Only one branch continues the run after the branches are joined.
+
         Args:
-            - event: Event to send to lambda
+            - envelope: Envelope the branch invoked the Job with
+            - event: Event the branch invoked the Job with
+            - from_step: Name of the step which ended the branch
+
+        Raises:
+            - ValueError: If no `run_state_store` is configured
+
+        Returns: Events of every branch which arrived merged together, None if the run should not continue yet
+        """
+        if self.run_state_store is None:
+            raise ValueError("Step \"{}\" joins branches, which requires a run state store".format(self.lambda_name))
+
+        previous_steps = self.graph.previous_steps[self.lambda_name]
+
+        self.run_state_store.record_arrival(self.run_id, self.lambda_name, from_step, envelope)
+
+        arrived = self.run_state_store.arrivals(self.run_id, self.lambda_name, previous_steps)
+
+        if self.graph.join_condition(self.lambda_name) == lib.steps.JOIN_ALL and len(arrived) < len(previous_steps):
+            self.logger.info("Waiting for branches to join, arrived={}, waiting_for={}", list(arrived.keys()),
+                             [step_name for step_name in previous_steps if step_name not in arrived])
+            return None
+
+        if not self.run_state_store.claim_join(self.run_id, self.lambda_name,
+                                               event.get(lib.run_state.RESUME_COUNT_FIELD, 0)):
+            self.logger.info("Branches already joined by another branch, arrived={}", list(arrived.keys()))
+            return None
+
+        # Merge events in the order steps are declared, spans of every branch are kept
+        joined_event = {}
+        spans = []
+
+        for step_name in previous_steps:
+            if step_name not in arrived:
+                continue
+
+            branch_event = lib.envelope.unpack(arrived[step_name], self.claim_check_store, self.__claim_check_refs__)
+            branch_event.pop(lib.steps.FROM_STEP_FIELD, None)
+
+            for span in branch_event.get(lib.trace.SPANS_FIELD, []):
+                if span not in spans:
+                    spans.append(span)
+
+            joined_event.update(branch_event)
+
+        joined_event[lib.trace.SPANS_FIELD] = spans
+
+        if lib.run_state.RESUME_COUNT_FIELD in event:
+            joined_event[lib.run_state.RESUME_COUNT_FIELD] = event[lib.run_state.RESUME_COUNT_FIELD]
+
+        self.logger.info("Joined branches, arrived={}", list(arrived.keys()))
+
+        return joined_event
+
+    def __complete_step__(self, event: Dict[str, object], iteration_count: int):
+        """ Adds the step's span to the event's spans, and records how long the step took
+        Args:
+            - event: Event Job was invoked with
+            - iteration_count: Number of times the Job repeated before completing
+        """
+        span = lib.trace.new_span(self.lambda_name, self.wait_started_at, lib.clock.now(), iteration_count + 1)
+
+        event[lib.trace.SPANS_FIELD] = event.get(lib.trace.SPANS_FIELD, []) + [span]
+
+        self.__monitor__('histogram', 'step_seconds', span['finished_at'] - span['started_at'])
+        self.__monitor__('histogram', 'step_invocations', span['invocations'])
+
+    def __can_wait_in_invocation__(self, ctx) -> bool:
+        """ Determines if the Job can invoke `handle` again inside the current invocation
+        Args:
+            - ctx: AWS lambda invocation context
+
+        Returns: True if `wait_interval` is set, the polling policy has not expired, and the lambda has enough time
+            remaining
+        """
+        if self.wait_interval is None:
+            return False
+
+        if self.polling_policy.is_expired(0, lib.clock.now() - self.wait_started_at):
+            return False
+
+        remaining_time = ctx.get_remaining_time_in_millis() / 1000
+
+        return remaining_time - self.wait_interval > self.wait_reserved_time
+
+    def __claim_wait_topic__(self, event: Dict[str, object]) -> bool:
+        """ Claims the Job's event bus subscription, if it has one, so the event bus does not also continue the
+        pipeline
+        Args:
+            - event: Event Job was invoked with
+
+        Returns: False if the event bus has already claimed the subscription
+        """
+        if self.event_bus is None or self.wait_topic is None:
+            return True
+
+        if not event.get('event_bus_subscribed', False) or event.get('event_bus_claimed', False):
+            return True
+
+        return self.event_bus.claim(self.wait_topic) is not None
+
+    def __replaced_by_event_bus__(self, event: Dict[str, object]) -> bool:
+        """ Determines if the event bus invoked this lambda since it subscribed, so this invocation, which was scheduled
+        by polling, should not run. Invocations by the event bus subscribe again if they repeat, so only one chain of
+        invocations keeps polling.
+        Args:
+            - event: Event Job was invoked with
+
+        Returns: True if the subscription this invocation was scheduled with is no longer current
+        """
+        if self.event_bus is None or 'event_bus_subscription_id' not in event:
+            return False
+
+        if not event.get('event_bus_subscribed', False) or event.get('event_bus_claimed', False):
+            return False
+
+        return not self.event_bus.is_subscribed(event['event_bus_topic'], event['event_bus_subscription_id'])
+
+    def __release_idempotency_key__(self):
+        """ Releases the invocation's idempotency key, if it was claimed, so a retry of the invocation runs
+        Failing to release is logged instead of raised, so the error the Job failed with is not hidden.
+        """
+        if self.idempotency_key is None:
+            return
+
+        try:
+            self.idempotency_store.release(self.idempotency_key)
+        except Exception:
+            self.logger.exception("Failed to release idempotency key, idempotency_key={}", self.idempotency_key)
+
+    def __record_failure__(self, envelope: Dict[str, object], ctx, error: Exception):
+        """ Records that the Job failed in the run state store, if one is configured
+        Failing to record is logged instead of raised, so the error the Job failed with is not hidden.
+
+        Args:
+            - envelope: Envelope Job was invoked with
+            - ctx: AWS lambda invocation context
+            - error: Exception Job failed with
+        """
+        if self.run_state_store is None or self.run_id is None:
+            return
+
+        # The first step of a run creates the run's ID after it is invoked
+        envelope = dict(envelope)
+        envelope.setdefault(lib.trace.RUN_ID_FIELD, self.run_id)
+
+        try:
+            self.run_state_store.record_failure(self.run_id, self.lambda_name, ctx.function_name, envelope, error)
+        except Exception:
+            self.logger.exception("Failed to record failure in run state store, run_id={}", self.run_id)
+
+    def __pack__(self, event: Dict[str, object]) -> Dict[str, object]:
+        """ Builds the envelope sent to a lambda, storing large fields in the claim check store
+        Args:
+            - event: Event to send
+
+        Returns: Envelope, see lib.envelope.pack
+        """
+        return lib.envelope.pack(event, self.claim_check_store, self.claim_check_threshold, self.__claim_check_refs__)
+
+    def __invoke_lambda__(self, envelope: Dict[str, object], invoke_lambda_name: str):
+        """ Invokes a lambda using the Job's dispatcher
+        Args:
+            - envelope: Envelope to send to lambda, built by `__pack__`
             - invoke_lambda_name: Name of lambda to invoke
         """
         # Invoke
-        lambda_client = boto3.client('lambda')
-
-        invoke_res = lambda_client.invoke(FunctionName=invoke_lambda_name,
-                                          InvocationType='Event',
-                                          Payload=json.dumps(event))
+        invoke_res = self.dispatcher.dispatch(envelope, invoke_lambda_name)
 
-        self.logger.debug("Invoked lambda, name={}, event={}, result={}".format(invoke_lambda_name, event, invoke_res))
+        self.logger.info("Invoked lambda, name={}, event={}, result={}", invoke_lambda_name, envelope, invoke_res)
 
     def handle(self, event: Dict[str, object], ctx) -> NextAction:
         """ The code to run when the lambda is invoked.
@@ -1,25 +1,185 @@
-import logging
+import os
 import sys
+import json
+import logging
+from typing import Dict
+
+# Log level used if the LOG_LEVEL environment variable is not set
+DEFAULT_LOG_LEVEL = 'INFO'
+
+# Prefix of DogStatsD metric log lines, these lines are written as is so Datadog can parse them
+MONITORING_PREFIX = 'MONITORING|'
+
+# Name of the logger DogStatsD metric lines are written with
+METRIC_LOGGER_NAME = 'metrics'
+
+# Shared handler, added to every logger
+handler = None
+
+
+class BraceMessage:
+    """ Log message which is formatted with str.format only when it is written
+    Fields:
+        - fmt (str): Message format
+        - args (tuple): Format arguments
+    """
+    __slots__ = ('fmt', 'args')
+
+    def __init__(self, fmt: str, args: tuple):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self) -> str:
+        if len(self.args) == 0:
+            return str(self.fmt)
+
+        return str(self.fmt).format(*self.args)
+
+
+class JSONFormatter(logging.Formatter):
+    """ Formats each record as a JSON object with the `time`, `level`, `logger`, `message` fields, and the fields of
+    the logger's context. DogStatsD metric lines are written as is.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+
+        if message.startswith(MONITORING_PREFIX):
+            return message
+
+        body = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': message
+        }
+        body.update(getattr(record, 'context', {}))
+
+        if record.exc_info:
+            body['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(body, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """ Formats each record as a line of text, for reading locally. DogStatsD metric lines are written as is.
+    """
+
+    def __init__(self):
+        super().__init__("[%(levelname)-8s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+
+        if message.startswith(MONITORING_PREFIX):
+            return message
+
+        return super().format(record)
+
+
+# Formatters by name
+FORMATTERS = {
+    'json': JSONFormatter,
+    'text': TextFormatter
+}
 
 
-def get_logger(name: str) -> logging.Logger:
+class ContextLogger(logging.LoggerAdapter):
+    """ Logger which adds context fields to records, and formats messages lazily
+    Messages are str.format format strings, their arguments are passed as additional positional arguments:
+
+        logger.debug("Invoking handle, event={}", event)
+
+    Messages are only formatted if they are written. DogStatsD metric messages, which start with MONITORING_PREFIX,
+    are always written, whatever the LOG_LEVEL, so metrics are not lost when only warnings are logged.
+
+    Fields:
+        - context (Dict[str, object]): Fields added to every record, for example the name of the step and run ID
+    """
+
+    def __init__(self, logger: logging.Logger, context: Dict[str, object]):
+        super().__init__(logger, {'context': context})
+
+        self.context = context
+
+    def log(self, level: int, msg: str, *args, **kwargs):
+        if str(msg).startswith(MONITORING_PREFIX):
+            msg, kwargs = self.process(msg, kwargs)
+            get_metric_logger().log(level, BraceMessage(msg, args), **kwargs)
+        elif self.isEnabledFor(level):
+            msg, kwargs = self.process(msg, kwargs)
+            self.logger.log(level, BraceMessage(msg, args), **kwargs)
+
+
+def get_level() -> int:
+    """ Returns: Log level configured by the LOG_LEVEL environment variable
+    """
+    level_name = os.environ.get('LOG_LEVEL', DEFAULT_LOG_LEVEL).upper()
+
+    level = logging.getLevelName(level_name)
+
+    if not isinstance(level, int):
+        raise ValueError("Unknown log level \"{}\"".format(level_name))
+
+    return level
+
+
+def get_handler() -> logging.Handler:
+    """ Retrieves the shared handler, creating it if it does not exist
+    The handler writes to stdout, in the format named by the LOG_FORMAT environment variable, "json" by default.
+
+    Raises:
+        - KeyError: If LOG_FORMAT is not the name of a formatter
+
+    Returns: Handler
+    """
+    global handler
+
+    if handler is None:
+        format_name = os.environ.get('LOG_FORMAT', 'json')
+
+        if format_name not in FORMATTERS:
+            raise KeyError("Unknown log format \"{}\", must be one of: {}".format(format_name, list(FORMATTERS.keys())))
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(FORMATTERS[format_name]())
+
+    return handler
+
+
+def get_logger(name: str, **context) -> ContextLogger:
     """ Assembles a logger with the provided name to print to stdout.
+    Loggers are cached by name, and share one handler, so calling get_logger every invocation does not use more memory.
+    The LOG_LEVEL environment variable sets the minimum level of messages written, INFO by default.
+
     Args:
         - name: Log prefix
+        - context: Fields added to every record
 
     Returns:
         - Logger
     """
     logger = logging.getLogger(name)
 
-    logger.setLevel(logging.DEBUG)
+    if get_handler() not in logger.handlers:
+        logger.setLevel(get_level())
+        logger.addHandler(get_handler())
+
+        logger.propagate = False  # To prevent messages from being logger by this logger and the AWS Lambda root logger
 
-    hndlr = logging.StreamHandler(sys.stdout)
-    hndlr.setFormatter(logging.Formatter("[%(levelname)-8s] %(name)s: " +
-                                         "%(message)s"))
+    return ContextLogger(logger, dict(context))
+
+
+def get_metric_logger() -> logging.Logger:
+    """ Retrieves the logger DogStatsD metric lines are written with, it writes every message whatever the LOG_LEVEL
+    Returns: Logger
+    """
+    logger = logging.getLogger(METRIC_LOGGER_NAME)
 
-    logger.addHandler(hndlr)
+    if get_handler() not in logger.handlers:
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(get_handler())
 
-    logger.propagate = False  # To prevent messages from being logger by this logger and the AWS Lambda root logger
+        logger.propagate = False
 
     return logger
@@ -0,0 +1,221 @@
+import os
+import random
+from typing import Dict, List, Callable, Tuple
+
+import lib.store
+
+# Store key of the volume creations VolumeSizeEstimator fits its coefficients to
+VOLUME_CREATE_HISTORY_KEY = 'volume-create-history'
+
+# Number of most recent volume creations kept in the history
+VOLUME_CREATE_HISTORY_SIZE = 30
+
+# Minimum number of volume creations needed to fit coefficients, below this the configured coefficients are used
+VOLUME_CREATE_MIN_SAMPLES = 3
+
+
+class PollingPolicy:
+    """ Determines how long a Job waits before checking a condition again, and when it should give up
+    Used by Job when a `handle` method returns NextAction.REPEAT.
+    """
+
+    def next_delay(self, iteration_count: int, elapsed: float, event: Dict[str, object]) -> float:
+        """ Determines the number of seconds to wait before the next check
+        Args:
+            - iteration_count: Number of times the Job has already repeated
+            - elapsed: Number of seconds since the Job started waiting
+            - event: Event the Job was invoked with
+
+        Returns: Number of seconds
+        """
+        raise NotImplementedError()
+
+    def is_expired(self, iteration_count: int, elapsed: float) -> bool:
+        """ Determines if a Job has been waiting for too long
+        Args:
+            - iteration_count: Number of times the Job has already repeated
+            - elapsed: Number of seconds since the Job started waiting
+
+        Returns: True if the Job should give up
+        """
+        raise NotImplementedError()
+
+
+class FixedPolicy(PollingPolicy):
+    """ Waits the same amount of time between every check, for a fixed number of checks
+    Fields:
+        - delay (float): Number of seconds to wait between checks
+        - max_iteration_count (int): Maximum number of times a Job can repeat
+    """
+
+    def __init__(self, delay: float, max_iteration_count: int):
+        self.delay = delay
+        self.max_iteration_count = max_iteration_count
+
+    def next_delay(self, iteration_count: int, elapsed: float, event: Dict[str, object]) -> float:
+        return self.delay
+
+    def is_expired(self, iteration_count: int, elapsed: float) -> bool:
+        return iteration_count > self.max_iteration_count
+
+
+class BackoffPolicy(PollingPolicy):
+    """ Waits exponentially longer between each check, until a deadline
+    The first check after the Job's initial check can be made quickly, to detect operations which finish in a few
+    seconds. After that the delay starts at `initial_delay`, or the value provided by `initial_delay_estimator`, and is
+    multiplied by `factor` every check.
+
+    Fields:
+        - initial_delay (float): Number of seconds to wait before the first backoff check
+        - max_delay (float): Maximum number of seconds to wait between checks
+        - deadline (float): Number of seconds a Job can wait in total before giving up
+        - factor (float): Amount the delay is multiplied by after each check
+        - jitter (float): Fraction of the delay which is randomized, so checks from concurrent runs do not line up
+        - first_probe_delay (float): Number of seconds to wait before the first check, None to start at the
+            `initial_delay`
+        - initial_delay_estimator (Callable[[Dict[str, object]], float]): Given the Job's event returns the number of
+            seconds to use as the initial delay, or None to use `initial_delay`
+    """
+
+    def __init__(self, initial_delay: float, max_delay: float, deadline: float, factor: float = 2,
+                 jitter: float = 0.1, first_probe_delay: float = None,
+                 initial_delay_estimator: Callable[[Dict[str, object]], float] = None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.factor = factor
+        self.jitter = jitter
+        self.first_probe_delay = first_probe_delay
+        self.initial_delay_estimator = initial_delay_estimator
+
+    def next_delay(self, iteration_count: int, elapsed: float, event: Dict[str, object]) -> float:
+        # Quick first check
+        if self.first_probe_delay is not None:
+            if iteration_count == 0:
+                return self.first_probe_delay
+
+            iteration_count -= 1
+
+        # Backoff
+        initial_delay = None
+        if self.initial_delay_estimator is not None:
+            initial_delay = self.initial_delay_estimator(event)
+
+        if initial_delay is None:
+            initial_delay = self.initial_delay
+
+        delay = initial_delay * (self.factor ** iteration_count) * random.uniform(1 - self.jitter, 1 + self.jitter)
+        delay = min(self.max_delay, delay)
+
+        # Do not wait past the deadline
+        return max(0, min(delay, self.deadline - elapsed))
+
+    def is_expired(self, iteration_count: int, elapsed: float) -> bool:
+        return elapsed > self.deadline
+
+
+class VolumeSizeEstimator:
+    """ Estimates how long an EBS volume will take to be created from a snapshot based on the volume's size
+    Intended to be used as a BackoffPolicy initial_delay_estimator. The time taken to create each volume is recorded
+    in a store with `record`. Once VOLUME_CREATE_MIN_SAMPLES creations are recorded the coefficients are fit to the most
+    recent creations with a least squares line. Until then, or if no store is provided, the coefficients configured by
+    the VOLUME_CREATE_BASE_SECONDS and VOLUME_CREATE_SECONDS_PER_GIB environment variables are used.
+
+    Fields:
+        - base_seconds (float): Time to create a volume regardless of size, when not fit to history
+        - seconds_per_gib (float): Additional time to create each GiB of the volume, when not fit to history
+        - fraction (float): Fraction of the estimated time to wait, less than 1 so the Job checks before the volume is
+            expected to be created
+        - store (lib.store.Store): Keeps the volume creation history, None to only use the configured coefficients
+        - history_size (int): Number of most recent volume creations kept in the history
+    """
+
+    def __init__(self, base_seconds: float = 5, seconds_per_gib: float = 0.01, fraction: float = 0.8,
+                 store: lib.store.Store = None, history_size: int = VOLUME_CREATE_HISTORY_SIZE):
+        self.base_seconds = float(os.environ.get('VOLUME_CREATE_BASE_SECONDS', base_seconds))
+        self.seconds_per_gib = float(os.environ.get('VOLUME_CREATE_SECONDS_PER_GIB', seconds_per_gib))
+        self.fraction = fraction
+        self.store = store
+        self.history_size = history_size
+
+        self.__coefficients__ = None
+
+    def record(self, volume_size: int, seconds: float):
+        """ Adds a volume creation to the history, does nothing if no store is provided
+        Concurrent calls can drop a creation from the history, which only makes the fit use fewer samples.
+
+        Args:
+            - volume_size: Size of volume in GiB
+            - seconds: Number of seconds the volume took to create
+        """
+        if self.store is None:
+            return
+
+        history = self.store.get(VOLUME_CREATE_HISTORY_KEY)
+
+        if history is None:
+            history = {'samples': []}
+
+        history['samples'].append([volume_size, seconds])
+        history['samples'] = history['samples'][-self.history_size:]
+
+        self.store.put(VOLUME_CREATE_HISTORY_KEY, history)
+
+    def coefficients(self) -> Tuple[float, float]:
+        """ Retrieves the coefficients estimates are made with, the history is read once per estimator
+        Returns: Base seconds and seconds per GiB
+        """
+        if self.__coefficients__ is None:
+            history = None
+            if self.store is not None:
+                history = self.store.get(VOLUME_CREATE_HISTORY_KEY)
+
+            if history is not None:
+                self.__coefficients__ = fit_coefficients(history['samples'])
+
+            if self.__coefficients__ is None:
+                self.__coefficients__ = (self.base_seconds, self.seconds_per_gib)
+
+        return self.__coefficients__
+
+    def __call__(self, event: Dict[str, object]) -> float:
+        """ Estimates the initial delay
+        Args:
+            - event: Job event, the volume's size in GiB is read from the `volume_size` field
+
+        Returns: Number of seconds, None if the event does not include the volume size
+        """
+        if 'volume_size' not in event:
+            return None
+
+        base_seconds, seconds_per_gib = self.coefficients()
+
+        return self.fraction * (base_seconds + (seconds_per_gib * event['volume_size']))
+
+
+def fit_coefficients(samples: List[List[float]]) -> Tuple[float, float]:
+    """ Fits a line to volume creation times with least squares
+    Args:
+        - samples: List of [volume size in GiB, seconds taken to create] pairs
+
+    Returns: Base seconds and seconds per GiB, both at least 0. None if there are fewer than VOLUME_CREATE_MIN_SAMPLES
+        samples
+    """
+    if len(samples) < VOLUME_CREATE_MIN_SAMPLES:
+        return None
+
+    mean_size = sum(sample[0] for sample in samples) / len(samples)
+    mean_seconds = sum(sample[1] for sample in samples) / len(samples)
+
+    size_variance = sum((sample[0] - mean_size) ** 2 for sample in samples)
+
+    # All volumes were the same size, so time per GiB cannot be separated from the base time
+    seconds_per_gib = 0
+
+    if size_variance > 0:
+        covariance = sum((sample[0] - mean_size) * (sample[1] - mean_seconds) for sample in samples)
+        seconds_per_gib = max(0, covariance / size_variance)
+
+    base_seconds = max(0, mean_seconds - (seconds_per_gib * mean_size))
+
+    return base_seconds, seconds_per_gib
@@ -0,0 +1,387 @@
+import os
+from typing import Dict, List, Callable
+
+import lib.clock
+import lib.store
+
+lib.store.register_env_vars('RUN_STATE_TABLE', 'RUN_STATE_DB')
+
+# Prefix of run state keys
+RUN_KEY_PREFIX = 'run/'
+
+# Prefix of keys which record that a run was resumed
+RESUME_KEY_PREFIX = 'resume/'
+
+# Prefix of keys which record branches arriving at a step which joins branches
+JOIN_KEY_PREFIX = 'join/'
+
+# Prefix of the index keys run states are stored with, followed by the run's status
+STATUS_INDEX_KEY_PREFIX = 'run-status/'
+
+# Number of seconds run states, and the records of resumes and joins, are kept after they were last written
+DEFAULT_EXPIRE_SECONDS = 30 * 24 * 60 * 60
+
+# Run statuses
+RUN_STATUS_RUNNING = 'running'
+RUN_STATUS_FAILED = 'failed'
+RUN_STATUS_COMPLETED = 'completed'
+
+# Event field which holds the number of times the run was resumed, set on the event a run is resumed with
+RESUME_COUNT_FIELD = 'resume_count'
+
+# Event fields which belong to a single step's invocations, removed from an event before it is resumed
+INVOCATION_FIELDS = ['iteration_count', 'wait_started_at', 'due_at', 'event_bus_subscribed', 'event_bus_claimed',
+                     'event_bus_detail', 'event_bus_topic', 'event_bus_subscription_id']
+
+
+def run_key(run_id: str) -> str:
+    """ Builds the key a run's state is stored under
+    Args:
+        - run_id: ID of run
+
+    Returns: Key
+    """
+    return "{}{}".format(RUN_KEY_PREFIX, run_id)
+
+
+def resume_key(run_id: str, resume_count: int) -> str:
+    """ Builds the key which records that a run was resumed
+    Args:
+        - run_id: ID of run
+        - resume_count: Number of times the run was resumed, including this time
+
+    Returns: Key
+    """
+    return "{}{}/{}".format(RESUME_KEY_PREFIX, run_id, resume_count)
+
+
+def status_index_key(status: str) -> str:
+    """ Builds the index key run states with a status are stored with
+    Args:
+        - status: One of the RUN_STATUS_* constants
+
+    Returns: Index key
+    """
+    return "{}{}".format(STATUS_INDEX_KEY_PREFIX, status)
+
+
+def join_key(run_id: str, step_name: str, from_step: str) -> str:
+    """ Builds the key a branch's arrival at a step which joins branches is stored under
+    Args:
+        - run_id: ID of run
+        - step_name: Name of step which joins branches
+        - from_step: Name of the step which ended the branch
+
+    Returns: Key
+    """
+    return "{}{}/{}/{}".format(JOIN_KEY_PREFIX, run_id, step_name, from_step)
+
+
+class RunStateStore:
+    """ Checkpoints the progress of pipeline runs, so a run which failed can be resumed from the steps which failed
+    Every time a step completes the events it sent to the next steps are recorded as pending invocations, until those
+    steps complete. Resuming a run invokes every pending step again with its recorded event, so resources created by
+    earlier steps, like the test volume, are reused.
+
+    A run's state has the fields:
+
+        - run_id (str): ID of run
+        - status (str): One of the RUN_STATUS_* constants
+        - last_step (str): Name of the last step which completed, None if no step has completed
+        - pending (List[Dict[str, object]]): Invocations of steps which have not completed, each has the
+            `lambda_name` and `event` fields. The event is the envelope the lambda was invoked with
+        - updated_at (float): Unix time the state was last changed
+        - resume_count (int): Number of times the run was resumed
+        - failed_step (str): Name of step which failed, only if status is RUN_STATUS_FAILED
+        - error (str): Error the step failed with, only if status is RUN_STATUS_FAILED
+
+    Branches of a run which run in parallel update the same state. Updates are not atomic, the steps of a run
+    complete minutes apart. Resuming a run is claimed with a conditional write, so a run is only resumed once for each
+    resume count.
+
+    The store also records which branches have arrived at steps which join branches, see `record_arrival`.
+
+    Run states are indexed by status, so failed runs are found without listing every run. Everything is stored with an
+    expiry time, so the store does not grow without bound.
+
+    Fields:
+        - store (lib.store.Store): Stores run states
+        - expire_seconds (float): Number of seconds values are kept after they were last written
+    """
+
+    def __init__(self, store: lib.store.Store, expire_seconds: float = DEFAULT_EXPIRE_SECONDS):
+        self.store = store
+        self.expire_seconds = expire_seconds
+
+    def get(self, run_id: str) -> Dict[str, object]:
+        """ Retrieves a run's state
+        Args:
+            - run_id: ID of run
+
+        Returns: State, None if the run has no state
+        """
+        return self.store.get(run_key(run_id))
+
+    def runs(self) -> List[Dict[str, object]]:
+        """ Retrieves the state of every run, not atomic. Lists every key in the store, use `failed_runs` to find runs
+        regularly
+        Returns: States, oldest update first
+        """
+        return self.__get_states__(self.store.keys(RUN_KEY_PREFIX))
+
+    def failed_runs(self) -> List[Dict[str, object]]:
+        """ Retrieves the state of every run which failed, using the status index, not atomic
+        Returns: States, oldest update first
+        """
+        states = self.__get_states__(self.store.indexed_keys(status_index_key(RUN_STATUS_FAILED)))
+
+        # The index can lag behind the states
+        return [state for state in states if state['status'] == RUN_STATUS_FAILED]
+
+    def __get_states__(self, keys: List[str]) -> List[Dict[str, object]]:
+        """ Retrieves run states
+        Args:
+            - keys: Keys of run states
+
+        Returns: States which still exist, oldest update first
+        """
+        states = []
+
+        for key in keys:
+            state = self.store.get(key)
+
+            if state is not None:
+                states.append(state)
+
+        return sorted(states, key=lambda state: state['updated_at'])
+
+    def __expires_at__(self) -> float:
+        """ Returns: Unix time after which a value written now may be deleted
+        """
+        return lib.clock.now() + self.expire_seconds
+
+    def __update__(self, run_id: str, update: Callable) -> Dict[str, object]:
+        """ Changes a run's state, creating it if it does not exist
+        Args:
+            - run_id: ID of run
+            - update: Function which is called with the state and changes it
+
+        Returns: New state
+        """
+        state = self.get(run_id)
+
+        if state is None:
+            state = {
+                'run_id': run_id,
+                'status': RUN_STATUS_RUNNING,
+                'last_step': None,
+                'pending': [],
+                'resume_count': 0,
+                'failed_step': None,
+                'error': None
+            }
+
+        update(state)
+        state['updated_at'] = lib.clock.now()
+
+        self.store.put(run_key(run_id), state, index_key=status_index_key(state['status']),
+                       expires_at=self.__expires_at__())
+
+        return state
+
+    def record_step(self, run_id: str, step_name: str, lambda_name: str, next_invocations: Dict[str, object]):
+        """ Records that a step completed
+        Args:
+            - run_id: ID of run
+            - step_name: Name of step which completed
+            - lambda_name: Name of the step's lambda
+            - next_invocations: Name of each lambda invoked after the step, to the envelope it was invoked with
+        """
+        def update(state: Dict[str, object]):
+            state['last_step'] = step_name
+            state['pending'] = [invocation for invocation in state['pending']
+                                if invocation['lambda_name'] != lambda_name]
+
+            for next_lambda_name, envelope in next_invocations.items():
+                state['pending'].append({
+                    'lambda_name': next_lambda_name,
+                    'event': envelope
+                })
+
+            # Another branch may have failed
+            if state['status'] != RUN_STATUS_FAILED or state['failed_step'] == step_name:
+                state['status'] = RUN_STATUS_RUNNING
+                state['failed_step'] = None
+                state['error'] = None
+
+        self.__update__(run_id, update)
+
+    def record_failure(self, run_id: str, step_name: str, lambda_name: str, envelope: Dict[str, object],
+                       error: Exception):
+        """ Records that a step failed
+        Args:
+            - run_id: ID of run
+            - step_name: Name of step which failed
+            - lambda_name: Name of the failed step's lambda
+            - envelope: Envelope the failed step was invoked with, recorded as pending if the step is not already
+            - error: Exception step raised
+        """
+        def update(state: Dict[str, object]):
+            state['status'] = RUN_STATUS_FAILED
+            state['failed_step'] = step_name
+            state['error'] = "{}: {}".format(type(error).__name__, error)
+
+            if not any(invocation['lambda_name'] == lambda_name for invocation in state['pending']):
+                state['pending'].append({
+                    'lambda_name': lambda_name,
+                    'event': envelope
+                })
+
+        self.__update__(run_id, update)
+
+    def record_completed(self, run_id: str, step_name: str):
+        """ Records that a run completed
+        Args:
+            - run_id: ID of run
+            - step_name: Name of the last step
+        """
+        def update(state: Dict[str, object]):
+            state['status'] = RUN_STATUS_COMPLETED
+            state['last_step'] = step_name
+            state['pending'] = []
+            state['failed_step'] = None
+            state['error'] = None
+
+        self.__update__(run_id, update)
+
+    def resume(self, run_id: str, dispatcher) -> Dict[str, object]:
+        """ Invokes every pending step of a run again, with the event it was invoked with
+        Args:
+            - run_id: ID of run
+            - dispatcher (lib.dispatch.Dispatcher): Used to invoke the steps
+
+        Raises:
+            - KeyError: If the run has no state
+            - ValueError: If the run has completed, or was resumed by another caller at the same time
+
+        Returns: State of resumed run
+        """
+        state = self.get(run_id)
+
+        if state is None:
+            raise KeyError("No state recorded for run \"{}\"".format(run_id))
+
+        if state['status'] == RUN_STATUS_COMPLETED or len(state['pending']) == 0:
+            raise ValueError("Run \"{}\" has completed, it cannot be resumed".format(run_id))
+
+        # Run state updates are not atomic, so only the caller which claims the next resume count resumes the run
+        resume_count = state['resume_count'] + 1
+
+        if not self.store.put(resume_key(run_id, resume_count), {'resumed_at': lib.clock.now()}, only_if_absent=True,
+                              expires_at=self.__expires_at__()):
+            raise ValueError("Run \"{}\" was already resumed, resume_count={}".format(run_id, resume_count))
+
+        def update(state: Dict[str, object]):
+            state['status'] = RUN_STATUS_RUNNING
+            state['resume_count'] = resume_count
+
+        state = self.__update__(run_id, update)
+
+        for invocation in state['pending']:
+            # Start the step's waiting over
+            envelope = dict(invocation['event'])
+
+            for field in INVOCATION_FIELDS:
+                envelope.pop(field, None)
+
+            envelope[RESUME_COUNT_FIELD] = state['resume_count']
+
+            dispatcher.dispatch(envelope, invocation['lambda_name'])
+
+        return state
+
+    def resume_failed(self, dispatcher, max_resume_count: int, max_age: float) -> List[Dict[str, object]]:
+        """ Resumes every run which failed recently
+        Args:
+            - dispatcher (lib.dispatch.Dispatcher): Used to invoke steps
+            - max_resume_count: Runs which have been resumed this many times are not resumed again
+            - max_age: Runs which failed more than this many seconds ago are not resumed
+
+        Returns: States of resumed runs
+        """
+        resumed = []
+
+        for state in self.failed_runs():
+            if state['resume_count'] >= max_resume_count:
+                continue
+
+            if lib.clock.now() - state['updated_at'] > max_age:
+                continue
+
+            try:
+                resumed.append(self.resume(state['run_id'], dispatcher))
+            except ValueError:  # Completed or resumed by another caller since the runs were listed
+                continue
+
+        return resumed
+
+    def record_arrival(self, run_id: str, step_name: str, from_step: str, envelope: Dict[str, object]):
+        """ Records that a branch arrived at a step which joins branches
+        Args:
+            - run_id: ID of run
+            - step_name: Name of step which joins branches
+            - from_step: Name of the step which ended the branch
+            - envelope: Envelope the branch invoked the step with
+        """
+        self.store.put(join_key(run_id, step_name, from_step), envelope, expires_at=self.__expires_at__())
+
+    def arrivals(self, run_id: str, step_name: str, from_steps: List[str]) -> Dict[str, Dict[str, object]]:
+        """ Retrieves the branches which have arrived at a step which joins branches
+        Args:
+            - run_id: ID of run
+            - step_name: Name of step which joins branches
+            - from_steps: Names of the steps which end the branches
+
+        Returns: Name of the step which ended each branch which arrived, to the envelope the branch invoked the step
+            with
+        """
+        arrived = {}
+
+        for from_step in from_steps:
+            envelope = self.store.get(join_key(run_id, step_name, from_step))
+
+            if envelope is not None:
+                arrived[from_step] = envelope
+
+        return arrived
+
+    def claim_join(self, run_id: str, step_name: str, resume_count: int) -> bool:
+        """ Claims the right to continue a run after its branches joined, so only one branch continues the run
+        Args:
+            - run_id: ID of run
+            - step_name: Name of step which joins branches
+            - resume_count: Number of times the run was resumed, the branches of a resumed run join again
+
+        Returns: True if claimed, False if another branch already claimed it
+        """
+        return self.store.put(join_key(run_id, step_name, "joined-{}".format(resume_count)),
+                              {'joined_at': lib.clock.now()}, only_if_absent=True, expires_at=self.__expires_at__())
+
+
+def get_run_state_store() -> RunStateStore:
+    """ Creates the store run checkpoints are kept in, configured by the RUN_STATE_TABLE or RUN_STATE_DB environment
+    variables
+    Returns: Store which keeps run states in the DynamoDB table named by RUN_STATE_TABLE, or if not set in the sqlite
+        database file named by RUN_STATE_DB, None if neither are set
+    """
+    table_name = os.environ.get('RUN_STATE_TABLE', None)
+
+    if table_name:
+        return RunStateStore(lib.store.DynamoDBStore(table_name))
+
+    db_path = os.environ.get('RUN_STATE_DB', None)
+
+    if db_path:
+        return RunStateStore(lib.store.SqliteStore(db_path))
+
+    return None
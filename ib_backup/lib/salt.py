@@ -1,130 +1,707 @@
+import os
+import json
 import urllib.parse
-from typing import List
-import urllib.parse
-from typing import Dict, List
+from typing import Dict, List, Iterator, Tuple
+
+import lib.clock
+import lib.codec
+import lib.store
+import lib.trace
 
 import requests
-import yaml
+import requests.adapters
+
+lib.store.register_env_vars('SALT_TOKEN_TABLE')
+
+# Number of seconds before an auth token expires that it is no longer used
+TOKEN_EXPIRE_MARGIN = 60
+
+# Maximum number of jobs looked up in one Salt API request by SaltClient.get_jobs
+JOB_LOOKUP_CHUNK_SIZE = 100
+
+
+class SaltClient:
+    """ Salt API client which reuses connections between requests
+    Connections are kept alive in a connection pool. Requests which fail to connect are retried with an exponential
+    backoff. Requests which receive a 5xx response are also retried, as long as they do not run Salt commands, since a
+    retry could run the command twice.
+
+    Auth tokens are cached until they expire, in memory and optionally in a persistent store. Call `authenticate` once,
+    then call methods without an auth_token argument. The client will use the cached token, and log in again if the
+    Salt API responds with 401 Unauthorized.
+
+    Use `get_client` to share one client per Salt API host across warm lambda invocations.
+
+    Fields:
+        - host (str): Salt API host, includes uri scheme
+        - session (requests.Session): HTTP session which holds the connection pool
+        - connect_timeout (float): Number of seconds to wait when connecting to the Salt API
+        - read_timeout (float): Number of seconds to wait for the Salt API to respond. Synchronous Salt commands must
+            complete within this time
+        - max_retries (int): Number of times a failed request is retried
+        - backoff_factor (float): Number of seconds to wait before the first retry, doubles every retry
+        - token_store (lib.store.Store): Persistent auth token cache, None to only cache tokens in memory
+        - tokens (Dict[str, Dict[str, object]]): In memory auth token cache, username to dict with `token` and `expire`
+            fields
+        - username (str): Username provided to `authenticate`, used to log in again
+        - password (str): Password provided to `authenticate`, used to log in again
+        - codec (lib.codec.Codec): Requests and decodes Salt command responses in this format, defaults to JSON
+    """
 
+    def __init__(self, host: str, connect_timeout: float = 10, read_timeout: float = 300, max_retries: int = 3,
+                 backoff_factor: float = 0.5, pool_size: int = 4, token_store: lib.store.Store = None,
+                 codec: lib.codec.Codec = None):
+        """ Creates a SaltClient
+        Args:
+            - See class fields
+            - pool_size: Maximum number of connections kept alive
+        """
+        self.host = host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        self.token_store = token_store
+        self.tokens = {}
+        self.username = None
+        self.password = None
+
+        self.codec = codec
+        if self.codec is None:
+            self.codec = lib.codec.JSONCodec()
+
+        self.session = requests.Session()
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __request__(self, method: str, path: str, idempotent: bool, **kwargs) -> requests.Response:
+        """ Makes an HTTP request to the Salt API, retrying on failure
+        The duration of each attempt is recorded by lib.trace, under the request's method and first path segment.
+
+        Args:
+            - method: HTTP method
+            - path: Request path, relative to the host
+            - idempotent: If True the request is retried when the Salt API responds with a 5xx status, or the
+                connection fails. If False the request is only retried if connecting timed out, so a request the Salt
+                API may have received is never sent twice
+            - kwargs: Additional requests.Session.request arguments
+
+        Raises:
+            - requests.exceptions.RequestException: If the request did not succeed after all retries
+
+        Returns: Response
+        """
+        url = urllib.parse.urljoin(self.host, path)
+        api_name = "salt.{}./{}".format(method, path.strip('/').split('/')[0])
+        attempt = 0
+
+        while True:
+            started_at = lib.clock.now()
+
+            try:
+                resp = self.session.request(method, url, timeout=(self.connect_timeout, self.read_timeout), **kwargs)
+
+                lib.trace.record_api_call(api_name, lib.clock.now() - started_at)
+
+                if resp.status_code < 500 or not idempotent or attempt >= self.max_retries:
+                    return resp
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= self.max_retries or (not idempotent and
+                                                   not isinstance(e, requests.exceptions.ConnectTimeout)):
+                    raise
+
+            lib.clock.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    def __authed_request__(self, method: str, path: str, idempotent: bool, auth_token: str,
+                           headers: Dict[str, str], **kwargs) -> requests.Response:
+        """ Makes an authenticated HTTP request to the Salt API
+        Args:
+            - method, path, idempotent, kwargs: See `__request__`
+            - auth_token: Salt API auth token, None to use the token from `authenticate`. If None and the Salt API
+                responds with 401 Unauthorized, logs in again and retries the request once
+            - headers: Request headers, the auth token header is added
+
+        Raises:
+            - ValueError: If auth_token is None and `authenticate` was not called
+
+        Returns: Response
+        """
+        managed_token = auth_token is None
+
+        if managed_token:
+            if self.username is None:
+                raise ValueError("No auth_token provided and SaltClient.authenticate was not called")
+
+            auth_token = self.get_auth_token(self.username, self.password)
+
+        headers['x-auth-token'] = auth_token
+
+        resp = self.__request__(method, path, idempotent=idempotent, headers=headers, **kwargs)
+
+        if resp.status_code == 401 and managed_token:
+            self.forget_auth_token(self.username)
+
+            headers['x-auth-token'] = self.get_auth_token(self.username, self.password)
+
+            resp = self.__request__(method, path, idempotent=idempotent, headers=headers, **kwargs)
+
+        return resp
+
+    def authenticate(self, username: str, password: str) -> str:
+        """ Sets the credentials used to retrieve auth tokens, and retrieves an auth token
+        Args:
+            - username: Salt API username
+            - password: Salt API password
+
+        Raises:
+            - ValueError: If Salt API response is not valid
+
+        Returns: Authentication token
+        """
+        self.username = username
+        self.password = password
+
+        return self.get_auth_token(username, password)
+
+    def __token_store_key__(self, username: str) -> str:
+        return "salt-token/{}/{}".format(self.host, username)
+
+    def forget_auth_token(self, username: str):
+        """ Removes an auth token from the caches
+        Args:
+            - username: Salt API username token is for
+        """
+        self.tokens.pop(username, None)
+
+        if self.token_store is not None:
+            self.token_store.pop(self.__token_store_key__(username))
+
+    def get_auth_token(self, username: str, password: str) -> str:
+        """ Retrieves a Salt API authentication token. Only logs in if no cached token exists which will be valid for
+        at least TOKEN_EXPIRE_MARGIN seconds.
+        Args:
+            - username: Salt API username
+            - password: Salt API password
+
+        Returns:
+            - Authentication token
+
+        Raises:
+            - ValueError: If Salt API response is not valid
+        """
+        # Check in memory cache
+        cached = self.tokens.get(username, None)
+
+        if cached is not None and cached['expire'] - TOKEN_EXPIRE_MARGIN > lib.clock.now():
+            return cached['token']
+
+        # Check persistent cache
+        if self.token_store is not None:
+            cached = self.token_store.get(self.__token_store_key__(username))
+
+            if cached is not None and cached['expire'] - TOKEN_EXPIRE_MARGIN > lib.clock.now():
+                self.tokens[username] = cached
+
+                return cached['token']
+
+        # Log in
+        cached = self.__login__(username, password)
+
+        self.tokens[username] = cached
+
+        if self.token_store is not None:
+            self.token_store.put(self.__token_store_key__(username), cached)
+
+        return cached['token']
+
+    def __login__(self, username: str, password: str) -> Dict[str, object]:
+        """ Logs into the Salt API
+        Args:
+            - username: Salt API username
+            - password: Salt API password
+
+        Raises:
+            - ValueError: If Salt API response is not valid
+
+        Returns: Dict with the `token` and `expire` fields
+        """
+        # Make auth request
+        req_headers = {
+            'Accept': 'application/json'
+        }
+        req_body = {
+            'username': username,
+            'password': password,
+            'eauth': 'pam'
+        }
+
+        resp = self.__request__('POST', '/login', idempotent=False, headers=req_headers, data=req_body)
+
+        # Parse response
+        resp_body = resp.json()
+
+        if 'return' not in resp_body or len(resp_body['return']) != 1:
+            raise ValueError("Malformed Salt auth API response, expected 'return' key containing an array with 1 " +
+                             "entry, was: {}".format(resp_body))
+
+        login_resp = resp_body['return'][0]
+
+        return {
+            'token': login_resp['token'],
+            'expire': login_resp['expire']
+        }
+
+    def exec(self, auth_token: str = None, minion: str = None, cmd: str = None, args: List[str] = [],
+             salt_client: str = 'local', tgt_type: str = None):
+        """ Executes a Salt command
+        Args:
+            - auth_token: Salt API auth token, None to use the token from `authenticate`
+            - minion: Minion target string
+            - cmd: Salt command to run
+            - args: Salt command positional arguments
+            - salt_client: Salt runner client to use when executing the provided command. Defaults to 'local' which is
+                           the same as running the salt command locally.
+                           'local_async' can be used to run a command asynchronously. This client will return the ID
+                           of the job which was started. Or 0 if the job failed to start. Provide the returned ID to
+                           get_job to retrieve the result.
+            - tgt_type: Type of target statement for minion
+
+        Raises:
+            - ValueError: If Salt API response is not valid
+        """
+        # Make request
+        req_headers = {
+            'Accept': self.codec.content_type
+        }
+        req_data = {
+            'client': salt_client,
+            'tgt': minion,
+            'fun': cmd,
+            'arg': args
+        }
+
+        if tgt_type is not None:
+            req_data['tgt_type'] = tgt_type
+
+        resp = self.__authed_request__('POST', '/', idempotent=False, auth_token=auth_token, headers=req_headers,
+                                       json=req_data)
+
+        # Parse response
+        resp_body = self.codec.decode(resp.content)
+
+        if 'return' not in resp_body:
+            raise ValueError("Malformed Salt state run API response, expected 'return' key holding an array, was: {}"
+                             .format(resp_body))
+
+        return resp_body['return']
+
+    def get_job(self, auth_token: str = None, job_id: str = None) -> Dict[str, object]:
+        """ Retrieves the status of a Salt job
+        Args:
+            - auth_token: Salt API auth token, None to use the token from `authenticate`
+            - job_id: ID of Salt job to retrieve
+
+        Raises:
+            - ValueError: If job_id is 0, this signals that the job failed to start in the first place
+            - ValueError: If the Salt API response is invalid
+
+        Returns: Job status
+        """
+        # Check job_id
+        if job_id == 0:
+            raise ValueError("job_id == 0 signals that the job never successfully started")
+
+        # Make request
+        req_headers = {
+            'Accept': self.codec.content_type
+        }
+
+        resp = self.__authed_request__('GET', "jobs/{}".format(job_id), idempotent=True, auth_token=auth_token,
+                                       headers=req_headers)
+
+        # Parse response
+        resp_body = self.codec.decode(resp.content)
+
+        if 'return' not in resp_body:
+            raise ValueError("Malformed Salt API response, expected 'return' key")
+
+        if len(resp_body['return']) == 0:
+            raise ValueError("Expected at least 1 return result from Salt API, was: {}".format(resp_body))
+
+        return resp_body['return']
+
+    def get_jobs(self, job_ids: List[str], auth_token: str = None,
+                 chunk_size: int = JOB_LOOKUP_CHUNK_SIZE) -> Dict[str, 'JobStatus']:
+        """ Retrieves the status of many Salt jobs
+        Runs the jobs.lookup_jid runner once per job, sending up to chunk_size runner calls in each Salt API request.
+
+        Args:
+            - job_ids: IDs of Salt jobs to retrieve
+            - auth_token: Salt API auth token, None to use the token from `authenticate`
+            - chunk_size: Maximum number of jobs to look up in each request
+
+        Raises:
+            - ValueError: If the Salt API response is invalid
+
+        Returns: Job ID to job status, jobs the runner could not look up have the JOB_ERROR state
+        """
+        statuses = {}
+
+        for i in range(0, len(job_ids), chunk_size):
+            chunk_job_ids = job_ids[i:i + chunk_size]
+
+            # Make request
+            req_headers = {
+                'Accept': self.codec.content_type
+            }
+            req_data = [{
+                'client': 'runner',
+                'fun': 'jobs.lookup_jid',
+                'jid': job_id
+            } for job_id in chunk_job_ids]
+
+            resp = self.__authed_request__('POST', '/', idempotent=True, auth_token=auth_token, headers=req_headers,
+                                           json=req_data)
+
+            # Parse response
+            resp_body = self.codec.decode(resp.content)
+
+            if 'return' not in resp_body or len(resp_body['return']) != len(chunk_job_ids):
+                raise ValueError("Malformed Salt API response, expected 'return' key holding {} entries"
+                                 .format(len(chunk_job_ids)))
+
+            for job_id, job_result in zip(chunk_job_ids, resp_body['return']):
+                # The runner wraps the result of jobs which have an outputter, like state.apply
+                if isinstance(job_result, dict) and 'outputter' in job_result and 'data' in job_result:
+                    job_result = job_result['data']
+
+                # Runner errors, like an invalid job ID, are returned as strings instead of minion results
+                if not isinstance(job_result, dict):
+                    statuses[job_id] = JobStatus(job_id, [], error=str(job_result))
+                    continue
+
+                # The runner returns the results of every minion in one object, keyed by minion name
+                statuses[job_id] = JobStatus(job_id, [{minion: result} for minion, result in job_result.items()])
+
+        return statuses
+
+    def event_stream(self, auth_token: str = None) -> 'EventStream':
+        """ Creates a Salt API event stream which uses this client's session
+        Args:
+            - auth_token: Salt API auth token, None to use the token from `authenticate`
+
+        Returns: Event stream, which is not open yet
+        """
+        if auth_token is None:
+            auth_token = self.get_auth_token(self.username, self.password)
+
+        return EventStream(self.host, auth_token, connect_timeout=self.connect_timeout, session=self.session)
+
+
+# Clients by host, kept between warm lambda invocations
+clients = {}
+
+
+def get_client(host: str) -> SaltClient:
+    """ Retrieves the shared Salt API client for a host, creating it if it does not exist
+    If the SALT_TOKEN_TABLE environment variable is set auth tokens are also cached in the DynamoDB table it names. The
+    SALT_API_CODEC environment variable can be set to the name of a lib.codec codec to request responses in that format.
 
-def get_auth_token(host: str, username: str, password: str) -> str:
-    """ Retrieves a Salt API authentication token.
     Args:
         - host: Salt API host, includes uri scheme
-        - username: Salt API username
-        - password: Salt API password
 
-    Returns:
-        - Authentication token
-
-    Raises:
-        - ValueError: If Salt API response is not valid
+    Returns: Salt API client
     """
-    # Make auth request
-    req_headers = {
-        'Accept': 'application/json'
-    }
-    req_url = urllib.parse.urljoin(host, '/login')
-    req_body = {
-        'username': username,
-        'password': password,
-        'eauth': 'pam'
-    }
+    if host not in clients:
+        token_store = None
+
+        if os.environ.get('SALT_TOKEN_TABLE', None):
+            token_store = lib.store.DynamoDBStore(os.environ['SALT_TOKEN_TABLE'])
 
-    resp = requests.post(req_url, headers=req_headers, data=req_body)
+        clients[host] = SaltClient(host, token_store=token_store,
+                                   codec=lib.codec.get_codec(os.environ.get('SALT_API_CODEC', 'json')))
 
-    # Parse response
-    resp_body = resp.json()
+    return clients[host]
 
-    if 'return' not in resp_body or len(resp_body['return']) != 1:
-        raise ValueError("Malformed Salt auth API response, expected 'return' key containing an array with 1 entry" +
-                         ", was: {}".format(resp_body))
 
-    return resp_body['return'][0]['token']
+def get_auth_token(host: str, username: str, password: str) -> str:
+    """ Retrieves a Salt API authentication token using the shared client for the host, see SaltClient.get_auth_token
+    """
+    return get_client(host).get_auth_token(username, password)
 
 
 def exec(host: str, auth_token: str, minion: str, cmd: str, args: List[str] = [], salt_client: str = 'local',
          tgt_type: str = None):
-    """ Executes a Salt command
+    """ Executes a Salt command using the shared client for the host, see SaltClient.exec
+    """
+    return get_client(host).exec(auth_token, minion, cmd, args=args, salt_client=salt_client, tgt_type=tgt_type)
+
+
+def get_job(host: str, auth_token: str, job_id: str) -> Dict[str, object]:
+    """ Retrieves the status of a Salt job using the shared client for the host, see SaltClient.get_job
+    """
+    return get_client(host).get_job(auth_token, job_id)
+
+
+def get_jobs(host: str, auth_token: str, job_ids: List[str]) -> Dict[str, 'JobStatus']:
+    """ Retrieves the status of many Salt jobs using the shared client for the host, see SaltClient.get_jobs
+    """
+    return get_client(host).get_jobs(job_ids, auth_token=auth_token)
+
+
+def parse_job_return_tag(tag: str) -> str:
+    """ Parses the tag of a Salt event sent when a minion returns a job's result
     Args:
-        - host: Salt API host, includes uri scheme
-        - auth_token: Salt API auth token
-        - minion: Minion target string
-        - cmd: Salt command to run
-        - args: Salt command positional arguments
-        - salt_client: Salt runner client to use when executing the provided command. Defaults to 'local' which is the
-                       same as running the salt command locally.
-                       'local_async' can be used to run a command asynchronously. This client will return the ID of the
-                       job which was started. Or 0 if the job failed to start. Provide the returned ID to get_job to
-                       retrieve the result.
-        - tgt_type: Type of target statement for minion
+        - tag: Salt event tag, format: salt/job/<job id>/ret/<minion name>
 
-    Raises:
-        - ValueError: If Salt API response is not valid
+    Returns: ID of job, None if the tag is not for a job return event
     """
-    # Make request
-    req_headers = {
-        'Accept': 'application/x-yaml',
-        'x-auth-token': auth_token
-    }
-    req_data = {
-        'client': salt_client,
-        'tgt': minion,
-        'fun': cmd,
-        'arg': args
-    }
+    parts = tag.split('/')
 
-    if tgt_type is not None:
-        req_data['tgt_type'] = tgt_type
+    if len(parts) != 5 or parts[0] != 'salt' or parts[1] != 'job' or parts[3] != 'ret':
+        return None
 
-    resp = requests.post(host, headers=req_headers, json=req_data)
+    return parts[2]
 
-    # Parse response
-    resp_body = yaml.load(resp.content)
 
-    if 'return' not in resp_body:
-        raise ValueError("Malformed Salt state run API response, expected 'return' key holding an array, was: {}"
-                         .format(resp_body))
+class EventStream:
+    """ Reads events from the Salt API event stream
+    The Salt API sends every event on the Salt master's event bus to the /events endpoint as server sent events.
 
-    return resp_body['return']
+    Fields:
+        - host (str): Salt API host, includes uri scheme
+        - auth_token (str): Salt API auth token
+        - connect_timeout (float): Number of seconds to wait when connecting to the Salt API
+        - session (requests.Session): HTTP session used to connect
+        - resp (requests.Response): Open event stream response, None if the stream is not open
+    """
 
+    def __init__(self, host: str, auth_token: str, connect_timeout: float = 10, session: requests.Session = None):
+        self.host = host
+        self.auth_token = auth_token
+        self.connect_timeout = connect_timeout
+        self.session = session
+
+        if self.session is None:
+            self.session = requests.Session()
+
+        self.resp = None
+
+    def open(self, read_timeout: float):
+        """ Connects to the event stream
+        Open the stream before checking if the event you are waiting for has already happened, so the event is not
+        missed.
+
+        Args:
+            - read_timeout: Maximum number of seconds to wait for the Salt API to send data
+
+        Raises:
+            - requests.HTTPError: If the Salt API responds with an error status
+        """
+        req_headers = {
+            'Accept': 'text/event-stream',
+            'x-auth-token': self.auth_token
+        }
+        url = urllib.parse.urljoin(self.host, '/events')
+
+        self.resp = self.session.get(url, headers=req_headers, stream=True,
+                                     timeout=(self.connect_timeout, read_timeout))
+        self.resp.raise_for_status()
+
+    def close(self):
+        """ Disconnects from the event stream
+        """
+        if self.resp is not None:
+            self.resp.close()
+            self.resp = None
+
+    def events(self) -> Iterator[Tuple[str, Dict[str, object]]]:
+        """ Reads events from the stream until it is closed
+        Raises:
+            - requests.exceptions.ConnectionError: If no data is received within the read timeout
+
+        Returns: Iterator of (tag, data) tuples
+        """
+        data_lines = []
+
+        # chunk_size=None yields data as soon as it is received, instead of waiting for a full chunk
+        for line in self.resp.iter_lines(chunk_size=None, decode_unicode=True):
+            if line is None:
+                continue
+
+            # A blank line ends an event
+            if len(line) == 0:
+                if len(data_lines) > 0:
+                    event = json.loads("\n".join(data_lines))
+                    data_lines = []
+
+                    yield event['tag'], event['data']
+
+                continue
+
+            # Data lines hold the JSON encoded event, other fields (tag, retry, comments) are not needed
+            if line.startswith('data:'):
+                data_lines.append(line[len('data:'):].strip())
+
+
+# Number of characters of each failed state's stdout and stderr kept in a JobDigest
+OUTPUT_TAIL_SIZE = 1024
+
+# Maximum number of failed states kept per minion in a JobDigest
+MAX_FAILED_STATES = 5
+
+
+class StateDigest:
+    """ Summary of a failed Salt state
+    Fields:
+        - name (str): State ID
+        - run_num (int): Order state was run in
+        - retcode (int): Command return code, None if the state did not run a command
+        - comment (str): Note about state execution, truncated to OUTPUT_TAIL_SIZE
+        - stdout_tail (str): Last OUTPUT_TAIL_SIZE characters of stdout
+        - stderr_tail (str): Last OUTPUT_TAIL_SIZE characters of stderr
+    """
+    __slots__ = ('name', 'run_num', 'retcode', 'comment', 'stdout_tail', 'stderr_tail')
+
+    def __init__(self, name: str, state_result: object, tail_size: int = OUTPUT_TAIL_SIZE):
+        """ Creates a StateDigest
+        Args:
+            - name: State ID
+            - state_result: Salt state result, or the error a minion returned instead of state results
+            - tail_size: Number of characters of output to keep
+        """
+        self.name = name
+        self.run_num = None
+        self.retcode = None
+        self.comment = None
+        self.stdout_tail = None
+        self.stderr_tail = None
+
+        if not isinstance(state_result, dict):
+            self.comment = str(state_result)[:tail_size]
+            return
+
+        self.run_num = state_result.get('__run_num__', None)
+        self.comment = str(state_result.get('comment', ''))[:tail_size]
+
+        changes = state_result.get('changes', None)
+        if isinstance(changes, dict):
+            self.retcode = changes.get('retcode', None)
+            self.stdout_tail = str(changes.get('stdout', ''))[-tail_size:]
+            self.stderr_tail = str(changes.get('stderr', ''))[-tail_size:]
+
+    def __repr__(self) -> str:
+        return "StateDigest(name={}, run_num={}, retcode={}, comment={}, stdout_tail={}, stderr_tail={})" \
+            .format(self.name, self.run_num, self.retcode, self.comment, self.stdout_tail, self.stderr_tail)
+
+
+class MinionDigest:
+    """ Summary of the states a minion ran for a Salt job
+    Fields:
+        - minion (str): Name of minion
+        - state_count (int): Number of states minion ran
+        - failed_count (int): Number of states which failed
+        - failed_states (List[StateDigest]): First MAX_FAILED_STATES failed states, in the order they were run
+    """
+    __slots__ = ('minion', 'state_count', 'failed_count', 'failed_states')
 
-def get_job(host: str, auth_token: str, job_id: str) -> Dict[str, object]:
-    """ Retrieves the status of a Salt job
-    Args:
-        - host: Salt API host, includes uri scheme
-        - auth_token: Salt API auth token
-        - job_id: ID of Salt job to retrieve
+    def __init__(self, minion: str):
+        self.minion = minion
+        self.state_count = 0
+        self.failed_count = 0
+        self.failed_states = []
 
-    Raises:
-        - ValueError: If job_id is 0, this signals that the job failed to start in the first place
-        - ValueError: If the Salt API response is invalid
+    def __repr__(self) -> str:
+        return "MinionDigest(minion={}, state_count={}, failed_count={}, failed_states={})" \
+            .format(self.minion, self.state_count, self.failed_count, self.failed_states)
+
+
+class JobDigest:
+    """ Bounded size summary of a Salt job result
+    Only failures are kept, so the digest is small regardless of how much output the job returned. Use it in logs and
+    exception messages instead of the job result.
 
-    Returns: Job status
+    Fields:
+        - minions (List[MinionDigest]): Summary of each minion's results
+        - state_count (int): Number of states run by all minions
+        - failed_count (int): Number of states which failed on all minions
     """
-    # Check job_id
-    if job_id == 0:
-        raise ValueError("job_id == 0 signals that the job never successfully started")
+    __slots__ = ('minions', 'state_count', 'failed_count')
 
-    # Make request
-    req_headers = {
-        'Accept': 'application/x-yaml',
-        'x-auth-token': auth_token
-    }
-    url = urllib.parse.urljoin(host, "jobs/{}".format(job_id))
+    def __init__(self, job_results: List[object], tail_size: int = OUTPUT_TAIL_SIZE,
+                 max_failed_states: int = MAX_FAILED_STATES):
+        """ Validates and summarizes a Salt job result
+        Args:
+            - job_results: Salt API job result, see check_job_result
+            - tail_size: Number of characters of output to keep for each failed state
+            - max_failed_states: Maximum number of failed states to keep per minion
 
-    resp = requests.get(url, headers=req_headers)
+        Raises:
+            - NoMinionResultsException: If job_results shows that no minions have run the job
+        """
+        self.minions = []
+        self.state_count = 0
+        self.failed_count = 0
 
-    # Parse response
-    resp_body = yaml.load(resp.content)
+        # Check that at least 1 minion ran job
+        if len(job_results) == 0:
+            raise NoMinionResultsException("No minions ran job")
 
-    if 'return' not in resp_body:
-        raise ValueError("Malformed Salt API response, expected 'return' key")
+        for minion_job_results_top_obj in job_results:
+            # Check object contains exactly 1 minion name
+            if not isinstance(minion_job_results_top_obj, dict) or len(minion_job_results_top_obj) != 1:
+                raise NoMinionResultsException("Minion job result object did not contain exactly 1 top level key " +
+                                               "representing the minion's name, keys={}"
+                                               .format(list(minion_job_results_top_obj)[:max_failed_states]))
 
-    if len(resp_body['return']) == 0:
-        raise ValueError("Expected at least 1 return result from Salt API, was: {}".format(resp_body))
+            minion_name, minion_job_results = next(iter(minion_job_results_top_obj.items()))
+            minion = MinionDigest(minion_name)
 
-    return resp_body['return']
+            # Minions which fail to render states return errors instead of state results
+            if not isinstance(minion_job_results, dict):
+                minion_job_results = {'<minion error>': minion_job_results}
+
+            # Check at least 1 command ran
+            if len(minion_job_results) == 0:
+                raise NoMinionResultsException(("Minion \"{}\" job results object did not contain at least 1 " +
+                                                "command status sub object").format(minion_name))
+
+            for state_name, state_result in minion_job_results.items():
+                minion.state_count += 1
+
+                if isinstance(state_result, dict) and state_result.get('result', False):
+                    continue
+
+                minion.failed_count += 1
+
+                # Keep the failed states which ran first
+                minion.failed_states.append(StateDigest(state_name, state_result, tail_size=tail_size))
+                minion.failed_states.sort(key=lambda state: state.run_num if state.run_num is not None else -1)
+
+                if len(minion.failed_states) > max_failed_states:
+                    minion.failed_states.pop()
+
+            self.minions.append(minion)
+            self.state_count += minion.state_count
+            self.failed_count += minion.failed_count
+
+    def succeeded(self) -> bool:
+        """ Returns: True if every state succeeded on every minion
+        """
+        return self.failed_count == 0
+
+    def monitoring_tags(self) -> str:
+        """ Returns: Datadog tags which summarize the job, for MONITORING log lines
+        """
+        return "minions:{},states:{},failed_states:{}".format(len(self.minions), self.state_count, self.failed_count)
+
+    def __repr__(self) -> str:
+        return "JobDigest(state_count={}, failed_count={}, minions={})" \
+            .format(self.state_count, self.failed_count, self.minions)
 
 
 class NoMinionResultsException(Exception):
@@ -135,11 +712,17 @@ class NoMinionResultsException(Exception):
 
 class JobFailedException(Exception):
     """ Indicates that a Salt job did not run successfully
+    Fields:
+        - digest (JobDigest): Summary of job result
     """
-    pass
 
+    def __init__(self, digest: JobDigest):
+        super().__init__("Salt job failed, result={}".format(digest))
 
-def check_job_result(job_results: List[object]):
+        self.digest = digest
+
+
+def check_job_result(job_results: List[object]) -> JobDigest:
     """ Checks a Salt job result to ensure it completed successfully
     Args:
         - job_result: Salt API job result. Should be an array of objects.
@@ -160,38 +743,58 @@ def check_job_result(job_results: List[object]):
     Raises:
         - NoMinionResultsException: If job_results shows that not minions have run the job
         - JobFailedException: If job_results shows that minion did not run a command successfully
+
+    Returns: Summary of job result
+    """
+    digest = JobDigest(job_results)
+
+    if not digest.succeeded():
+        raise JobFailedException(digest)
+
+    return digest
+
+
+# Salt job completion states
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_ERROR = 'error'
+
+
+class JobStatus:
+    """ Completion state of a Salt job
+    Fields:
+        - job_id (str): ID of Salt job
+        - state (str): One of the JOB_* constants
+        - digest (JobDigest): Summary of job result, None if the job is running or could not be looked up
+        - error (str): Reason the job could not be looked up, None unless the state is JOB_ERROR
     """
-    # Check that at least 1 minion ran job
-    if len(job_results) == 0:
-        raise NoMinionResultsException("No minions ran job, job_results={}".format(job_results))
-
-    # Check each minion exited successfully
-    for minion_job_results_top_obj in job_results:
-        # Check object contains exactly 1 minion name
-        if len(list(minion_job_results_top_obj)) != 1:
-            raise NoMinionResultsException("Minion job result object did not contain exactly 1 top level key " +
-                                           "representing the minion's name, minion_job_results_top_obj={}, "
-                                           .format(minion_job_results_top_obj) + "job_results={}"
-                                           .format(job_results))
-
-        # Get minion key name
-        minion_name = list(minion_job_results_top_obj)[0]
-        minion_job_results = minion_job_results_top_obj[minion_name]
-
-        # Get names of commands minion ran
-        cmd_names = list(minion_job_results)
-
-        # Check at least 1 command ran
-        if len(cmd_names) == 0:
-            raise NoMinionResultsException("Minion job results object did not contain at least 1 command status sub " +
-                                           "object, minion_job_results_top_obj={}, job_results={}"
-                                           .format(minion_job_results_top_obj, job_results))
-
-        # Check each command minion ran succeeded
-        for cmd_name in cmd_names:
-            cmd_result = minion_job_results[cmd_name]
-
-            if not cmd_result['result']:
-                raise JobFailedException("Minion \"{}\" failed to run command={}, minion_job_results_top_obj={},"
-                                 .format(minion_name, cmd_result, minion_job_results_top_obj) +
-                                 "job_results={}".format(job_results))
+    __slots__ = ('job_id', 'state', 'digest', 'error')
+
+    def __init__(self, job_id: str, job_results: List[object], error: str = None):
+        """ Creates a JobStatus
+        Args:
+            - job_id: ID of Salt job
+            - job_results: Salt API job result, see check_job_result
+            - error: Reason the job could not be looked up, if set job_results is ignored
+        """
+        self.job_id = job_id
+        self.digest = None
+        self.error = error
+
+        if error is not None:
+            self.state = JOB_ERROR
+            return
+
+        try:
+            self.digest = check_job_result(job_results)
+            self.state = JOB_SUCCEEDED
+        except NoMinionResultsException:
+            self.state = JOB_RUNNING
+        except JobFailedException as e:
+            self.digest = e.digest
+            self.state = JOB_FAILED
+
+    def __repr__(self) -> str:
+        return "JobStatus(job_id={}, state={}, digest={}, error={})".format(self.job_id, self.state, self.digest,
+                                                                           self.error)
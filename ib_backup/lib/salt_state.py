@@ -0,0 +1,133 @@
+import os
+from typing import Dict
+
+import lib.job
+import lib.salt
+import lib.envelope
+import lib.event_bus
+import lib.polling
+
+
+class SaltStateJob(lib.job.Job):
+    """ Applies a Salt state to the development Infobright instance, and waits for the state run to complete
+    The state is applied using the `local_async` Salt client, so the lambda is not held open while the state runs. The
+    Salt job's ID is stored in the event, and the Job repeats until the job completes, like other waiting steps. If an
+    event bus is configured the Job is also invoked when the job's return event is published.
+
+    Subclasses set the `step_name`, `state_name` and `salt_job_id_field` class fields. Once the state is applied the
+    next step is invoked with the development instance's ID, override `handle_state_applied` to change this.
+
+    Fields:
+        - step_name (str): Name of step, see lib.steps
+        - state_name (str): Name of Salt state to apply
+        - salt_job_id_field (str): Event field the Salt job's ID is stored in
+    """
+    event_schema = lib.envelope.EventSchema({
+        'dev_ib_backup_instance_id': str
+    })
+
+    step_name = None
+    state_name = None
+    salt_job_id_field = None
+
+    @classmethod
+    def new_job(cls, **kwargs) -> 'SaltStateJob':
+        """ Creates the step's Job
+        Args:
+            - kwargs: Additional lib.job.Job constructor arguments, override the step's defaults
+
+        Returns: Step Job
+        """
+        job_args = {
+            'polling_policy': lib.polling.BackoffPolicy(first_probe_delay=10, initial_delay=15, max_delay=120,
+                                                        deadline=30 * 60),
+            'event_polling_policy': lib.polling.BackoffPolicy(initial_delay=60, max_delay=300, deadline=30 * 60)
+        }
+        job_args.update(kwargs)
+
+        return cls(lambda_name=cls.step_name, **job_args)
+
+    def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
+        # Get Salt API configuration
+        missing_env_vars = []
+
+        salt_api_url = os.environ.get('SALT_API_URL', None)
+        if not salt_api_url:
+            missing_env_vars.append('SALT_API_URL')
+
+        salt_api_user = os.environ.get('SALT_API_USER', None)
+        if not salt_api_user:
+            missing_env_vars.append('SALT_API_USER')
+
+        salt_api_password = os.environ.get('SALT_API_PASSWORD', None)
+        if not salt_api_password:
+            missing_env_vars.append('SALT_API_PASSWORD')
+
+        if len(missing_env_vars) > 0:
+            raise KeyError("Missing environment variables: {}".format(missing_env_vars))
+
+        # Get instance id from event
+        dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
+
+        # Authenticate with Salt API
+        salt_api = lib.salt.get_client(salt_api_url)
+        salt_api.authenticate(username=salt_api_user, password=salt_api_password)
+
+        self.logger.debug("Authenticated with Salt API")
+
+        # Apply state, if not already applied by a previous invocation
+        if self.salt_job_id_field not in event:
+            ib_backup_salt_target = "ec2:instance_id:{}".format(dev_ib_backup_instance_id)
+
+            apply_result = salt_api.exec(minion=ib_backup_salt_target,
+                                         cmd='state.apply', args=[self.state_name],
+                                         salt_client='local_async', tgt_type='grain')
+
+            if len(apply_result) != 1:
+                raise ValueError("Salt state {} invocation response did not contain exactly 1 result"
+                                 .format(self.state_name))
+
+            event[self.salt_job_id_field] = apply_result[0]['jid']
+
+            self.logger.debug("Applying Salt state, state={}, salt_job_id={}", self.state_name,
+                              event[self.salt_job_id_field])
+
+            # Wait for Salt job return event if event bus is configured
+            self.wait_topic = lib.event_bus.salt_job_topic(event[self.salt_job_id_field])
+
+            return lib.job.NextAction.REPEAT
+
+        salt_job_id = event[self.salt_job_id_field]
+
+        # Wait for Salt job return event if event bus is configured
+        self.wait_topic = lib.event_bus.salt_job_topic(salt_job_id)
+
+        # Check status of Salt job, raises JobFailedException if the state run failed
+        job_status_resp = salt_api.get_job(job_id=salt_job_id)
+
+        try:
+            job_digest = lib.salt.check_job_result(job_status_resp)
+        except lib.salt.NoMinionResultsException:
+            self.logger.debug("No results for Salt state job yet, still running, state={}", self.state_name)
+
+            return lib.job.NextAction.REPEAT
+
+        self.logger.debug("Applied Salt state, state={}, result={}", self.state_name, job_digest)
+
+        return self.handle_state_applied(event, job_digest)
+
+    def handle_state_applied(self, event: Dict[str, object], job_digest: lib.salt.JobDigest) -> lib.job.NextAction:
+        """ Called once the Salt state was applied successfully
+        Args:
+            - event: Event Job was invoked with
+            - job_digest: Result of the state run
+
+        Raises: Any exception
+
+        Returns: Next action, see lib.job.Job.handle
+        """
+        # Run next lambda
+        self.next_lambda_event = {
+            'dev_ib_backup_instance_id': event['dev_ib_backup_instance_id']
+        }
+        return lib.job.NextAction.NEXT
@@ -0,0 +1,149 @@
+import datetime
+from typing import Dict, List
+
+import lib.store
+
+# Name of tag added to snapshots once their backup has been tested
+BACKUP_TEST_STATUS_TAG_NAME = 'DBBackupValid'
+
+# Number of days searched for new snapshots when no high water mark is stored
+DEFAULT_WINDOW_DAYS = 7
+
+# Maximum number of days searched for new snapshots, limited by the number of values an EC2 API filter can have
+MAX_WINDOW_DAYS = 180
+
+
+class SnapshotIndex:
+    """ Finds the newest completed snapshot of an EBS volume without listing every snapshot of the volume
+    Only snapshots started on or after the day of the newest snapshot found by the last search, the high water mark,
+    are listed, up to MAX_WINDOW_DAYS days. If no high water mark is stored the last `window_days` days are listed,
+    and if no snapshots are found in this window every completed snapshot is listed. Once a mark is stored every
+    completed snapshot is never listed, so a search which finds no snapshot newer than the mark is cheap.
+
+    Fields:
+        - ec2: AWS EC2 API client
+        - store (lib.store.Store): Stores high water marks, None to always search the last `window_days` days
+        - window_days (int): Number of days searched when no high water mark is stored
+        - skip_tested (bool): If True snapshots which have the BACKUP_TEST_STATUS_TAG_NAME tag are ignored
+    """
+
+    def __init__(self, ec2, store: lib.store.Store = None, window_days: int = DEFAULT_WINDOW_DAYS,
+                 skip_tested: bool = False):
+        self.ec2 = ec2
+        self.store = store
+        self.window_days = window_days
+        self.skip_tested = skip_tested
+
+    def __store_key__(self, volume_id: str) -> str:
+        return "snapshot-index/{}".format(volume_id)
+
+    def __window_filter_values__(self, since: datetime.date, today: datetime.date) -> List[str]:
+        """ Builds start-time filter values which match snapshots started between two days
+        Args:
+            - since: First day, inclusive
+            - today: Last day, inclusive
+
+        Returns: Filter values, None if the window is longer than MAX_WINDOW_DAYS
+        """
+        day_count = (today - since).days + 1
+
+        if day_count > MAX_WINDOW_DAYS:
+            return None
+
+        return ["{}*".format((since + datetime.timedelta(days=i)).isoformat()) for i in range(max(1, day_count))]
+
+    def __find_newest__(self, volume_id: str, window_values: List[str]) -> Dict[str, object]:
+        """ Lists completed snapshots of a volume to find the newest
+        Args:
+            - volume_id: ID of volume snapshots are of
+            - window_values: Start time filter values, None to list all snapshots
+
+        Returns: Newest snapshot, None if no snapshots were listed
+        """
+        filters = [{
+            'Name': 'volume-id',
+            'Values': [volume_id]
+        }, {
+            'Name': 'status',
+            'Values': ['completed']
+        }]
+
+        if window_values is not None:
+            filters.append({
+                'Name': 'start-time',
+                'Values': window_values
+            })
+
+        newest_snapshot = None
+
+        snapshot_pager = self.ec2.get_paginator('describe_snapshots')
+
+        for snapshot_resp in snapshot_pager.paginate(Filters=filters):
+            for snapshot in snapshot_resp['Snapshots']:
+                if self.skip_tested and is_tested(snapshot):
+                    continue
+
+                if newest_snapshot is None or snapshot['StartTime'] > newest_snapshot['StartTime']:
+                    newest_snapshot = snapshot
+
+        return newest_snapshot
+
+    def newest_snapshot(self, volume_id: str, now: datetime.datetime = None) -> Dict[str, object]:
+        """ Finds the newest completed snapshot of a volume, and stores it as the new high water mark if it is newer
+        than the stored mark
+        Args:
+            - volume_id: ID of volume snapshots are of
+            - now: Current UTC time, defaults to now
+
+        Returns: Snapshot, None if the volume has no completed snapshots, or if a high water mark is stored and no
+            snapshots were started since the mark's day
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        today = now.date()
+        since = today - datetime.timedelta(days=self.window_days - 1)
+
+        # Start window at high water mark
+        mark = None
+        if self.store is not None:
+            mark = self.store.get(self.__store_key__(volume_id))
+
+        if mark is not None:
+            since = datetime.datetime.utcfromtimestamp(mark['start_time']).date()
+            since = max(since, today - datetime.timedelta(days=MAX_WINDOW_DAYS - 1))
+
+        # Search window, then all snapshots if no snapshot was ever found
+        window_values = self.__window_filter_values__(since, today)
+        snapshot = None
+
+        if window_values is not None:
+            snapshot = self.__find_newest__(volume_id, window_values)
+
+        if snapshot is None and mark is None:
+            snapshot = self.__find_newest__(volume_id, None)
+
+        # Store high water mark, never lowered. The window starts at the start of the mark's day, so it can find a
+        # snapshot older than the mark, for example if skip_tested ignored the newer ones
+        if snapshot is not None and self.store is not None and \
+                (mark is None or snapshot['StartTime'].timestamp() > mark['start_time']):
+            self.store.put(self.__store_key__(volume_id), {
+                'snapshot_id': snapshot['SnapshotId'],
+                'start_time': snapshot['StartTime'].timestamp()
+            })
+
+        return snapshot
+
+
+def is_tested(snapshot: Dict[str, object]) -> bool:
+    """ Determines if a snapshot's backup has been tested
+    Args:
+        - snapshot: EC2 snapshot object
+
+    Returns: True if the snapshot has the BACKUP_TEST_STATUS_TAG_NAME tag
+    """
+    for tag in snapshot.get('Tags', []):
+        if tag['Key'] == BACKUP_TEST_STATUS_TAG_NAME:
+            return True
+
+    return False
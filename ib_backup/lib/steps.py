@@ -1,9 +1,138 @@
+from typing import Dict, List
+
 # Step names
 STEP_CREATE_VOLUME = 'step_create_volume'
 STEP_WAIT_VOLUME_CREATED = 'step_wait_volume_created'
+STEP_SETUP_TEST = 'step_setup_test'
 STEP_ATTACH_VOLUME = 'step_attach_volume'
 STEP_WAIT_VOLUME_ATTACHED = 'step_wait_volume_attached'
 STEP_TEST_BACKUP = 'step_test_backup'
 STEP_WAIT_TEST_COMPLETED = 'step_wait_test_completed'
 STEP_WAIT_VOLUME_DETACHED = 'step_wait_volume_detached'
+STEP_TEARDOWN_TEST = 'step_teardown_test'
 STEP_CLEANUP = 'step_cleanup'
+
+# Join conditions, determine when a step which runs after multiple steps runs
+JOIN_ALL = 'all'  # Once every previous step has completed
+JOIN_ANY = 'any'  # Once the first previous step has completed
+
+JOIN_CONDITIONS = [JOIN_ALL, JOIN_ANY]
+
+# Event field which holds the name of the step which invoked a step, used to join branches
+FROM_STEP_FIELD = 'from_step'
+
+
+class StepGraph:
+    """ Declares the order steps run in
+    A step can be followed by multiple steps, which run in parallel branches. A step which follows multiple steps
+    joins their branches, it runs once its join condition is met, with the events of every branch which completed
+    merged together.
+
+    Fields:
+        - next_steps (Dict[str, List[str]]): Step name to names of steps which run after it
+        - previous_steps (Dict[str, List[str]]): Step name to names of steps it runs after
+        - join_conditions (Dict[str, str]): Step name to its join condition, one of JOIN_CONDITIONS, for steps which
+            run after multiple steps
+        - order (List[str]): Names of every step, each step is after all the steps it runs after
+    """
+
+    def __init__(self, next_steps: Dict[str, List[str]], join_conditions: Dict[str, str] = None):
+        """ Creates a StepGraph
+        Args:
+            - next_steps: See class fields, steps which are not followed by any step can be omitted
+            - join_conditions: Join conditions of steps which run after multiple steps, defaults to JOIN_ALL
+
+        Raises:
+            - ValueError: If the graph has a cycle, a join condition is not valid, or is given for a step which does
+                not run after multiple steps
+        """
+        self.next_steps = {}
+        self.previous_steps = {}
+
+        for step_name, step_next_steps in next_steps.items():
+            self.next_steps[step_name] = list(step_next_steps)
+            self.previous_steps.setdefault(step_name, [])
+
+            for next_step_name in step_next_steps:
+                self.next_steps.setdefault(next_step_name, [])
+                self.previous_steps.setdefault(next_step_name, []).append(step_name)
+
+        if join_conditions is None:
+            join_conditions = {}
+
+        self.join_conditions = {}
+
+        for step_name, step_previous_steps in self.previous_steps.items():
+            if len(step_previous_steps) > 1:
+                self.join_conditions[step_name] = join_conditions.get(step_name, JOIN_ALL)
+
+        for step_name, join_condition in join_conditions.items():
+            if step_name not in self.join_conditions:
+                raise ValueError("Join condition given for step \"{}\", which does not run after multiple steps"
+                                 .format(step_name))
+
+            if join_condition not in JOIN_CONDITIONS:
+                raise ValueError("Unknown join condition \"{}\" for step \"{}\", must be one of: {}"
+                                 .format(join_condition, step_name, JOIN_CONDITIONS))
+
+        self.order = self.__sort__()
+
+    def __sort__(self) -> List[str]:
+        """ Sorts steps so each step is after all the steps it runs after, steps are otherwise kept in the order they
+        were declared
+
+        Raises:
+            - ValueError: If the graph has a cycle
+
+        Returns: Step names
+        """
+        order = []
+        remaining_previous = {step_name: len(previous) for step_name, previous in self.previous_steps.items()}
+        ready = [step_name for step_name in self.next_steps if remaining_previous[step_name] == 0]
+
+        while len(ready) > 0:
+            step_name = ready.pop(0)
+            order.append(step_name)
+
+            for next_step_name in self.next_steps[step_name]:
+                remaining_previous[next_step_name] -= 1
+
+                if remaining_previous[next_step_name] == 0:
+                    ready.append(next_step_name)
+
+        if len(order) != len(self.next_steps):
+            raise ValueError("Step graph has a cycle between steps: {}".format(
+                [step_name for step_name in self.next_steps if step_name not in order]))
+
+        return order
+
+    def first_step(self) -> str:
+        """ Returns: Name of the step which starts a run
+        """
+        return self.order[0]
+
+    def join_condition(self, step_name: str) -> str:
+        """ Returns: Join condition of step, None if the step does not run after multiple steps
+        """
+        return self.join_conditions.get(step_name, None)
+
+
+# Steps of the pipeline. Setting up the test on the development Infobright instance does not need the test volume, so
+# it runs while the volume is created and attached. Tearing down the test runs while the volume is detached
+GRAPH = StepGraph({
+    STEP_CREATE_VOLUME: [STEP_WAIT_VOLUME_CREATED, STEP_SETUP_TEST],
+    STEP_WAIT_VOLUME_CREATED: [STEP_ATTACH_VOLUME],
+    STEP_ATTACH_VOLUME: [STEP_WAIT_VOLUME_ATTACHED],
+    STEP_WAIT_VOLUME_ATTACHED: [STEP_TEST_BACKUP],
+    STEP_SETUP_TEST: [STEP_TEST_BACKUP],
+    STEP_TEST_BACKUP: [STEP_WAIT_TEST_COMPLETED],
+    STEP_WAIT_TEST_COMPLETED: [STEP_WAIT_VOLUME_DETACHED, STEP_TEARDOWN_TEST],
+    STEP_WAIT_VOLUME_DETACHED: [STEP_CLEANUP],
+    STEP_TEARDOWN_TEST: [STEP_CLEANUP]
+}, join_conditions={
+    STEP_TEST_BACKUP: JOIN_ALL,
+    STEP_CLEANUP: JOIN_ALL
+})
+
+# Order steps run in
+PIPELINE = GRAPH.order
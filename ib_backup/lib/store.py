@@ -0,0 +1,303 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List
+
+import lib.aws_clients
+
+# Environment variables which make steps keep data outside of the lambda, see register_env_vars
+RESOURCE_ENV_VARS = []
+
+
+def register_env_vars(*env_vars: str):
+    """ Records environment variables which configure where steps keep data, such as DynamoDB tables or S3 buckets
+    Modules which read these variables register them when imported. Local tools, like the simulator, unset every
+    registered variable so they never write to deployed resources.
+
+    Args:
+        - env_vars: Names of environment variables
+    """
+    for env_var in env_vars:
+        if env_var not in RESOURCE_ENV_VARS:
+            RESOURCE_ENV_VARS.append(env_var)
+
+
+register_env_vars('STATE_TABLE')
+
+
+class Store:
+    """ Key value store used to share state between lambda invocations
+    Values are JSON serializable dicts. Implementations must make `put` with `only_if_absent` and `pop` atomic, so they
+    can be used to decide which of multiple concurrent invocations wins.
+
+    A value can be stored with an index key, so the keys of values with the same index key can be listed with
+    `indexed_keys` without listing every key. A value can also be stored with an expiry time, after which the store may
+    delete it. Only DynamoDBStore deletes expired values, local stores keep them.
+    """
+
+    def get(self, key: str) -> Dict[str, object]:
+        """ Retrieves a value
+        Args:
+            - key: Key of value
+
+        Returns: Value, None if no value is stored for the key
+        """
+        raise NotImplementedError()
+
+    def put(self, key: str, value: Dict[str, object], only_if_absent: bool = False, index_key: str = None,
+            expires_at: float = None) -> bool:
+        """ Stores a value
+        Args:
+            - key: Key of value
+            - value: Value to store
+            - only_if_absent: If True the value is only stored if no value is already stored for the key
+            - index_key: Key the value is indexed under, see `indexed_keys`, None to not index the value
+            - expires_at: Unix time after which the value may be deleted, None to keep the value until it is removed
+
+        Returns: True if the value was stored
+        """
+        raise NotImplementedError()
+
+    def pop(self, key: str) -> Dict[str, object]:
+        """ Removes a value
+        Args:
+            - key: Key of value
+
+        Returns: Value which was removed, None if no value was stored for the key
+        """
+        raise NotImplementedError()
+
+    def keys(self, prefix: str) -> List[str]:
+        """ Lists keys, not atomic with respect to other operations. Reads every key, use `indexed_keys` to list keys
+        regularly
+        Args:
+            - prefix: Only list keys which start with this prefix
+
+        Returns: Keys
+        """
+        raise NotImplementedError()
+
+    def indexed_keys(self, index_key: str) -> List[str]:
+        """ Lists the keys of values stored with an index key, not atomic with respect to other operations
+        Args:
+            - index_key: Index key values were stored with
+
+        Returns: Keys
+        """
+        raise NotImplementedError()
+
+
+class MemoryStore(Store):
+    """ Store which keeps values in memory, used when running locally
+    Fields:
+        - values (Dict[str, str]): Keys to JSON encoded values
+        - index_keys (Dict[str, str]): Keys to the index key their value was stored with
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.index_keys = {}
+        self.__lock__ = threading.Lock()
+
+    def get(self, key: str) -> Dict[str, object]:
+        with self.__lock__:
+            if key not in self.values:
+                return None
+
+            return json.loads(self.values[key])
+
+    def put(self, key: str, value: Dict[str, object], only_if_absent: bool = False, index_key: str = None,
+            expires_at: float = None) -> bool:
+        with self.__lock__:
+            if only_if_absent and key in self.values:
+                return False
+
+            self.values[key] = json.dumps(value)
+            self.index_keys[key] = index_key
+
+            return True
+
+    def pop(self, key: str) -> Dict[str, object]:
+        with self.__lock__:
+            if key not in self.values:
+                return None
+
+            self.index_keys.pop(key, None)
+
+            return json.loads(self.values.pop(key))
+
+    def keys(self, prefix: str) -> List[str]:
+        with self.__lock__:
+            return [key for key in self.values if key.startswith(prefix)]
+
+    def indexed_keys(self, index_key: str) -> List[str]:
+        with self.__lock__:
+            return [key for key in self.values if self.index_keys.get(key, None) == index_key]
+
+
+class SqliteStore(Store):
+    """ Store which keeps values in a sqlite database, used when running locally
+    Fields:
+        - db (sqlite3.Connection): Database connection
+    """
+
+    def __init__(self, db_path: str):
+        """ Creates a SqliteStore
+        Args:
+            - db_path: Path to sqlite database file, ':memory:' to not store the database in a file
+        """
+        self.db = sqlite3.connect(db_path, isolation_level='IMMEDIATE', check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS store (key TEXT PRIMARY KEY, value TEXT NOT NULL, index_key TEXT)")
+
+        # Databases created before values could be indexed
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(store)").fetchall()]
+
+        if 'index_key' not in columns:
+            self.db.execute("ALTER TABLE store ADD COLUMN index_key TEXT")
+
+        self.db.execute("CREATE INDEX IF NOT EXISTS store_index_key ON store (index_key)")
+        self.db.commit()
+
+    def get(self, key: str) -> Dict[str, object]:
+        row = self.db.execute("SELECT value FROM store WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, object], only_if_absent: bool = False, index_key: str = None,
+            expires_at: float = None) -> bool:
+        with self.db:
+            if only_if_absent:
+                cursor = self.db.execute("INSERT OR IGNORE INTO store (key, value, index_key) VALUES (?, ?, ?)",
+                                         (key, json.dumps(value), index_key))
+            else:
+                cursor = self.db.execute("INSERT OR REPLACE INTO store (key, value, index_key) VALUES (?, ?, ?)",
+                                         (key, json.dumps(value), index_key))
+
+            return cursor.rowcount == 1
+
+    def pop(self, key: str) -> Dict[str, object]:
+        with self.db:
+            row = self.db.execute("SELECT value FROM store WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            self.db.execute("DELETE FROM store WHERE key = ?", (key,))
+
+        return json.loads(row[0])
+
+    def keys(self, prefix: str) -> List[str]:
+        rows = self.db.execute("SELECT key FROM store WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+
+        return [row[0] for row in rows]
+
+    def indexed_keys(self, index_key: str) -> List[str]:
+        rows = self.db.execute("SELECT key FROM store WHERE index_key = ?", (index_key,)).fetchall()
+
+        return [row[0] for row in rows]
+
+
+class DynamoDBStore(Store):
+    """ Store which keeps values in an AWS DynamoDB table
+    The table's partition key must be a string attribute named `store_key`. To use `indexed_keys` the table must have a
+    global secondary index named INDEX_NAME, whose partition key is the string attribute `index_key`. Expiry times are
+    written to the `expires_at` number attribute, which the table's time to live should be enabled on.
+
+    Fields:
+        - table_name (str): Name of DynamoDB table
+    """
+    INDEX_NAME = 'index_key'
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+    def get(self, key: str) -> Dict[str, object]:
+        dynamodb = lib.aws_clients.get_client('dynamodb')
+
+        resp = dynamodb.get_item(TableName=self.table_name, Key={'store_key': {'S': key}}, ConsistentRead=True)
+
+        if 'Item' not in resp:
+            return None
+
+        return json.loads(resp['Item']['store_value']['S'])
+
+    def put(self, key: str, value: Dict[str, object], only_if_absent: bool = False, index_key: str = None,
+            expires_at: float = None) -> bool:
+        dynamodb = lib.aws_clients.get_client('dynamodb')
+
+        put_args = {
+            'TableName': self.table_name,
+            'Item': {
+                'store_key': {'S': key},
+                'store_value': {'S': json.dumps(value)}
+            }
+        }
+
+        if index_key is not None:
+            put_args['Item']['index_key'] = {'S': index_key}
+
+        # Time to live requires whole seconds
+        if expires_at is not None:
+            put_args['Item']['expires_at'] = {'N': str(int(expires_at))}
+
+        if only_if_absent:
+            put_args['ConditionExpression'] = 'attribute_not_exists(store_key)'
+
+        try:
+            dynamodb.put_item(**put_args)
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            return False
+
+        return True
+
+    def pop(self, key: str) -> Dict[str, object]:
+        dynamodb = lib.aws_clients.get_client('dynamodb')
+
+        resp = dynamodb.delete_item(TableName=self.table_name, Key={'store_key': {'S': key}}, ReturnValues='ALL_OLD')
+
+        if 'Attributes' not in resp:
+            return None
+
+        return json.loads(resp['Attributes']['store_value']['S'])
+
+    def keys(self, prefix: str) -> List[str]:
+        dynamodb = lib.aws_clients.get_client('dynamodb')
+        paginator = dynamodb.get_paginator('scan')
+
+        keys = []
+
+        for page in paginator.paginate(TableName=self.table_name, ProjectionExpression='store_key',
+                                       FilterExpression='begins_with(store_key, :prefix)',
+                                       ExpressionAttributeValues={':prefix': {'S': prefix}}):
+            keys.extend([item['store_key']['S'] for item in page['Items']])
+
+        return keys
+
+    def indexed_keys(self, index_key: str) -> List[str]:
+        dynamodb = lib.aws_clients.get_client('dynamodb')
+        paginator = dynamodb.get_paginator('query')
+
+        keys = []
+
+        for page in paginator.paginate(TableName=self.table_name, IndexName=self.INDEX_NAME,
+                                       KeyConditionExpression='index_key = :index_key',
+                                       ExpressionAttributeValues={':index_key': {'S': index_key}}):
+            keys.extend([item['store_key']['S'] for item in page['Items']])
+
+        return keys
+
+
+def get_state_store() -> Store:
+    """ Creates the store steps keep state in between pipeline runs, configured by the STATE_TABLE environment variable
+    Returns: Store which keeps values in the DynamoDB table named by STATE_TABLE, None if not set
+    """
+    table_name = os.environ.get('STATE_TABLE', None)
+
+    if not table_name:
+        return None
+
+    return DynamoDBStore(table_name)
@@ -0,0 +1,118 @@
+import uuid
+import threading
+from typing import Dict, List, Tuple
+
+import lib.clock
+
+# Event field which identifies the run an event is part of
+RUN_ID_FIELD = 'run_id'
+
+# Event field which holds the unix time the run started
+RUN_STARTED_AT_FIELD = 'run_started_at'
+
+# Event field which holds the spans of the steps which have completed in the run
+SPANS_FIELD = 'spans'
+
+# Event field which holds the unix time an event was due to be delivered to a step
+DUE_AT_FIELD = 'due_at'
+
+# Maximum number of API calls recorded between drains, calls after this are not recorded
+MAX_RECORDED_API_CALLS = 1000
+
+
+def new_run_id(trigger_id: str = None) -> str:
+    """ Creates the ID of a run of the pipeline
+    Args:
+        - trigger_id: ID of the event which triggered the run, for example the `id` of a CloudWatch scheduled event.
+            Duplicate deliveries of the event get the same run ID, so they can be detected. None for a random ID
+
+    Returns: ID of run
+    """
+    if trigger_id is None:
+        return uuid.uuid4().hex
+
+    return uuid.uuid5(uuid.NAMESPACE_URL, "run/{}".format(trigger_id)).hex
+
+
+def new_span(step_name: str, started_at: float, finished_at: float, invocation_count: int) -> Dict[str, object]:
+    """ Builds a span, which records how long a step took in a run
+    Spans are added to the SPANS_FIELD of the event sent to the next step, so the last step has every step's span.
+
+    Args:
+        - step_name: Name of step
+        - started_at: Unix time of the step's first invocation
+        - finished_at: Unix time the step completed
+        - invocation_count: Number of times the step was invoked
+
+    Returns: Span
+    """
+    return {
+        'step': step_name,
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'invocations': invocation_count
+    }
+
+
+class ApiCallRecorder:
+    """ Records how long calls to external APIs take
+    Use the shared recorder via `record_api_call` so calls made by AWS and Salt API clients are recorded. Job drains the
+    recorder after each invocation.
+
+    Fields:
+        - calls (List[Tuple[str, float]]): Recorded (API name, seconds) tuples, at most MAX_RECORDED_API_CALLS
+    """
+
+    def __init__(self):
+        self.calls = []
+
+        self.__lock__ = threading.Lock()
+
+    def record(self, api_name: str, seconds: float):
+        """ Records an API call
+        Args:
+            - api_name: Name of API operation, prefixed with the name of the service
+            - seconds: Time the call took
+        """
+        with self.__lock__:
+            if len(self.calls) < MAX_RECORDED_API_CALLS:
+                self.calls.append((api_name, seconds))
+
+    def drain(self) -> List[Tuple[str, float]]:
+        """ Removes every recorded call
+        Returns: (API name, seconds) tuples, in the order calls were recorded
+        """
+        with self.__lock__:
+            calls = self.calls
+
+            self.calls = []
+
+        return calls
+
+
+# Shared recorder
+recorder = ApiCallRecorder()
+
+
+def record_api_call(api_name: str, seconds: float):
+    """ Records an API call with the shared recorder, see ApiCallRecorder.record
+    """
+    recorder.record(api_name, seconds)
+
+
+def instrument_aws_client(client):
+    """ Records the duration of every call made by an AWS API client with the shared recorder
+    Args:
+        - client: boto3 client
+    """
+    service_name = client.meta.service_model.service_name
+
+    def before_call(context: Dict[str, object], **kwargs):
+        context['trace_started_at'] = lib.clock.now()
+
+    def after_call(model, context: Dict[str, object], **kwargs):
+        if 'trace_started_at' in context:
+            record_api_call("{}.{}".format(service_name, model.name), lib.clock.now() - context['trace_started_at'])
+
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
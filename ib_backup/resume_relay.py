@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import lib.dispatch
+import lib.run_state
+import lib.log
+
+# Failed runs are resumed at most this many times
+MAX_RESUME_COUNT = 1
+
+# Runs which failed more than this many seconds ago are not resumed, the next scheduled run tests a newer snapshot
+RESUME_MAX_AGE = 36 * 60 * 60
+
+logger = lib.log.get_logger("resume_relay")
+
+
+def main(event, ctx):
+    """ Lambda function handler, resumes runs which failed recently from the step which failed. Run on its own
+    schedule, so resuming does not delay or replace the scheduled start of new runs
+    Args:
+        - event: AWS CloudWatch scheduled event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    run_state_store = lib.run_state.get_run_state_store()
+
+    if run_state_store is None:
+        raise KeyError("Missing environment variables: one of ['RUN_STATE_TABLE', 'RUN_STATE_DB']")
+
+    resumed = run_state_store.resume_failed(lib.dispatch.LambdaDispatcher(), MAX_RESUME_COUNT, RESUME_MAX_AGE)
+
+    logger.info("Resumed failed runs, run_ids={}", [state['run_id'] for state in resumed])
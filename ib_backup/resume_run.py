@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" Lists pipeline runs checkpointed in the run state store, and resumes runs which failed
+
+The run state store is configured by the RUN_STATE_TABLE or RUN_STATE_DB environment variables, see
+lib.run_state.get_run_state_store.
+
+Usage: resume_run.py list
+       resume_run.py show RUN_ID
+       resume_run.py resume [--local] RUN_ID
+"""
+import sys
+import json
+import argparse
+
+import lib.dispatch
+import lib.run_state
+import run_pipeline
+
+
+def main():
+    """ Entrypoint
+    """
+    parser = argparse.ArgumentParser(description="Lists and resumes checkpointed pipeline runs")
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('list', help="List runs, oldest update first")
+
+    show_parser = subparsers.add_parser('show', help="Print the state of a run")
+    show_parser.add_argument('run_id', help="ID of run")
+
+    resume_parser = subparsers.add_parser('resume', help="Invoke the steps of a run which have not completed")
+    resume_parser.add_argument('run_id', help="ID of run")
+    resume_parser.add_argument('--local', action='store_true',
+                               help="Run the remaining steps in this process, instead of invoking AWS Lambda functions")
+
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.print_usage()
+        sys.exit(1)
+
+    run_state_store = lib.run_state.get_run_state_store()
+
+    if run_state_store is None:
+        sys.exit("No run state store configured, set RUN_STATE_TABLE or RUN_STATE_DB")
+
+    if args.command == 'list':
+        for state in run_state_store.runs():
+            print("{} status={} last_step={} failed_step={} resume_count={}".format(
+                state['run_id'], state['status'], state['last_step'], state.get('failed_step', None),
+                state['resume_count']))
+    elif args.command == 'show':
+        state = run_state_store.get(args.run_id)
+
+        if state is None:
+            sys.exit("No state recorded for run \"{}\"".format(args.run_id))
+
+        print(json.dumps(state, indent=4, sort_keys=True))
+    elif args.command == 'resume':
+        if args.local:
+            dispatcher = run_pipeline.new_dispatcher()
+        else:
+            dispatcher = lib.dispatch.LambdaDispatcher()
+
+        try:
+            state = run_state_store.resume(args.run_id, dispatcher)
+        except (KeyError, ValueError) as e:
+            sys.exit(e.args[0])
+
+        print("Resumed run {} at {}, resume_count={}".format(
+            state['run_id'], [invocation['lambda_name'] for invocation in state['pending']], state['resume_count']))
+
+        if args.local:
+            dispatcher.run_pending()
+
+            print("Pipeline completed, invocation_count={}".format(dispatcher.invocation_count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Runs every step of the pipeline in the current Python process, instead of as a chain of AWS Lambda functions
+
+Usage: run_pipeline.py [EVENT_JSON]
+"""
+import sys
+import json
+import importlib
+from typing import Dict
+
+import lib.steps
+import lib.dispatch
+
+
+def new_dispatcher() -> lib.dispatch.InProcessDispatcher:
+    """ Creates an in process dispatcher with every pipeline step registered
+    Step modules are named after their step, see lib.steps.PIPELINE. Steps run in the order declared by
+    lib.steps.GRAPH.
+
+    Returns: Dispatcher
+    """
+    dispatcher = lib.dispatch.InProcessDispatcher()
+
+    for step_name in lib.steps.PIPELINE:
+        step_module = importlib.import_module(step_name)
+
+        dispatcher.register(step_name, step_module.new_job, next_lambda_names=lib.steps.GRAPH.next_steps[step_name])
+
+    return dispatcher
+
+
+def run(event: Dict[str, object] = None) -> lib.dispatch.InProcessDispatcher:
+    """ Runs the pipeline from the first step until the last step completes
+    Args:
+        - event: Event to provide to the first step
+
+    Raises: Any exception raised by a step
+
+    Returns: Dispatcher used to run the pipeline
+    """
+    if event is None:
+        event = {}
+
+    dispatcher = new_dispatcher()
+    dispatcher.run(event, lib.steps.PIPELINE[0])
+
+    return dispatcher
+
+
+def main():
+    """ Entrypoint
+    """
+    event = {}
+    if len(sys.argv) > 1:
+        event = json.loads(sys.argv[1])
+
+    dispatcher = run(event)
+
+    print("Pipeline completed, invocation_count={}".format(dispatcher.invocation_count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+""" Watches the Salt API event stream and invokes the step lambdas waiting for a Salt job to finish
+
+Runs as a long lived process with access to the Salt API, the event bus DynamoDB table, and AWS Lambda. If this process
+is not running, steps fall back to polling the Salt API.
+
+Environment variables:
+    - SALT_API_URL, SALT_API_USER, SALT_API_PASSWORD: Salt API configuration
+    - EVENT_BUS_TABLE: Name of event bus DynamoDB table
+
+Usage: salt_event_relay.py
+"""
+import os
+import time
+
+import lib.dispatch
+import lib.event_bus
+import lib.log
+import lib.salt
+
+import requests
+
+# Seconds to wait for the Salt API to send data before reconnecting
+READ_TIMEOUT = 60
+
+# Seconds to wait before reconnecting after an error
+RECONNECT_DELAY = 5
+
+logger = lib.log.get_logger("salt_event_relay")
+
+
+def relay(stream: lib.salt.EventStream, event_bus: lib.event_bus.EventBus, dispatcher: lib.dispatch.Dispatcher) -> int:
+    """ Publishes a Salt job topic on the event bus every time a minion returns a job's result
+    Args:
+        - stream: Open Salt API event stream
+        - event_bus: Event bus to publish on
+        - dispatcher: Used to invoke subscribed lambdas
+
+    Raises:
+        - requests.exceptions.ConnectionError: If the event stream read times out
+
+    Returns: Number of lambdas invoked, once the stream is closed
+    """
+    invoked_count = 0
+
+    for tag, data in stream.events():
+        job_id = lib.salt.parse_job_return_tag(tag)
+
+        if job_id is None:
+            continue
+
+        detail = {
+            'minion': data.get('id', None),
+            'success': data.get('success', None),
+            'retcode': data.get('retcode', None)
+        }
+
+        if event_bus.publish(lib.event_bus.salt_job_topic(job_id), detail, dispatcher):
+            invoked_count += 1
+
+            logger.debug("Invoked lambda waiting for Salt job, job_id={}, detail={}", job_id, detail)
+
+    return invoked_count
+
+
+def main():
+    """ Entrypoint
+    """
+    # Get configuration
+    missing_env_vars = []
+
+    for env_var in ['SALT_API_URL', 'SALT_API_USER', 'SALT_API_PASSWORD', 'EVENT_BUS_TABLE']:
+        if not os.environ.get(env_var, None):
+            missing_env_vars.append(env_var)
+
+    if len(missing_env_vars) > 0:
+        raise KeyError("Missing environment variables: {}".format(missing_env_vars))
+
+    salt_api = lib.salt.get_client(os.environ['SALT_API_URL'])
+
+    event_bus = lib.event_bus.get_event_bus()
+    dispatcher = lib.dispatch.LambdaDispatcher()
+
+    # Relay events, reconnect when the stream is closed
+    while True:
+        stream = None
+
+        try:
+            # Only logs in if the cached auth token has expired
+            salt_api.authenticate(username=os.environ['SALT_API_USER'], password=os.environ['SALT_API_PASSWORD'])
+
+            stream = salt_api.event_stream()
+            stream.open(read_timeout=READ_TIMEOUT)
+
+            logger.debug("Connected to Salt API event stream")
+
+            relay(stream, event_bus, dispatcher)
+        except requests.exceptions.HTTPError as e:
+            logger.error("Salt API event stream error, reconnecting: {}", e)
+
+            # Auth token may have been revoked before it expired
+            if e.response is not None and e.response.status_code == 401:
+                salt_api.forget_auth_token(salt_api.username)
+
+            time.sleep(RECONNECT_DELAY)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Salt API event stream error, reconnecting: {}", e)
+
+            time.sleep(RECONNECT_DELAY)
+        finally:
+            if stream is not None:
+                stream.close()
+
+
+if __name__ == '__main__':
+    main()
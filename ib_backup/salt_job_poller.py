@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+""" Polls the Salt API for the status of every Salt job steps are waiting for, and invokes the steps whose jobs
+completed
+
+Looks up all waiting jobs with one Salt API request, instead of each waiting step polling the Salt API separately. Runs
+as a long lived process with access to the Salt API, the event bus DynamoDB table, and AWS Lambda. Can be run alongside
+or instead of salt_event_relay.py, for Salt masters whose event stream is not reachable.
+
+Environment variables:
+    - SALT_API_URL, SALT_API_USER, SALT_API_PASSWORD: Salt API configuration
+    - EVENT_BUS_TABLE: Name of event bus DynamoDB table
+
+Usage: salt_job_poller.py
+"""
+import os
+import time
+
+import lib.dispatch
+import lib.event_bus
+import lib.log
+import lib.salt
+
+import requests
+
+# Seconds to wait between polls
+POLL_INTERVAL = 30
+
+logger = lib.log.get_logger("salt_job_poller")
+
+
+def poll(salt_api: lib.salt.SaltClient, event_bus: lib.event_bus.EventBus,
+         dispatcher: lib.dispatch.Dispatcher) -> int:
+    """ Invokes the lambdas waiting for Salt jobs which have completed
+    Args:
+        - salt_api: Authenticated Salt API client
+        - event_bus: Event bus with Salt job topic subscriptions
+        - dispatcher: Used to invoke subscribed lambdas
+
+    Raises:
+        - ValueError: If the Salt API response is invalid
+
+    Returns: Number of lambdas invoked
+    """
+    job_ids = []
+
+    for topic in event_bus.topics(lib.event_bus.SALT_JOB_TOPIC_PREFIX):
+        job_ids.append(lib.event_bus.parse_salt_job_topic(topic))
+
+    if len(job_ids) == 0:
+        return 0
+
+    invoked_count = 0
+
+    for job_id, status in salt_api.get_jobs(job_ids).items():
+        if status.state == lib.salt.JOB_RUNNING:
+            continue
+
+        # Leave the subscription, the waiting lambda still polls the job itself
+        if status.state == lib.salt.JOB_ERROR:
+            logger.warning("Failed to look up Salt job, job_id={}, error={}", job_id, status.error)
+            continue
+
+        detail = {
+            'state': status.state,
+            'failed_count': status.digest.failed_count
+        }
+
+        if event_bus.publish(lib.event_bus.salt_job_topic(job_id), detail, dispatcher):
+            invoked_count += 1
+
+            logger.debug("Invoked lambda waiting for Salt job, job_id={}, status={}", job_id, status)
+
+    logger.debug("Polled Salt jobs, job_count={}, invoked_count={}", len(job_ids), invoked_count)
+
+    return invoked_count
+
+
+def main():
+    """ Entrypoint
+    """
+    # Get configuration
+    missing_env_vars = []
+
+    for env_var in ['SALT_API_URL', 'SALT_API_USER', 'SALT_API_PASSWORD', 'EVENT_BUS_TABLE']:
+        if not os.environ.get(env_var, None):
+            missing_env_vars.append(env_var)
+
+    if len(missing_env_vars) > 0:
+        raise KeyError("Missing environment variables: {}".format(missing_env_vars))
+
+    salt_api = lib.salt.get_client(os.environ['SALT_API_URL'])
+
+    event_bus = lib.event_bus.get_event_bus()
+    dispatcher = lib.dispatch.LambdaDispatcher()
+
+    while True:
+        try:
+            # Only logs in if the cached auth token has expired
+            salt_api.authenticate(username=os.environ['SALT_API_USER'], password=os.environ['SALT_API_PASSWORD'])
+
+            poll(salt_api, event_bus, dispatcher)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Failed to poll Salt jobs: {}", e)
+
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,9 +4,9 @@ from typing import Dict
 
 import lib.steps
 import lib.job
-import lib.aws_ec2
+import lib.envelope
+import lib.aws_clients
 
-import boto3
 
 # Constants
 DEV_IB_BACKUP_ATTACH_DEV_NAME = '/dev/sdg'
@@ -15,22 +15,20 @@ DEV_IB_BACKUP_ATTACH_DEV_NAME = '/dev/sdg'
 class AttachVolumeJob(lib.job.Job):
     """ Performs the attach volume step
     """
+    event_schema = lib.envelope.EventSchema({
+        'dev_ib_backup_instance_id': str,
+        'volume_id': str
+    })
 
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get dev ib backup instance id
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
-
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
         # AWS EC2 client
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Attach volume
         ec2.attach_volume(
@@ -52,11 +50,21 @@ class AttachVolumeJob(lib.job.Job):
         return lib.job.NextAction.NEXT
 
 
+def new_job(**kwargs) -> AttachVolumeJob:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments
+
+    Returns: Step Job
+    """
+    return AttachVolumeJob(lambda_name=lib.steps.STEP_ATTACH_VOLUME, **kwargs)
+
+
 def main(event, ctx) -> int:
     """ Entrypoint
     Args:
         - event: AWS event which triggered lambda
         - ctx: Additional information provided when lambda was invoked
     """
-    step_job = AttachVolumeJob(lambda_name=lib.steps.STEP_ATTACH_VOLUME)
+    step_job = new_job()
     step_job.run(event, ctx)
@@ -1,41 +1,50 @@
 from typing import Dict
 
 import lib.job
+import lib.envelope
 import lib.steps
-
-import boto3
+import lib.aws_clients
 
 
 class CleanupJob(lib.job.Job):
     """ Performs the cleanup step
     """
+    event_schema = lib.envelope.EventSchema({
+        'volume_id': str,
+        'dev_ib_backup_instance_id': str
+    })
+
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
         # Get instance id from event
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
-
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # AWS clients
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Delete test volume
         ec2.delete_volume(VolumeId=volume_id)
 
-        self.logger.debug("Deleted test volume, volume_id={}".format(volume_id))
+        self.logger.debug("Deleted test volume, volume_id={}", volume_id)
 
         # TODO: Stop ib backup instance
-        self.logger.debug("TODO: Stop dev_ib_backup_instance_id={}".format(dev_ib_backup_instance_id))
+        self.logger.debug("TODO: Stop dev_ib_backup_instance_id={}", dev_ib_backup_instance_id)
 
         return lib.job.NextAction.TERMINATE
 
 
+def new_job(**kwargs) -> CleanupJob:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments
+
+    Returns: Step Job
+    """
+    return CleanupJob(lambda_name=lib.steps.STEP_CLEANUP, **kwargs)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -44,5 +53,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = CleanupJob(lambda_name=lib.steps.STEP_CLEANUP)
+    step_job = new_job()
     step_job.run(event, ctx)
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
+import os
 from typing import Dict
 
 import lib.steps
 import lib.job
 import lib.aws_ec2
+import lib.snapshot_index
+import lib.store
+import lib.aws_clients
 
-import boto3
 
 # Constants
 DEV_IB_BACKUP_NAME = 'ib02.dev.code418.net'
@@ -16,27 +19,43 @@ PROD_IB_BACKUP_DATA_VOLUME_NAME = '/dev/sdg'
 
 class CreateVolumeJob(lib.job.Job):
     """ Performs the create volume step
+    Fields:
+        - snapshot_store (lib.store.Store): Stores the newest snapshot found, None to not store it
+        - skip_tested_snapshots (bool): If True snapshots which have already been tested are ignored
     """
 
+    def __init__(self, snapshot_store: lib.store.Store = None, skip_tested_snapshots: bool = False, **kwargs):
+        """ Creates a CreateVolumeJob
+        Args:
+            - snapshot_store, skip_tested_snapshots: See class fields
+            - kwargs: lib.job.Job constructor arguments
+        """
+        super().__init__(**kwargs)
+
+        self.snapshot_store = snapshot_store
+        self.skip_tested_snapshots = skip_tested_snapshots
+
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # AWS clients
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
-        # Find dev backup infobright instance
-        dev_ib_backup_instance = lib.aws_ec2.find_instance_by_name(ec2, DEV_IB_BACKUP_NAME)
+        # Find dev and production backup Infobright instances
+        instance_resolver = lib.aws_ec2.get_instance_resolver()
+        instances = instance_resolver.resolve(ec2, [DEV_IB_BACKUP_NAME, PROD_IB_BACKUP_NAME])
+
+        dev_ib_backup_instance = instances[DEV_IB_BACKUP_NAME]
         dev_ib_backup_instance_id = dev_ib_backup_instance['InstanceId']
 
-        self.logger.debug("Found dev Infobright backup instance, dev_ib_backup_instance_id={}"
-                          .format(dev_ib_backup_instance_id))
+        self.logger.debug("Found dev Infobright backup instance, dev_ib_backup_instance_id={}",
+                          dev_ib_backup_instance_id)
 
         # Get availability zone of dev ib backup instance
         volume_az = dev_ib_backup_instance['Placement']['AvailabilityZone']
 
-        # Find production Infobright backup instance
-        prod_ib_backup_instance = lib.aws_ec2.find_instance_by_name(ec2, PROD_IB_BACKUP_NAME)
+        prod_ib_backup_instance = instances[PROD_IB_BACKUP_NAME]
 
-        self.logger.debug("Found production backup Infobright instance, prod_ib_backup_instance_id={}"
-                          .format(prod_ib_backup_instance['InstanceId']))
+        self.logger.debug("Found production backup Infobright instance, prod_ib_backup_instance_id={}",
+                          prod_ib_backup_instance['InstanceId'])
 
         # Get id of Infobright data volume
         prod_ib_backup_instance_device_mappings = prod_ib_backup_instance['BlockDeviceMappings']
@@ -48,40 +67,36 @@ class CreateVolumeJob(lib.job.Job):
                 prod_ib_backup_data_volume_id = dev_mapping['Ebs']['VolumeId']
 
         if prod_ib_backup_data_volume_id is None:
+            # Cached instance may have been replaced
+            instance_resolver.invalidate([PROD_IB_BACKUP_NAME])
+
             raise ValueError("Could not find data volume \"{}\" attached to production Infobright backup instance"
                              .format(PROD_IB_BACKUP_DATA_VOLUME_NAME))
 
-        self.logger.debug("Found production backup Infobright instance data volume, prod_ib_backup_data_volume_id={}"
-                          .format(prod_ib_backup_data_volume_id))
+        self.logger.debug("Found production backup Infobright instance data volume, prod_ib_backup_data_volume_id={}",
+                          prod_ib_backup_data_volume_id)
 
         # Get latest snapshot for volume
-        snapshot_pager = ec2.get_paginator('describe_snapshots')
-        snapshot_resps = snapshot_pager.paginate(Filters=[{
-            'Name': 'volume-id',
-            'Values': [prod_ib_backup_data_volume_id]
-        }])
+        snapshot_index = lib.snapshot_index.SnapshotIndex(ec2, store=self.snapshot_store,
+                                                          skip_tested=self.skip_tested_snapshots)
+        newest_snapshot = snapshot_index.newest_snapshot(prod_ib_backup_data_volume_id)
 
-        newest_date = None
-        newest_snapshot = None
+        if newest_snapshot is None and self.skip_tested_snapshots:
+            self.logger.info("No untested snapshot since the last snapshot found, not testing, volume_id={}",
+                             prod_ib_backup_data_volume_id)
 
-        for snapshot_resp in snapshot_resps:
-            snapshots = snapshot_resp['Snapshots']
-
-            for snapshot in snapshots:
-                start_date = snapshot['StartTime']
-
-                if newest_date is None or start_date > newest_date:
-                    newest_date = start_date
-                    newest_snapshot = snapshot
+            return lib.job.NextAction.TERMINATE
 
         if newest_snapshot is None:
+            # Cached instance may have been replaced, along with its data volume
+            instance_resolver.invalidate([PROD_IB_BACKUP_NAME])
+
             raise ValueError("No snapshot for volume \"{}\" found".format(prod_ib_backup_data_volume_id))
 
         snapshot_size = newest_snapshot['VolumeSize']
         snapshot_id = newest_snapshot['SnapshotId']
 
-        self.logger.debug("Found latest production backup Infobright data volume snapshot, snapshot_id={}"
-                          .format(snapshot_id))
+        self.logger.debug("Found latest production backup Infobright data volume snapshot, snapshot_id={}", snapshot_id)
 
         # Create test volume from snapshot
         test_volume_name = "test-ib-snapshot-{}".format(snapshot_id)
@@ -102,17 +117,37 @@ class CreateVolumeJob(lib.job.Job):
         created_volume_id = create_volume_resp['VolumeId']
 
         self.logger.debug("Created test volume from production backup Infobright volume snapshot, " +
-                          "volume_id={}".format(created_volume_id))
+                          "volume_id={}", created_volume_id)
 
         # Invoke next lambda
         self.next_lambda_event = {
             'dev_ib_backup_instance_id': dev_ib_backup_instance_id,
-            'volume_id': created_volume_id
+            'volume_id': created_volume_id,
+            'volume_size': snapshot_size
         }
 
         return lib.job.NextAction.NEXT
 
 
+def new_job(**kwargs) -> CreateVolumeJob:
+    """ Creates the step's Job
+    The newest snapshot found is stored in the store configured by STATE_TABLE. Set the SKIP_TESTED_SNAPSHOTS
+    environment variable to "true" to ignore snapshots which have already been tested.
+
+    Args:
+        - kwargs: Additional CreateVolumeJob constructor arguments, override the step's defaults
+
+    Returns: Step Job
+    """
+    job_args = {
+        'snapshot_store': lib.store.get_state_store(),
+        'skip_tested_snapshots': os.environ.get('SKIP_TESTED_SNAPSHOTS', 'false').lower() == 'true'
+    }
+    job_args.update(kwargs)
+
+    return CreateVolumeJob(lambda_name=lib.steps.STEP_CREATE_VOLUME, **job_args)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -121,5 +156,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = CreateVolumeJob(lambda_name=lib.steps.STEP_CREATE_VOLUME)
+    step_job = new_job()
     step_job.run(event, ctx)
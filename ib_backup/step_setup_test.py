@@ -0,0 +1,26 @@
+import lib.steps
+import lib.salt_state
+
+
+class SetupTestJob(lib.salt_state.SaltStateJob):
+    """ Performs the setup test step
+    """
+    step_name = lib.steps.STEP_SETUP_TEST
+    state_name = 'infobright-backup-check.setup-ib-restore-test'
+    salt_job_id_field = 'setup_salt_job_id'
+
+
+# Creates the step's Job, see lib.salt_state.SaltStateJob.new_job
+new_job = SetupTestJob.new_job
+
+
+def main(event, ctx):
+    """ Lambda function handler
+    Args:
+        - event: AWS event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    step_job = new_job()
+    step_job.run(event, ctx)
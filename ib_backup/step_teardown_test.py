@@ -0,0 +1,26 @@
+import lib.steps
+import lib.salt_state
+
+
+class TeardownTestJob(lib.salt_state.SaltStateJob):
+    """ Performs the teardown test step
+    """
+    step_name = lib.steps.STEP_TEARDOWN_TEST
+    state_name = 'infobright-backup-check.teardown-ib-restore-test'
+    salt_job_id_field = 'teardown_salt_job_id'
+
+
+# Creates the step's Job, see lib.salt_state.SaltStateJob.new_job
+new_job = TeardownTestJob.new_job
+
+
+def main(event, ctx):
+    """ Lambda function handler
+    Args:
+        - event: AWS event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    step_job = new_job()
+    step_job.run(event, ctx)
@@ -2,6 +2,7 @@ import os
 from typing import Dict
 
 import lib.job
+import lib.envelope
 import lib.steps
 import lib.salt
 
@@ -9,6 +10,11 @@ import lib.salt
 class TestBackupJob(lib.job.Job):
     """ Performs the test backup step
     """
+    event_schema = lib.envelope.EventSchema({
+        'volume_id': str,
+        'dev_ib_backup_instance_id': str,
+        'mount_point': str
+    })
 
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get Salt API configuration
@@ -30,45 +36,28 @@ class TestBackupJob(lib.job.Job):
             raise KeyError("Missing environment variables: {}".format(missing_env_vars))
 
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
         # Get instance id from event
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
-
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # Get mount point from event
-        if 'mount_point' not in event:
-            raise KeyError("\"mount_point\" expected to be in event")
-
         mount_point = event['mount_point']
 
         # Authenticate with Salt API
-        salt_api_token = lib.salt.get_auth_token(host=salt_api_url, username=salt_api_user, password=salt_api_password)
+        salt_api = lib.salt.get_client(salt_api_url)
+        salt_api.authenticate(username=salt_api_user, password=salt_api_password)
 
         self.logger.debug("Authenticated with Salt API")
 
-        # Setup ib02.dev for snapshot test
+        # Test snapshot integrity, the development instance was setup by the setup test step
         ib_backup_salt_target = "ec2:instance_id:{}".format(dev_ib_backup_instance_id)
 
-        setup_result = lib.salt.exec(host=salt_api_url, auth_token=salt_api_token, minion=ib_backup_salt_target,
-                                     cmd='state.apply', args=['infobright-backup-check.setup-ib-restore-test'],
-                                     tgt_type='grain')
-
-        lib.salt.check_job_result(setup_result)
-
-        self.logger.debug("Setup Infobright development instance for test, result={}".format(setup_result))
-
-        # Test snapshot integrity
-        test_result = lib.salt.exec(host=salt_api_url, auth_token=salt_api_token, minion=ib_backup_salt_target,
+        test_result = salt_api.exec(minion=ib_backup_salt_target,
                                     cmd='state.apply', args=['infobright-backup-check.test-restored-backup'],
                                     salt_client='local_async', tgt_type='grain')
 
-        self.logger.debug("Test result={}".format(test_result))
+        self.logger.debug("Test result={}", test_result)
 
         if len(test_result) != 1:
             raise ValueError("Test backup command Salt invocation response did not contain exactly 1 result")
@@ -85,6 +74,16 @@ class TestBackupJob(lib.job.Job):
         return lib.job.NextAction.NEXT
 
 
+def new_job(**kwargs) -> TestBackupJob:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments
+
+    Returns: Step Job
+    """
+    return TestBackupJob(lambda_name=lib.steps.STEP_TEST_BACKUP, **kwargs)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -93,5 +92,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = TestBackupJob(lambda_name=lib.steps.STEP_TEST_BACKUP)
+    step_job = new_job()
     step_job.run(event, ctx)
@@ -1,19 +1,30 @@
 import os
 from typing import Dict
-import time
 
 import lib.job
+import lib.envelope
+import lib.clock
 import lib.steps
 import lib.salt
+import lib.polling
+import lib.event_bus
+import lib.snapshot_index
+import lib.aws_clients
 
-import boto3
 
-BACKUP_TEST_STATUS_TAG_NAME = 'DBBackupValid'
+BACKUP_TEST_STATUS_TAG_NAME = lib.snapshot_index.BACKUP_TEST_STATUS_TAG_NAME
 
 
 class WaitTestCompletedJob(lib.job.Job):
     """ Performs the wait test completed step
     """
+    event_schema = lib.envelope.EventSchema({
+        'volume_id': str,
+        'dev_ib_backup_instance_id': str,
+        'mount_point': str,
+        'test_cmd_salt_job_id': str
+    })
+
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get Salt API configuration
         missing_env_vars = []
@@ -34,56 +45,52 @@ class WaitTestCompletedJob(lib.job.Job):
             raise KeyError("Missing environment variables: {}".format(missing_env_vars))
 
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
         # Get instance id from event
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
-
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # Get mount point from event
-        if 'mount_point' not in event:
-            raise KeyError("\"mount_point\" expected to be in event")
-
         mount_point = event['mount_point']
 
         # Get test cmd salt job id from event
-        if 'test_cmd_salt_job_id' not in event:
-            raise KeyError("event must contain \"test_cmd_salt_job_id\" field")
-
         test_cmd_salt_job_id = event['test_cmd_salt_job_id']
 
+        # Wait for Salt job return event if event bus is configured
+        self.wait_topic = lib.event_bus.salt_job_topic(test_cmd_salt_job_id)
+
         # AWS clients
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Authenticate with Salt API
-        salt_api_token = lib.salt.get_auth_token(host=salt_api_url, username=salt_api_user, password=salt_api_password)
+        salt_api = lib.salt.get_client(salt_api_url)
+        salt_api.authenticate(username=salt_api_user, password=salt_api_password)
 
         self.logger.debug("Authenticated with Salt API")
 
         # Get status of test backup Salt job
-        job_status_resp = lib.salt.get_job(host=salt_api_url, auth_token=salt_api_token, job_id=test_cmd_salt_job_id)
-
-        self.logger.debug("test cmd job status resp={}".format(job_status_resp))
+        job_status_resp = salt_api.get_job(job_id=test_cmd_salt_job_id)
 
         # Check status of test backup Salt job
         backup_tested_successfully = True
 
         try:
-            lib.salt.check_job_result(job_status_resp)
+            job_digest = lib.salt.check_job_result(job_status_resp)
         except lib.salt.NoMinionResultsException as e:
             self.logger.debug("No results for test backup Salt job yet, still running")
 
             return lib.job.NextAction.REPEAT
         except lib.salt.JobFailedException as e:
-            self.logger.error("Failed to verify integrity of database backup: {}".format(e))
+            self.logger.error("Failed to verify integrity of database backup: {}", e)
 
+            job_digest = e.digest
             backup_tested_successfully = False
 
+        # Only keep the digest of the job result, the test's output can be large
+        del job_status_resp
+
+        self.logger.debug("test cmd job result={}", job_digest)
+
         # Label backup snapshot based on results of test
         backup_test_status_tag_value = 'True'
         if not backup_tested_successfully:
@@ -98,8 +105,8 @@ class WaitTestCompletedJob(lib.job.Job):
 
         snapshot_id = volume['SnapshotId']
 
-        self.logger.debug("Adding db backup test command result tag to \"{}={}\" to snapshot_id={}"
-                          .format(BACKUP_TEST_STATUS_TAG_NAME, backup_test_status_tag_value, snapshot_id))
+        self.logger.debug("Adding db backup test command result tag to \"{}={}\" to snapshot_id={}",
+                          BACKUP_TEST_STATUS_TAG_NAME, backup_test_status_tag_value, snapshot_id)
 
         ec2.create_tags(Resources=[snapshot_id], Tags=[{
             'Key': BACKUP_TEST_STATUS_TAG_NAME,
@@ -107,33 +114,21 @@ class WaitTestCompletedJob(lib.job.Job):
         }])
 
         # Publish datadog statistic
-        unix_time = int(time.time())
+        unix_time = int(lib.clock.now())
         datadog_metric_value = 1
-        if not backup_test_status_tag_value:
+        if not backup_tested_successfully:
             datadog_metric_value = 0
 
-        self.logger.info("MONITORING|{}|{}|gauge|infobright_backup_valid|#snapshot_id:{}"
-                         .format(unix_time, datadog_metric_value, snapshot_id))
+        self.logger.info("MONITORING|{}|{}|gauge|infobright_backup_valid|#snapshot_id:{},{}",
+                         unix_time, datadog_metric_value, snapshot_id, job_digest.monitoring_tags())
 
-        # Detach volume
+        # Detach volume, the teardown test step tears down ib02.dev while the volume detaches
         ec2.detach_volume(Device=mount_point, InstanceId=dev_ib_backup_instance_id, VolumeId=volume_id)
 
-        self.logger.debug("Detached volume from dev Infobright instance, volume_id={}, dev_ib_backup_instance_id={}"
-                          .format(volume_id, dev_ib_backup_instance_id))
+        self.logger.debug("Detached volume from dev Infobright instance, volume_id={}, dev_ib_backup_instance_id={}",
+                          volume_id, dev_ib_backup_instance_id)
 
-        # Tear down ib02.dev for snapshot test
-        ib_backup_salt_target = "ec2:instance_id:{}".format(dev_ib_backup_instance_id)
-
-        teardown_result = lib.salt.exec(host=salt_api_url, auth_token=salt_api_token, minion=ib_backup_salt_target,
-                                        cmd='state.apply',
-                                        args=['infobright-backup-check.teardown-ib-restore-test'],
-                                        tgt_type='grain')
-
-        lib.salt.check_job_result(teardown_result)
-
-        self.logger.debug("Teared down Infobright development instance for test, result={}".format(teardown_result))
-
-        # Invoke next lambda
+        # Invoke next lambdas
         self.next_lambda_event = {
             'volume_id': volume_id,
             'dev_ib_backup_instance_id': dev_ib_backup_instance_id
@@ -141,6 +136,22 @@ class WaitTestCompletedJob(lib.job.Job):
         return lib.job.NextAction.NEXT
 
 
+def new_job(**kwargs) -> WaitTestCompletedJob:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments, override the step's defaults
+
+    Returns: Step Job
+    """
+    job_args = {
+        'polling_policy': lib.polling.BackoffPolicy(initial_delay=30, max_delay=300, deadline=60 * 60, factor=1.5),
+        'event_polling_policy': lib.polling.BackoffPolicy(initial_delay=120, max_delay=600, deadline=60 * 60)
+    }
+    job_args.update(kwargs)
+
+    return WaitTestCompletedJob(lambda_name=lib.steps.STEP_WAIT_TEST_COMPLETED, **job_args)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -149,6 +160,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = WaitTestCompletedJob(lambda_name=lib.steps.STEP_WAIT_TEST_COMPLETED, max_iteration_count=60,
-                                    repeat_delay=60)
+    step_job = new_job()
     step_job.run(event, ctx)
@@ -3,35 +3,36 @@ from typing import Dict
 
 import lib.steps
 import lib.job
-
-import boto3
+import lib.envelope
+import lib.polling
+import lib.event_bus
+import lib.aws_clients
 
 
 class WaitVolumeAttachedStep(lib.job.Job):
     """ Performs the wait volume attached step
     """
+    event_schema = lib.envelope.EventSchema({
+        'volume_id': str,
+        'dev_ib_backup_instance_id': str,
+        'mount_point': str
+    })
 
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
-        # Get dev ib backup instance id
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
+        # Wait for EBS volume notification if event bus is configured
+        self.wait_topic = lib.event_bus.volume_topic(volume_id, lib.event_bus.VOLUME_EVENT_ATTACH)
 
+        # Get dev ib backup instance id
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # Get mount point from event
-        if 'mount_point' not in event:
-            raise KeyError("\"mount_point\" expected to be in event")
-
         mount_point = event['mount_point']
 
         # AWS client
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Get volume
         volumes_resp = ec2.describe_volumes(VolumeIds=[volume_id])
@@ -82,6 +83,24 @@ class WaitVolumeAttachedStep(lib.job.Job):
             return lib.job.NextAction.REPEAT
 
 
+def new_job(**kwargs) -> WaitVolumeAttachedStep:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments, override the step's defaults
+
+    Returns: Step Job
+    """
+    job_args = {
+        'polling_policy': lib.polling.BackoffPolicy(first_probe_delay=2, initial_delay=5, max_delay=30,
+                                                    deadline=5 * 60),
+        'wait_interval': 2,
+        'event_polling_policy': lib.polling.BackoffPolicy(initial_delay=30, max_delay=120, deadline=5 * 60)
+    }
+    job_args.update(kwargs)
+
+    return WaitVolumeAttachedStep(lambda_name=lib.steps.STEP_WAIT_VOLUME_ATTACHED, **job_args)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -90,5 +109,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = WaitVolumeAttachedStep(lambda_name=lib.steps.STEP_WAIT_VOLUME_ATTACHED)
+    step_job = new_job()
     step_job.run(event, ctx)
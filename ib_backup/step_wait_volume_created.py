@@ -3,30 +3,48 @@
 from typing import Dict
 
 import lib.steps
+import lib.clock
 import lib.job
-
-import boto3
+import lib.envelope
+import lib.polling
+import lib.event_bus
+import lib.aws_clients
+import lib.store
 
 
 class WaitVolumeCreatedJob(lib.job.Job):
     """ Performs the wait volume created step
+    Fields:
+        - volume_size_estimator (lib.polling.VolumeSizeEstimator): Records how long the volume took to create, None to
+            not record it
     """
+    event_schema = lib.envelope.EventSchema({
+        'dev_ib_backup_instance_id': str,
+        'volume_id': str
+    })
+
+    def __init__(self, volume_size_estimator: lib.polling.VolumeSizeEstimator = None, **kwargs):
+        """ Creates a WaitVolumeCreatedJob
+        Args:
+            - volume_size_estimator: See class fields
+            - kwargs: lib.job.Job constructor arguments
+        """
+        super().__init__(**kwargs)
+
+        self.volume_size_estimator = volume_size_estimator
 
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get dev ib backup instance id
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
-
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
+        # Wait for EBS volume notification if event bus is configured
+        self.wait_topic = lib.event_bus.volume_topic(volume_id, lib.event_bus.VOLUME_EVENT_CREATE)
+
         # AWS clients
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Get status of volume
         vol_resp = ec2.describe_volumes(VolumeIds=[volume_id])
@@ -41,6 +59,15 @@ class WaitVolumeCreatedJob(lib.job.Job):
         if volume['State'] == 'available':
             self.logger.debug("volume is created")
 
+            # Record how long volume took to create, lib.polling.VolumeSizeEstimator is fit to this history
+            unix_time = int(lib.clock.now())
+
+            self.logger.info("MONITORING|{}|{}|gauge|volume_create_seconds|#volume_size:{}",
+                             unix_time, unix_time - int(self.wait_started_at), volume['Size'])
+
+            if self.volume_size_estimator is not None:
+                self.volume_size_estimator.record(volume['Size'], lib.clock.now() - self.wait_started_at)
+
             # Invoke next lambda
             self.next_lambda_event = {
                 'dev_ib_backup_instance_id': dev_ib_backup_instance_id,
@@ -54,6 +81,27 @@ class WaitVolumeCreatedJob(lib.job.Job):
             return lib.job.NextAction.REPEAT
 
 
+def new_job(**kwargs) -> WaitVolumeCreatedJob:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments, override the step's defaults
+
+    Returns: Step Job
+    """
+    volume_size_estimator = lib.polling.VolumeSizeEstimator(store=lib.store.get_state_store())
+
+    job_args = {
+        'volume_size_estimator': volume_size_estimator,
+        'polling_policy': lib.polling.BackoffPolicy(first_probe_delay=5, initial_delay=15, max_delay=120,
+                                                    deadline=60 * 60, initial_delay_estimator=volume_size_estimator),
+        'wait_interval': 5,
+        'event_polling_policy': lib.polling.BackoffPolicy(initial_delay=60, max_delay=300, deadline=60 * 60)
+    }
+    job_args.update(kwargs)
+
+    return WaitVolumeCreatedJob(lambda_name=lib.steps.STEP_WAIT_VOLUME_CREATED, **job_args)
+
+
 def main(event, ctx):
     """ Entrypoint
     Args:
@@ -62,5 +110,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = WaitVolumeCreatedJob(lambda_name=lib.steps.STEP_WAIT_VOLUME_CREATED)
+    step_job = new_job()
     step_job.run(event, ctx)
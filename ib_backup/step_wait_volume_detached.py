@@ -3,29 +3,32 @@ from typing import Dict
 
 import lib.steps
 import lib.job
-
-import boto3
+import lib.envelope
+import lib.polling
+import lib.event_bus
+import lib.aws_clients
 
 
 class WaitVolumeDetachedStep(lib.job.Job):
     """ Performs the wait volume detached step
     """
+    event_schema = lib.envelope.EventSchema({
+        'volume_id': str,
+        'dev_ib_backup_instance_id': str
+    })
 
     def handle(self, event: Dict[str, object], ctx) -> lib.job.NextAction:
         # Get volume id from event
-        if 'volume_id' not in event:
-            raise KeyError("event must contain \"volume_id\" field")
-
         volume_id = event['volume_id']
 
-        # Get dev ib backup instance id
-        if 'dev_ib_backup_instance_id' not in event:
-            raise KeyError("event must contain \"dev_ib_backup_instance_id\" field")
+        # Wait for EBS volume notification if event bus is configured
+        self.wait_topic = lib.event_bus.volume_topic(volume_id, lib.event_bus.VOLUME_EVENT_DETACH)
 
+        # Get dev ib backup instance id
         dev_ib_backup_instance_id = event['dev_ib_backup_instance_id']
 
         # AWS client
-        ec2 = boto3.client('ec2')
+        ec2 = lib.aws_clients.get_client('ec2')
 
         # Get volume
         volumes_resp = ec2.describe_volumes(VolumeIds=[volume_id])
@@ -50,7 +53,9 @@ class WaitVolumeDetachedStep(lib.job.Job):
 
         # If no attachments, successfully detached
         if len(attachments) == 0:
-            return lib.job.NextAction.REPEAT
+            self.logger.debug("volume has no attachments, detached")
+
+            return lib.job.NextAction.NEXT
 
         # If attachments, get status of attachment b/c it could be detached
         instance_attachment = None
@@ -77,6 +82,24 @@ class WaitVolumeDetachedStep(lib.job.Job):
             return lib.job.NextAction.REPEAT
 
 
+def new_job(**kwargs) -> WaitVolumeDetachedStep:
+    """ Creates the step's Job
+    Args:
+        - kwargs: Additional lib.job.Job constructor arguments, override the step's defaults
+
+    Returns: Step Job
+    """
+    job_args = {
+        'polling_policy': lib.polling.BackoffPolicy(first_probe_delay=2, initial_delay=5, max_delay=60,
+                                                    deadline=10 * 60),
+        'wait_interval': 2,
+        'event_polling_policy': lib.polling.BackoffPolicy(initial_delay=30, max_delay=120, deadline=10 * 60)
+    }
+    job_args.update(kwargs)
+
+    return WaitVolumeDetachedStep(lambda_name=lib.steps.STEP_WAIT_VOLUME_DETACHED, **job_args)
+
+
 def main(event, ctx):
     """ Lambda function handler
     Args:
@@ -85,6 +108,5 @@ def main(event, ctx):
 
     Raises: Any exception
     """
-    step_job = WaitVolumeDetachedStep(lambda_name=lib.steps.STEP_WAIT_VOLUME_DETACHED, repeat_delay=60,
-                                      max_iteration_count=10)
+    step_job = new_job()
     step_job.run(event, ctx)
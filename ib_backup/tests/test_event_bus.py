@@ -0,0 +1,95 @@
+import logging
+import unittest
+
+import lib.job
+import lib.store
+import lib.dispatch
+import lib.event_bus
+import lib.delay_queue
+
+# Topic the test step waits for
+TOPIC = 'volume/vol-1/createVolume'
+
+
+class RecordingDispatcher(lib.dispatch.Dispatcher):
+    """ Records dispatched events instead of invoking lambdas
+    """
+
+    def __init__(self):
+        self.dispatched = []
+
+    def dispatch(self, event, lambda_name):
+        self.dispatched.append((lambda_name, event))
+
+
+class WaitJob(lib.job.Job):
+    """ Step which waits for TOPIC until `ready` is set
+    """
+    ready = False
+
+    def handle(self, event, ctx) -> lib.job.NextAction:
+        self.wait_topic = TOPIC
+
+        if not WaitJob.ready:
+            return lib.job.NextAction.REPEAT
+
+        self.next_lambda_event = {'volume_id': 'vol-1'}
+        return lib.job.NextAction.NEXT
+
+
+class PollingReplacedTest(unittest.TestCase):
+    """ Stops the polling chain of a waiting step once the event bus has invoked the step
+    """
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.dispatcher = RecordingDispatcher()
+        self.delay_queue = lib.delay_queue.MemoryDelayQueue()
+        self.event_bus = lib.event_bus.EventBus(lib.store.MemoryStore())
+        self.ctx = lib.dispatch.InProcessContext('wait')
+
+        WaitJob.ready = False
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def run_job(self, event: dict):
+        WaitJob('wait', next_lambda_name='next', dispatcher=self.dispatcher, delay_queue=self.delay_queue,
+                event_bus=self.event_bus).run(event, self.ctx)
+
+    def test_polling_stops_once_event_bus_invoked_step(self):
+        self.run_job({})
+        polled = self.delay_queue.pop_due(float('inf'))
+
+        # Event bus invokes the step before it is ready, so it subscribes and schedules itself again
+        self.assertTrue(self.event_bus.publish(TOPIC, {'result': 'available'}, self.dispatcher))
+        self.run_job(self.dispatcher.dispatched.pop()[1])
+
+        # Invocation scheduled by the first poll does not schedule another
+        self.run_job(polled[0][1])
+
+        self.assertEqual(len(self.delay_queue.scheduled), 1)
+
+    def test_polling_continues_while_subscribed(self):
+        self.run_job({})
+        self.run_job(self.delay_queue.pop_due(float('inf'))[0][1])
+
+        self.assertEqual(len(self.delay_queue.scheduled), 1)
+        self.assertEqual(self.event_bus.topics(''), [TOPIC])
+
+    def test_next_step_invoked_once(self):
+        self.run_job({})
+        polled = self.delay_queue.pop_due(float('inf'))
+
+        WaitJob.ready = True
+
+        self.assertTrue(self.event_bus.publish(TOPIC, {'result': 'available'}, self.dispatcher))
+        self.run_job(self.dispatcher.dispatched.pop()[1])
+        self.run_job(polled[0][1])
+
+        self.assertEqual([lambda_name for lambda_name, _ in self.dispatcher.dispatched], ['next'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import lib.store
+import lib.polling
+
+
+class VolumeSizeEstimatorTest(unittest.TestCase):
+    """ Estimates volume creation time from the configured coefficients, then from recorded creations
+    """
+
+    def setUp(self):
+        self.store = lib.store.MemoryStore()
+
+    def new_estimator(self) -> lib.polling.VolumeSizeEstimator:
+        return lib.polling.VolumeSizeEstimator(base_seconds=5, seconds_per_gib=0.01, fraction=1, store=self.store)
+
+    def test_configured_coefficients_without_history(self):
+        estimator = self.new_estimator()
+        estimator.record(100, 60)
+
+        self.assertAlmostEqual(estimator({'volume_size': 100}), 6)
+
+    def test_coefficients_fit_to_history(self):
+        estimator = self.new_estimator()
+
+        for volume_size, seconds in [(100, 60), (200, 110), (400, 210)]:
+            estimator.record(volume_size, seconds)
+
+        base_seconds, seconds_per_gib = self.new_estimator().coefficients()
+
+        self.assertAlmostEqual(base_seconds, 10)
+        self.assertAlmostEqual(seconds_per_gib, 0.5)
+
+    def test_history_is_bounded(self):
+        estimator = lib.polling.VolumeSizeEstimator(store=self.store, history_size=2)
+
+        for volume_size in [100, 200, 300]:
+            estimator.record(volume_size, 60)
+
+        self.assertEqual(self.store.get(lib.polling.VOLUME_CREATE_HISTORY_KEY)['samples'], [[200, 60], [300, 60]])
+
+    def test_fit_without_size_variance(self):
+        self.assertEqual(lib.polling.fit_coefficients([[5, 10], [5, 20], [5, 30]]), (20, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
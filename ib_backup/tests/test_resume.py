@@ -0,0 +1,108 @@
+import logging
+import unittest
+
+import lib.job
+import lib.steps
+import lib.store
+import lib.dispatch
+import lib.run_state
+import lib.idempotency
+
+# Steps of the test pipeline, step c fails the first time it runs
+GRAPH = lib.steps.StepGraph({
+    'a': ['b', 'c'],
+    'b': ['d'],
+    'c': ['d'],
+    'd': ['e']
+})
+
+
+class StepJob(lib.job.Job):
+    """ Step which invokes the next steps, or fails if its name is in `failing_steps`
+    """
+    failing_steps = set()
+
+    def handle(self, event, ctx) -> lib.job.NextAction:
+        if self.lambda_name in StepJob.failing_steps:
+            raise ValueError("Step {} failed".format(self.lambda_name))
+
+        if len(GRAPH.next_steps[self.lambda_name]) == 0:
+            return lib.job.NextAction.TERMINATE
+
+        self.next_lambda_event = {'from': self.lambda_name}
+        return lib.job.NextAction.NEXT
+
+
+class ResumeTest(unittest.TestCase):
+    """ Resumes a run which failed, and checks the steps after the resumed step are keyed by the new resume count
+    """
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+        self.idempotency_store = lib.idempotency.IdempotencyStore(lib.store.MemoryStore())
+        self.run_state_store = lib.run_state.RunStateStore(lib.store.MemoryStore())
+
+        StepJob.failing_steps = {'c'}
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def new_dispatcher(self) -> lib.dispatch.InProcessDispatcher:
+        dispatcher = lib.dispatch.InProcessDispatcher(run_state_store=self.run_state_store)
+
+        for step_name in GRAPH.order:
+            def new_job(step_name=step_name, **kwargs):
+                return StepJob(lambda_name=step_name, idempotency_store=self.idempotency_store, graph=GRAPH, **kwargs)
+
+            dispatcher.register(step_name, new_job, next_lambda_names=GRAPH.next_steps[step_name])
+
+        return dispatcher
+
+    def test_resume_keys_later_steps(self):
+        with self.assertRaises(ValueError):
+            self.new_dispatcher().run({'id': 'trigger'}, 'a')
+
+        run_id = self.run_state_store.runs()[0]['run_id']
+
+        StepJob.failing_steps = set()
+
+        dispatcher = self.new_dispatcher()
+        self.run_state_store.resume(run_id, dispatcher)
+        dispatcher.run_pending()
+
+        state = self.run_state_store.get(run_id)
+        self.assertEqual(state['status'], lib.run_state.RUN_STATUS_COMPLETED)
+        self.assertEqual(state['resume_count'], 1)
+
+        # The join and the steps after it use the resume count of the resumed run
+        self.assertIsNotNone(self.run_state_store.store.get(lib.run_state.join_key(run_id, 'd', 'joined-1')))
+        self.assertIsNone(self.run_state_store.store.get(lib.run_state.join_key(run_id, 'd', 'joined-0')))
+
+        for step_name, from_step in [('d', 'c'), ('e', 'd')]:
+            key = lib.idempotency.invocation_key(run_id, step_name, 0, False, 1, from_step)
+
+            self.assertEqual(self.idempotency_store.store.get(key)['status'], lib.idempotency.KEY_STATUS_COMPLETED)
+
+    def test_failed_runs_found_by_status(self):
+        with self.assertRaises(ValueError):
+            self.new_dispatcher().run({'id': 'trigger'}, 'a')
+
+        failed = self.run_state_store.failed_runs()
+        self.assertEqual(len(failed), 1)
+
+        StepJob.failing_steps = set()
+
+        dispatcher = self.new_dispatcher()
+        self.assertEqual(len(self.run_state_store.resume_failed(dispatcher, 1, 60 * 60)), 1)
+        dispatcher.run_pending()
+
+        self.assertEqual(self.run_state_store.failed_runs(), [])
+
+        completed_index_key = lib.run_state.status_index_key(lib.run_state.RUN_STATUS_COMPLETED)
+        self.assertEqual(self.run_state_store.store.indexed_keys(completed_index_key),
+                         [lib.run_state.run_key(failed[0]['run_id'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import unittest
+
+import lib.salt
+
+# jobs.lookup_jid result of a state.apply job which ran on two minions
+TWO_MINION_RESULT = {
+    'outputter': 'highstate',
+    'data': {
+        'ib01.dev.code418.net': {
+            'cmd_|-backup_test_|-/opt/test.sh_|-run': {
+                '__run_num__': 0,
+                'comment': 'Command "/opt/test.sh" run',
+                'result': True
+            }
+        },
+        'ib02.dev.code418.net': {
+            'cmd_|-backup_test_|-/opt/test.sh_|-run': {
+                '__run_num__': 0,
+                'comment': 'Command "/opt/test.sh" run',
+                'result': False
+            }
+        }
+    }
+}
+
+
+class FakeResponse:
+    """ Salt API response with a JSON body
+    """
+
+    def __init__(self, body: object):
+        self.status_code = 200
+        self.content = json.dumps(body).encode()
+
+
+class FakeSession:
+    """ HTTP session which responds to every request with the next of `bodies`
+    """
+
+    def __init__(self, bodies: list):
+        self.bodies = list(bodies)
+
+    def request(self, method, url, **kwargs) -> FakeResponse:
+        return FakeResponse(self.bodies.pop(0))
+
+
+class GetJobsTest(unittest.TestCase):
+    """ Looks up Salt jobs with the jobs.lookup_jid runner
+    """
+
+    def get_jobs(self, job_results: list) -> dict:
+        salt_api = lib.salt.SaltClient('http://salt.test')
+        salt_api.session = FakeSession([{'return': job_results}])
+
+        job_ids = ["2018{:016d}".format(i) for i in range(len(job_results))]
+
+        return salt_api.get_jobs(job_ids, auth_token='token')
+
+    def test_every_minion_result_is_checked(self):
+        status = self.get_jobs([TWO_MINION_RESULT])['20180000000000000000']
+
+        self.assertEqual(status.state, lib.salt.JOB_FAILED)
+        self.assertEqual(len(status.digest.minions), 2)
+        self.assertEqual(status.digest.state_count, 2)
+        self.assertEqual(status.digest.failed_count, 1)
+
+    def test_job_without_results_is_running(self):
+        status = self.get_jobs([{}])['20180000000000000000']
+
+        self.assertEqual(status.state, lib.salt.JOB_RUNNING)
+
+    def test_runner_error_is_not_checked(self):
+        statuses = self.get_jobs(["Exception occurred in runner jobs.lookup_jid: invalid jid", TWO_MINION_RESULT])
+
+        self.assertEqual(statuses['20180000000000000000'].state, lib.salt.JOB_ERROR)
+        self.assertIsNone(statuses['20180000000000000000'].digest)
+        self.assertIn("invalid jid", statuses['20180000000000000000'].error)
+        self.assertEqual(statuses['20180000000000000001'].state, lib.salt.JOB_FAILED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import datetime
+import unittest
+
+import lib.store
+import lib.snapshot_index
+
+# Time the index is searched at
+NOW = datetime.datetime(2018, 6, 30, 3)
+
+
+class StubPaginator:
+    """ describe_snapshots paginator which applies the volume-id and start-time filters
+    """
+
+    def __init__(self, ec2: 'StubEC2'):
+        self.ec2 = ec2
+
+    def paginate(self, Filters: list):
+        self.ec2.calls.append(Filters)
+
+        start_time_values = None
+        for snapshot_filter in Filters:
+            if snapshot_filter['Name'] == 'start-time':
+                start_time_values = [value.rstrip('*') for value in snapshot_filter['Values']]
+
+        snapshots = [snapshot for snapshot in self.ec2.snapshots
+                     if start_time_values is None or snapshot['StartTime'].date().isoformat() in start_time_values]
+
+        yield {'Snapshots': snapshots}
+
+
+class StubEC2:
+    """ EC2 client which lists `snapshots` and records the filters of each describe_snapshots call
+    """
+
+    def __init__(self, snapshots: list):
+        self.snapshots = snapshots
+        self.calls = []
+
+    def get_paginator(self, name: str) -> StubPaginator:
+        return StubPaginator(self)
+
+
+def new_snapshot(snapshot_id: str, days_ago: int, tested: bool = False) -> dict:
+    tags = [{'Key': lib.snapshot_index.BACKUP_TEST_STATUS_TAG_NAME, 'Value': 'true'}] if tested else []
+
+    return {
+        'SnapshotId': snapshot_id,
+        'StartTime': NOW - datetime.timedelta(days=days_ago),
+        'Tags': tags
+    }
+
+
+class NewestSnapshotTest(unittest.TestCase):
+    """ Finds the newest snapshot, listing every snapshot only until a high water mark is stored
+    """
+
+    def setUp(self):
+        self.ec2 = StubEC2([new_snapshot('snap-old', 30), new_snapshot('snap-tested', 1, tested=True)])
+        self.index = lib.snapshot_index.SnapshotIndex(self.ec2, store=lib.store.MemoryStore(), skip_tested=True)
+
+    def test_lists_every_snapshot_without_mark(self):
+        snapshot = self.index.newest_snapshot('vol-1', now=NOW)
+
+        self.assertEqual(snapshot['SnapshotId'], 'snap-old')
+        self.assertEqual(len(self.ec2.calls), 2)
+
+    def test_only_lists_window_with_mark(self):
+        self.index.newest_snapshot('vol-1', now=NOW)
+
+        self.ec2.snapshots[0]['Tags'] = [{'Key': lib.snapshot_index.BACKUP_TEST_STATUS_TAG_NAME, 'Value': 'true'}]
+        self.ec2.calls = []
+
+        snapshot = self.index.newest_snapshot('vol-1', now=NOW + datetime.timedelta(days=1))
+
+        self.assertIsNone(snapshot)
+        self.assertEqual(len(self.ec2.calls), 1)
+        self.assertIn('start-time', [snapshot_filter['Name'] for snapshot_filter in self.ec2.calls[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
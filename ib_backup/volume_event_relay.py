@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import lib.dispatch
+import lib.event_bus
+import lib.log
+
+logger = lib.log.get_logger("volume_event_relay")
+
+
+def main(event, ctx):
+    """ Lambda function handler, invokes the step lambdas waiting for an EBS volume notification
+    Args:
+        - event: EBS volume notification CloudWatch event which triggered Lambda function
+        - ctx: Invocation information
+
+    Raises: Any exception
+    """
+    event_bus = lib.event_bus.get_event_bus()
+
+    if event_bus is None:
+        raise KeyError("Missing environment variables: ['EVENT_BUS_TABLE']")
+
+    topic, detail = lib.event_bus.parse_volume_notification(event)
+
+    invoked = event_bus.publish(topic, detail, lib.dispatch.LambdaDispatcher())
+
+    logger.debug("Published EBS volume notification, topic={}, detail={}, invoked={}", topic, detail, invoked)